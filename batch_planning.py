@@ -0,0 +1,129 @@
+import copy
+import itertools
+import os
+import sys
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                wait)
+
+from shared_arrays import SharedArrays
+
+# Planner attributes a query may override; all of them only feed the cost
+# raster, which plan_query compiles again
+COST_OVERRIDES = ("Delta_C1", "Delta_C2", "costPerGrid", "jet_vx", "jet_vy",
+                  "J_max_discount", "J_counter_penalty")
+
+
+def plan_query(planner, start, goal, overrides=None):
+    """
+    planner's path from start=(sx, sy) to goal=(gx, gy) as
+    (rx, ry, cost, stats), cost being inf without a path.
+
+    overrides is a dict of cost parameters (see COST_OVERRIDES) to set for
+    this query only, e.g. {"Delta_C1": 0.5, "costPerGrid": 2}; any other
+    name, or one planner does not have, raises ValueError. The cost raster
+    is compiled again for it and the planner's attributes and raster are
+    put back afterwards, so a query without overrides never pays for that.
+    """
+    if overrides:
+        for name in overrides:
+            if name not in COST_OVERRIDES or not hasattr(planner, name):
+                raise ValueError("cannot override %r" % name)
+        saved = {name: getattr(planner, name) for name in overrides}
+        cost_raster = planner.cost_raster
+        for name, value in overrides.items():
+            setattr(planner, name, value)
+        planner.calc_cost_raster()
+    try:
+        result = planner.planning(*start, *goal)
+    finally:
+        if overrides:
+            for name, value in saved.items():
+                setattr(planner, name, value)
+            planner.cost_raster = cost_raster
+    return result[0], result[1], planner.path_cost, planner.stats
+
+
+def plan_many(planner, queries, workers=None, chunksize=4):
+    """
+    Plan each of queries, a (start, goal) or (start, goal, overrides) tuple
+    (see plan_query), on planner's obstacle map and cost raster, yielding
+    (i, rx, ry, cost, stats) for the i-th query as soon as it is planned.
+
+    With workers > 1 (None for one per CPU) the queries are spread over a
+    process pool in chunks of chunksize and results come in the order the
+    chunks finish, not the order of queries. The obstacle map and the cost
+    raster's multipliers and jet stream reach the workers once through
+    shared memory; each task carries only its queries. queries may be any
+    iterable and is read as the pool needs more work, so a long one is
+    never held in memory at once. With workers=1 the queries are planned
+    in turn on planner itself.
+
+    Closing the generator early cancels the chunks not yet started.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        for i, query in enumerate(queries):
+            yield (i,) + plan_query(planner, *query)
+        return
+
+    # The workers get a copy of the planner without the arrays; those are
+    # attached from shared memory in _init_batch_worker. Nor does it take
+    # the planner's animation: workers never draw.
+    worker_planner = copy.copy(planner)
+    worker_planner.animation = None
+    worker_planner.obstacle_map = None
+    worker_planner.distance_field = None
+    worker_planner.cost_raster = copy.copy(planner.cost_raster)
+    worker_planner.cost_raster.clear_cache()
+    worker_planner.cost_raster.multiplier = None
+    worker_planner.cost_raster.jet = None
+    arrays = {"obstacle_map": planner.obstacle_map,
+              "multiplier": planner.cost_raster.multiplier}
+    if planner.cost_raster.jet is not None:
+        arrays["jet"] = planner.cost_raster.jet
+
+    tasks = enumerate(queries)
+    with SharedArrays(arrays) as shared:
+        with ProcessPoolExecutor(
+                workers, initializer=_init_batch_worker,
+                initargs=(worker_planner, shared.specs)) as executor:
+            # Keep a few chunks per worker in flight so none of them waits
+            # for the next while the finished ones are being consumed
+            pending = set()
+            try:
+                while True:
+                    while len(pending) < workers * 4:
+                        chunk = list(itertools.islice(tasks, chunksize))
+                        if not chunk:
+                            break
+                        pending.add(executor.submit(_plan_batch_chunk,
+                                                    chunk))
+                    if not pending:
+                        break
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from future.result()
+            finally:
+                # Closed early: drop the chunks not started yet
+                for future in pending:
+                    future.cancel()
+
+
+# Per-process planner of plan_many
+_batch_planner = None
+_batch_blocks = None
+
+
+def _init_batch_worker(planner, specs):
+    global _batch_planner, _batch_blocks
+    arrays, _batch_blocks = SharedArrays.attach(specs)
+    sys.modules[type(planner).__module__].show_animation = False
+    planner.obstacle_map = arrays["obstacle_map"]
+    planner.cost_raster.multiplier = arrays["multiplier"]
+    planner.cost_raster.jet = arrays.get("jet")
+    _batch_planner = planner
+
+
+def _plan_batch_chunk(chunk):
+    return [(i,) + plan_query(_batch_planner, *query) for i, query in chunk]
@@ -0,0 +1,442 @@
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+import task1
+import task2
+import taska1
+import taska2
+from hierarchical import ClusterCache, HierarchicalPlanner
+from obstacle_map import Segment, obstacle_cache
+from planner_stats import PlannerStats
+
+BENCHMARKS = ("obstacle_map", "task1_planning", "taska1_route", "task2_sweep",
+              "taska2_random", "hierarchical_planning", "batch_planning",
+              "cost_analysis")
+
+# The three scenarios task1.main() evaluates for its trip time
+COST_SCENARIOS = (
+    dict(name="Scenario 1", passengers=3300, max_flights=13,
+         time_cost_level="medium", fuel_cost_per_kg=0.85),
+    dict(name="Scenario 2", passengers=1500, max_flights=8,
+         time_cost_level="high", fuel_cost_per_kg=0.96),
+    dict(name="Scenario 3", passengers=2250, max_flights=25,
+         time_cost_level="low", fuel_cost_per_kg=0.78),
+)
+
+
+class Scenario:
+    """
+    The task1 map (walls, three segments, time and fuel zones) scaled to a
+    size x size grid at the given resolution.
+
+    At size 70 and resolution 1 this is the map of the task scripts. The
+    map spans size * resolution units, so every coordinate of the original
+    map is multiplied by scale = size * resolution / 70. Zones are listed
+    as the grid positions inside them, which is what the planners' zone
+    masks compare against.
+    """
+
+    def __init__(self, size, resolution):
+        self.size, self.resolution = size, resolution
+        self.scale = size * resolution / 70
+        self.min_x = self.min_y = round(-10 * self.scale)
+        self.positions = np.arange(size) * resolution + self.min_x
+        self.max_x = self.max_y = self.min_x + size * resolution
+
+        self.ox, self.oy = [], []
+        for p in np.append(self.positions, self.max_x).tolist():
+            self.ox += [p, p, self.min_x, self.max_x]
+            self.oy += [self.min_y, self.max_y, p, p]
+        self.primitives = [Segment(*self.calc_point(20, 0),
+                                   *self.calc_point(25, 20)),
+                           Segment(*self.calc_point(10, 55),
+                                   *self.calc_point(25, 45)),
+                           Segment(*self.calc_point(30, 0),
+                                   *self.calc_point(45, 10))]
+        self.tc_x, self.tc_y = self.calc_zone(10, 26), self.calc_zone(20, 46)
+        self.fc_x, self.fc_y = self.calc_zone(30, 46), self.calc_zone(10, 36)
+        self.start = self.calc_point(0, 0)
+        self.goal = self.calc_point(50, 50)
+        self.checkpoints = [self.calc_point(18, 33), self.calc_point(38, 23)]
+        self.robot_radius = max(1.0, self.scale)
+
+    def calc_point(self, x, y):
+        return x * self.scale, y * self.scale
+
+    def calc_zone(self, lo, hi):
+        # Grid positions in [lo, hi) of the original map
+        p = self.positions
+        return p[(p >= lo * self.scale) & (p < hi * self.scale)].tolist()
+
+    def calc_bands(self, n_bands):
+        """
+        n_bands jet stream placements of the task2 sweep, each 5 original
+        units high and spanning the map, spread evenly over it.
+        """
+        bands = {}
+        for y_start in np.linspace(-10, 56, n_bands).round().astype(int):
+            rc_y = self.calc_zone(y_start, y_start + 5)
+            bands[int(y_start)] = (self.positions.tolist(), rc_y)
+        return bands
+
+    def calc_random_obstacles(self, density, seed):
+        """
+        Obstacles, fuel zone, start and goal of a random taska2 map, with
+        density obstacle points per grid cell.
+
+        Unlike the walls, random points are not scaled up with the map, so
+        these maps are planned with a robot radius of one cell.
+        """
+        rng = np.random.default_rng(seed)
+        lo, hi = self.min_x, self.max_x
+        n = int(self.size * self.size * density)
+        ox = rng.uniform(lo, hi, n)
+        oy = rng.uniform(lo, hi, n)
+
+        fc_start = rng.integers(10, 21, 2) * self.scale
+        fc_end = fc_start + 40 * self.scale
+        keep = ~((fc_start[0] <= ox) & (ox < fc_end[0])
+                 & (fc_start[1] <= oy) & (oy < fc_end[1]))
+        while True:
+            sx, sy, gx, gy = rng.uniform(lo, hi, 4)
+            if math.hypot(gx - sx, gy - sy) < 40 * self.scale:
+                continue
+            if any(fc_start[0] <= x < fc_end[0] and fc_start[1] <= y < fc_end[1]
+                   for x, y in ((sx, sy), (gx, gy))):
+                continue
+            break
+        clear = 3 * self.scale
+        keep &= np.hypot(ox - sx, oy - sy) >= clear
+        keep &= np.hypot(ox - gx, oy - gy) >= clear
+
+        p = self.positions
+        fc_x = p[(p >= fc_start[0]) & (p < fc_end[0])].tolist()
+        fc_y = p[(p >= fc_start[1]) & (p < fc_end[1])].tolist()
+        return (self.ox + ox[keep].tolist(), self.oy + oy[keep].tolist(),
+                fc_x, fc_y, (sx, sy), (gx, gy))
+
+
+def measure(fn, repeat):
+    """
+    Run fn repeat times; returns (seconds of each run, last result).
+    """
+    times, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return times, result
+
+
+def make_record(name, size, resolution, times, params=None, stats=None,
+                **extra):
+    record = {
+        "name": name, "size": size, "resolution": resolution,
+        "params": params or {}, "times": times,
+        "min": min(times), "median": statistics.median(times),
+    }
+    if stats is not None:
+        record["stats"] = stats.as_dict()
+    record.update(extra)
+    return record
+
+
+def bench_obstacle_map(scenario, repeat):
+    planner = task1.AStarPlanner(
+        scenario.ox, scenario.oy, scenario.resolution, scenario.robot_radius,
+        scenario.fc_x, scenario.fc_y, scenario.tc_x, scenario.tc_y,
+        primitives=scenario.primitives)
+    times, _ = measure(lambda: planner.calc_obstacle_map(
+        scenario.ox, scenario.oy, scenario.primitives), repeat)
+    return [make_record("obstacle_map", scenario.size, scenario.resolution,
+                        times, n_points=len(scenario.ox))]
+
+
+def bench_task1_planning(scenario, repeat):
+    planner = task1.AStarPlanner(
+        scenario.ox, scenario.oy, scenario.resolution, scenario.robot_radius,
+        scenario.fc_x, scenario.fc_y, scenario.tc_x, scenario.tc_y,
+        primitives=scenario.primitives)
+    times, (rx, _) = measure(lambda: planner.planning(*scenario.start,
+                                                      *scenario.goal), repeat)
+    return [make_record("task1_planning", scenario.size, scenario.resolution,
+                        times, stats=planner.stats, path_length=len(rx))]
+
+
+def bench_taska1_route(scenario, repeat):
+    planner = taska1.AStarPlanner(
+        scenario.ox, scenario.oy, scenario.resolution, scenario.robot_radius,
+        scenario.fc_x, scenario.fc_y, scenario.tc_x, scenario.tc_y,
+        primitives=scenario.primitives)
+    waypoints = [scenario.start] + scenario.checkpoints + [scenario.goal]
+
+    def route():
+        cost, run_stats = 0.0, []
+        for (sx, sy), (gx, gy) in zip(waypoints, waypoints[1:]):
+            result = planner.planning(sx, sy, gx, gy)
+            cost += result[2] if len(result) == 3 else math.inf
+            run_stats.append(planner.stats)
+        return cost, sum(run_stats)
+
+    times, (cost, stats) = measure(route, repeat)
+    return [make_record("taska1_route", scenario.size, scenario.resolution,
+                        times, stats=stats, cost=cost)]
+
+
+def bench_task2_sweep(scenario, repeat, n_bands=8, workers=1):
+    planner = task2.AStarPlanner(
+        scenario.ox, scenario.oy, scenario.resolution, scenario.robot_radius,
+        scenario.fc_x, scenario.fc_y, scenario.tc_x, scenario.tc_y,
+        jet_vx=1.0, jet_vy=1.0, J_max_discount=0.05,
+        primitives=scenario.primitives)
+    bands = scenario.calc_bands(n_bands)
+    times, rows = measure(lambda: planner.sweep_jet_stream(
+        *scenario.start, *scenario.goal, bands, workers), repeat)
+    best = task2.select_jet_band(rows)
+    return [make_record("task2_sweep", scenario.size, scenario.resolution,
+                        times, {"bands": n_bands, "workers": workers},
+                        stats=planner.sweep_stats, best_placement=best[0],
+                        best_cost=best[1])]
+
+
+def bench_taska2_random(scenario, repeat, densities=(0.05, 0.1, 0.15),
+                        seed=0):
+    records = []
+    for density in densities:
+        ox, oy, fc_x, fc_y, start, goal = scenario.calc_random_obstacles(
+            density, seed)
+        planner = taska2.AStarPlanner(ox, oy, scenario.resolution,
+                                      scenario.resolution, fc_x, fc_y)
+        times, _ = measure(lambda: planner.planning(*start, *goal), repeat)
+        records.append(make_record(
+            "taska2_random", scenario.size, scenario.resolution, times,
+            {"density": density, "seed": seed}, stats=planner.stats,
+            found=math.isfinite(planner.path_cost),
+            map_build=planner.setup_stats.timings["map_build"]))
+    return records
+
+
+def bench_hierarchical_planning(scenario, repeat, cluster_size=16):
+    planner = task1.AStarPlanner(
+        scenario.ox, scenario.oy, scenario.resolution, scenario.robot_radius,
+        scenario.fc_x, scenario.fc_y, scenario.tc_x, scenario.tc_y,
+        primitives=scenario.primitives)
+    # A disabled cache, so cluster_build times the precomputation itself
+    cache = ClusterCache()
+    cache.enabled = False
+    hierarchical = HierarchicalPlanner(planner, cluster_size, cache)
+    times, _ = measure(lambda: hierarchical.planning(*scenario.start,
+                                                     *scenario.goal), repeat)
+    return [make_record(
+        "hierarchical_planning", scenario.size, scenario.resolution, times,
+        {"cluster_size": cluster_size}, stats=hierarchical.stats,
+        cost=hierarchical.path_cost,
+        cluster_build=hierarchical.setup_stats.timings["zone_compile"])]
+
+
+def bench_batch_planning(scenario, repeat, n_queries=32, workers=1, seed=0):
+    planner = task1.AStarPlanner(
+        scenario.ox, scenario.oy, scenario.resolution, scenario.robot_radius,
+        scenario.fc_x, scenario.fc_y, scenario.tc_x, scenario.tc_y,
+        primitives=scenario.primitives)
+    # Start and goal pairs among the free cells
+    rng = np.random.default_rng(seed)
+    free_x, free_y = np.nonzero(~np.asarray(planner.obstacle_map, dtype=bool))
+    pairs = rng.integers(0, free_x.size, (n_queries, 2))
+    queries = [tuple((planner.calc_grid_position(free_x[i], planner.min_x),
+                      planner.calc_grid_position(free_y[i], planner.min_y))
+                     for i in pair) for pair in pairs]
+    times, results = measure(lambda: list(planner.plan_many(queries, workers)),
+                             repeat)
+    return [make_record(
+        "batch_planning", scenario.size, scenario.resolution, times,
+        {"queries": n_queries, "workers": workers, "seed": seed},
+        stats=sum((stats for *_, stats in results), PlannerStats()),
+        found=sum(cost < math.inf for _, _, _, cost, _ in results))]
+
+
+def bench_cost_analysis(repeat, trip_time=74.52905473706207):
+    def analyse():
+        with contextlib.redirect_stdout(io.StringIO()):
+            task2.perform_cost_analysis(trip_time)
+            for scenario in COST_SCENARIOS:
+                task1.evaluate_scenario(**scenario, Tbest=trip_time)
+
+    times, _ = measure(analyse, repeat)
+    return [make_record("cost_analysis", None, None, times)]
+
+
+def get_metadata():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "git_commit": commit or None,
+        "python": sys.version,
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "obstacle_cache": obstacle_cache.enabled,
+    }
+
+
+def run(args):
+    for module in (task1, task2, taska1, taska2):
+        module.show_animation = False
+    # Cached obstacle maps would turn every map build after the first into
+    # a file read
+    obstacle_cache.enabled = args.cache
+    only = set(args.only or BENCHMARKS)
+
+    results = []
+    if "cost_analysis" in only:
+        results += bench_cost_analysis(args.repeat)
+    for size in args.sizes:
+        for resolution in args.resolutions:
+            scenario = Scenario(size, resolution)
+            for name in BENCHMARKS:
+                if name not in only or name == "cost_analysis":
+                    continue
+                if name == "task2_sweep":
+                    records = bench_task2_sweep(scenario, args.repeat,
+                                                args.bands, args.workers)
+                elif name == "batch_planning":
+                    records = bench_batch_planning(scenario, args.repeat,
+                                                   args.queries, args.workers,
+                                                   args.seed)
+                elif name == "taska2_random":
+                    records = bench_taska2_random(scenario, args.repeat,
+                                                  args.densities, args.seed)
+                else:
+                    records = globals()["bench_" + name](scenario, args.repeat)
+                for record in records:
+                    print(format_record(record), flush=True)
+                results += records
+
+    with open(args.output, "w") as f:
+        json.dump({"metadata": get_metadata(), "results": results}, f,
+                  indent=1)
+    print("results written to", args.output)
+
+
+def format_record(record):
+    params = ", ".join(f"{key}={value}"
+                       for key, value in record["params"].items())
+    return (f"{record['name']:<22}{str(record['size']):>6}"
+            f"{str(record['resolution']):>6}  {params:<32}"
+            f"median {record['median'] * 1e3:10.1f} ms"
+            f"  min {record['min'] * 1e3:10.1f} ms")
+
+
+def get_record_key(record):
+    return (record["name"], record["size"], record["resolution"],
+            json.dumps(record["params"], sort_keys=True))
+
+
+def compare(baseline, current, threshold):
+    """
+    Rows of (key, baseline median, current median, ratio, regressed) for
+    the benchmarks in both result sets; a benchmark regressed when its
+    median time grew by more than threshold (0.1 = 10%) or it found fewer
+    paths than the baseline.
+    """
+    baseline = {get_record_key(r): r for r in baseline["results"]}
+    rows = []
+    for record in current["results"]:
+        key = get_record_key(record)
+        if key not in baseline:
+            continue
+        old, new = baseline[key]["median"], record["median"]
+        ratio = new / old if old > 0 else math.inf
+        lost_paths = record.get("found", 0) < baseline[key].get("found", 0)
+        rows.append((key, old, new, ratio,
+                     ratio > 1.0 + threshold or lost_paths))
+    return rows
+
+
+def run_compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    for label, data in (("baseline", baseline), ("current", current)):
+        meta = data["metadata"]
+        print(f"{label}: {meta['git_commit']} {meta['timestamp']} "
+              f"{meta['platform']} python {meta['python'].split()[0]}")
+
+    rows = compare(baseline, current, args.threshold)
+    n_regressed = 0
+    for (name, size, resolution, params), old, new, ratio, regressed in rows:
+        n_regressed += regressed
+        print(f"{name:<22}{str(size):>6}{str(resolution):>6}  {params:<32}"
+              f"{old * 1e3:10.1f} ms -> {new * 1e3:10.1f} ms  x{ratio:5.2f}"
+              f"{'  REGRESSION' if regressed else ''}")
+    print(f"{n_regressed} regression(s) over {args.threshold:.0%} "
+          f"in {len(rows)} benchmarks")
+    return 1 if n_regressed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time the planners and the cost analysis on scaled maps.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--sizes", type=int, nargs="+",
+                            default=[70, 500, 2000],
+                            help="grid sizes (cells per side)")
+    run_parser.add_argument("--resolutions", type=float, nargs="+",
+                            default=[1.0], help="grid resolutions")
+    run_parser.add_argument("--only", nargs="+", choices=BENCHMARKS,
+                            help="run only these benchmarks")
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--bands", type=int, default=8,
+                            help="jet stream placements in task2_sweep")
+    run_parser.add_argument("--workers", type=int, default=1,
+                            help="processes for task2_sweep and "
+                            "batch_planning")
+    run_parser.add_argument("--queries", type=int, default=32,
+                            help="start and goal pairs in batch_planning")
+    run_parser.add_argument("--densities", type=float, nargs="+",
+                            default=[0.05, 0.1, 0.15],
+                            help="obstacles per cell in taska2_random")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--cache", action="store_true",
+                            help="use the on-disk obstacle map cache")
+    run_parser.add_argument("--output", default="bench.json")
+
+    compare_parser = commands.add_parser(
+        "compare", help="flag regressions against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="allowed slowdown of the median time")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(run_compare(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+import math
+from array import array
+
+import numpy as np
+
+
+def calc_zone_mask(zone_x, zone_y, min_x, min_y, x_width, y_width,
+                   resolution):
+    """
+    Cells [ix][iy] whose grid position has x in zone_x and y in zone_y.
+
+    This is the test the planners used to run for every neighbour
+    (calc_grid_position(ix) in zone_x and calc_grid_position(iy) in
+    zone_y), done once for the whole grid.
+    """
+    px = np.arange(x_width) * resolution + min_x
+    py = np.arange(y_width) * resolution + min_y
+    in_x = np.isin(px, np.array(list(zone_x), dtype=float))
+    in_y = np.isin(py, np.array(list(zone_y), dtype=float))
+    return np.outer(in_x, in_y)
+
+
+def flatten_cost_grid(cost_grid):
+    """
+    cost_grid[ix][iy] as an array('d') indexed by iy * x_width + ix.
+    """
+    return array('d', np.ascontiguousarray(cost_grid.T).tobytes())
+
+
+class CostRaster:
+    """
+    Per-cell cost multipliers for one grid, compiled from the zone lists.
+
+    multiplier[ix][iy] is 1.0 plus the penalty of every cost zone the cell
+    is in (see add_zone). The jet stream depends on the direction of
+    travel, so it is kept apart in jet[i][ix][iy] for motion i. Stepping
+    into (ix, iy) with motion i costs
+    motion[i][2] * cost_per_grid * (multiplier + jet[i]).
+    """
+
+    def __init__(self, min_x, min_y, x_width, y_width, resolution,
+                 motion=(), cost_per_grid=1.0):
+        self.min_x, self.min_y = min_x, min_y
+        self.x_width, self.y_width = x_width, y_width
+        self.resolution = resolution
+        self.motion = motion
+        self.cost_per_grid = cost_per_grid
+        self.multiplier = np.ones((x_width, y_width))
+        self.jet = None
+        self.clear_cache()
+
+    def clear_cache(self):
+        # Derived arrays, rebuilt on first use after the costs change
+        self._step_costs = None
+        self._reverse_step_costs = None
+        self._min_step_cost_grids = {}
+        self._jump_stops = None
+
+    def calc_zone_mask(self, zone_x, zone_y):
+        return calc_zone_mask(zone_x, zone_y, self.min_x, self.min_y,
+                              self.x_width, self.y_width, self.resolution)
+
+    def add_zone(self, zone_x, zone_y, delta, per_grid=True):
+        """
+        Charge delta more per unit of motion in the cells of the zone.
+
+        With per_grid delta is a fraction of cost_per_grid, as in task2,
+        whose zones add Delta * step cost. Without it delta is an absolute
+        cost per unit of motion, as in the task1 planners, whose zones add
+        Delta * motion length whatever the cost per grid; the penalty is
+        then delta / cost_per_grid.
+        """
+        if not per_grid:
+            delta = delta / self.cost_per_grid
+        self.multiplier += delta * self.calc_zone_mask(zone_x, zone_y)
+        self.clear_cache()
+
+    def set_jet(self, zone_x, zone_y, jet_vx, jet_vy, max_discount,
+                counter_penalty=0.0):
+        """
+        Replace the jet stream overlay.
+
+        A step is discounted by max_discount * cos(angle) when it runs with
+        the flow and penalised by counter_penalty * -cos(angle) when it runs
+        against it, in the cells of the zone only.
+        """
+        mask = self.calc_zone_mask(zone_x, zone_y)
+        self.jet = np.zeros((len(self.motion), self.x_width, self.y_width))
+        jvx, jvy = float(jet_vx), float(jet_vy)
+        jv_norm = math.hypot(jvx, jvy)
+        for i, (mvx, mvy, _) in enumerate(self.motion):
+            mv_norm = math.hypot(mvx, mvy)
+            if mv_norm > 0 and jv_norm > 0:
+                # Cosine of angle: 1 for perfect alignment, -1 for counter-flow
+                cos_align = (mvx * jvx + mvy * jvy) / (mv_norm * jv_norm)
+                self.jet[i][mask] = (max(0.0, -cos_align) * counter_penalty
+                                     - max(0.0, cos_align) * max_discount)
+        self.clear_cache()
+
+    def clear_jet(self):
+        self.jet = None
+        self.clear_cache()
+
+    def calc_step_cost_grid(self, i):
+        """
+        Cost of entering each cell [ix][iy] with motion[i].
+        """
+        multiplier = self.multiplier
+        if self.jet is not None:
+            multiplier = multiplier + self.jet[i]
+        return self.motion[i][2] * self.cost_per_grid * multiplier
+
+    def get_step_costs(self):
+        """
+        step_costs[i][iy * x_width + ix] is the cost of entering (ix, iy)
+        with motion[i], in the flat layout used by grid_search.
+        """
+        if self._step_costs is None:
+            self._step_costs = [flatten_cost_grid(self.calc_step_cost_grid(i))
+                                for i in range(len(self.motion))]
+        return self._step_costs
+
+    def get_reverse_step_costs(self):
+        """
+        reverse_step_costs[j][iy * x_width + ix] is the cost of leaving
+        (ix, iy) with motion -motion[j] (inf off the grid).
+
+        Searching with these from a goal gives the cost from every cell to
+        the goal, since each step of that search undoes a forward step.
+        """
+        if self._reverse_step_costs is None:
+            index = {(dx, dy): i for i, (dx, dy, _) in enumerate(self.motion)}
+            pad = max(max(abs(dx), abs(dy)) for dx, dy, _ in self.motion)
+            self._reverse_step_costs = []
+            for dx, dy, _ in self.motion:
+                step_cost = np.pad(
+                    self.calc_step_cost_grid(index[(-dx, -dy)]), pad,
+                    constant_values=math.inf)
+                step_cost = step_cost[pad - dx:pad - dx + self.x_width,
+                                      pad - dy:pad - dy + self.y_width]
+                self._reverse_step_costs.append(flatten_cost_grid(step_cost))
+        return self._reverse_step_costs
+
+    def get_min_step_cost_grid(self, reverse=False):
+        """
+        Cheapest cost of entering each cell [ix][iy] with any motion, or
+        with reverse the cheapest cost of the steps get_reverse_step_costs()
+        charges for it.
+        """
+        if reverse not in self._min_step_cost_grids:
+            if reverse:
+                grids = [np.frombuffer(step_cost).reshape(
+                    self.y_width, self.x_width).T
+                    for step_cost in self.get_reverse_step_costs()]
+            else:
+                grids = [self.calc_step_cost_grid(i)
+                         for i in range(len(self.motion))]
+            self._min_step_cost_grids[reverse] = np.min(grids, axis=0)
+        return self._min_step_cost_grids[reverse]
+
+    def calc_min_unit_cost(self):
+        """
+        Lowest cost per unit of motion length anywhere on the grid.
+        """
+        multiplier = self.multiplier
+        if self.jet is not None:
+            multiplier = multiplier + self.jet.min(axis=0)
+        return self.cost_per_grid * float(multiplier.min())
+
+    def get_jump_stops(self):
+        """
+        Cells where jump point search must stop and look in every
+        direction, as a bytes object indexed by iy * x_width + ix: those
+        with a neighbour of another multiplier (the edges of the cost
+        zones) and those within one step of the jet stream, whose step
+        costs depend on the direction. Inside a zone every step costs the
+        same multiple of its motion, so jumps can cross it.
+        """
+        if self._jump_stops is None:
+            multiplier = np.pad(self.multiplier, 1, mode="edge")
+            jet = np.zeros_like(multiplier, dtype=bool)
+            if self.jet is not None:
+                jet[1:-1, 1:-1] = (self.jet != 0.0).any(axis=0)
+            stops = np.zeros((self.x_width, self.y_width), dtype=bool)
+            for dx in (0, 1, 2):
+                for dy in (0, 1, 2):
+                    window = (slice(dx, dx + self.x_width),
+                              slice(dy, dy + self.y_width))
+                    stops |= multiplier[window] != self.multiplier
+                    stops |= jet[window]
+            self._jump_stops = np.ascontiguousarray(stops.T).tobytes()
+        return self._jump_stops
+
+    def calc_multiplier(self, x, y):
+        """
+        Multiplier of the cell nearest to position (x, y), 1.0 off the grid.
+        """
+        ix = round((x - self.min_x) / self.resolution)
+        iy = round((y - self.min_y) / self.resolution)
+        if 0 <= ix < self.x_width and 0 <= iy < self.y_width:
+            return float(self.multiplier[ix][iy])
+        return 1.0
@@ -0,0 +1,196 @@
+import hashlib
+import logging
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+from grid_search import calc_cost_field, flatten_obstacle_map
+from planner_stats import PlannerStats
+
+logger = logging.getLogger(__name__)
+
+
+def calc_map_key(blocked, x_width, y_width):
+    """
+    Hash of a flattened obstacle map (see flatten_obstacle_map).
+    """
+    h = hashlib.sha256()
+    h.update(repr((x_width, y_width)).encode())
+    h.update(bytes(blocked))
+    return h.hexdigest()
+
+
+def calc_cost_key(motion, step_costs):
+    """
+    Hash of the motion model and the step costs compiled from the cost
+    zones, jet stream and cost per grid (see CostRaster.get_step_costs).
+    """
+    h = hashlib.sha256()
+    h.update(repr(tuple(motion)).encode())
+    for step_cost in step_costs:
+        h.update(np.frombuffer(step_cost).tobytes())
+    return h.hexdigest()
+
+
+class CostToGoCache:
+    """
+    In-memory cache of cost-to-go fields, keyed by (map key, goal, cost
+    key). The least recently used fields are dropped once they take more
+    than max_bytes; hits and misses count the lookups.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.fields = OrderedDict()
+        self.n_bytes = 0
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        field = self.fields.get(key)
+        if field is None:
+            self.misses += 1
+            return None
+        self.fields.move_to_end(key)
+        self.hits += 1
+        return field
+
+    def put(self, key, field):
+        if key in self.fields:
+            self.n_bytes -= self.calc_size(self.fields.pop(key))
+        self.fields[key] = field
+        self.n_bytes += self.calc_size(field)
+        while self.n_bytes > self.max_bytes and len(self.fields) > 1:
+            _, dropped = self.fields.popitem(last=False)
+            self.n_bytes -= self.calc_size(dropped)
+
+    def get_or_build(self, key, build):
+        """
+        build() is only called on a miss and must return the field.
+        """
+        field = self.get(key)
+        if field is None:
+            field = build()
+            self.put(key, field)
+        return field
+
+    def clear(self):
+        self.fields.clear()
+        self.n_bytes = 0
+
+    @staticmethod
+    def calc_size(field):
+        return len(field) * field.itemsize
+
+
+cost_to_go_cache = CostToGoCache()
+
+
+def walk_cost_field(x_width, y_width, motion, start, step_costs, field):
+    """
+    Cell ids from start=(ix, iy) to the root of field, a cost-to-go field
+    (calc_cost_field with CostRaster.get_reverse_step_costs()), taking at
+    every cell the step whose cost plus the cost to go beyond it is least.
+    Only the cells on the path are visited. Empty when start cannot reach
+    the root.
+    """
+    c_id = start[1] * x_width + start[0]
+    if field[c_id] == math.inf:
+        return []
+    path = [c_id]
+    while field[c_id] > 0.0:
+        cx, cy = c_id % x_width, c_id // x_width
+        best_cost, best_id = math.inf, -1
+        for (dx, dy, _), step_cost in zip(motion, step_costs):
+            nx, ny = cx + dx, cy + dy
+            if nx < 0 or ny < 0 or nx >= x_width or ny >= y_width:
+                continue
+            n_id = ny * x_width + nx
+            n_cost = step_cost[n_id] + field[n_id]
+            if n_cost < best_cost:
+                best_cost, best_id = n_cost, n_id
+        c_id = best_id
+        path.append(c_id)
+    return path
+
+
+class CostToGoPlanner:
+    """
+    Many-origin planning to shared goals over the grid of an A* planner.
+
+    The first query for a goal runs one Dijkstra search back from it over
+    the reversed steps and keeps the cost of getting to the goal from
+    every cell (in cache, a CostToGoCache); every query for that goal
+    after is a walk down that field, visiting only the cells on the path.
+    Paths cost the same as the planner's own.
+
+    Fields are keyed by the map, the goal and the step costs, so planners
+    on the same map share them. planning(sx, sy, gx, gy) returns rx, ry
+    like the planner's and leaves the cost in path_cost (inf without a
+    path). Call update() after changing the planner's obstacle map or
+    cost raster.
+    """
+
+    def __init__(self, planner, cache=None):
+        self.planner = planner
+        self.cache = cost_to_go_cache if cache is None else cache
+        self.setup_stats = PlannerStats()
+        self.stats = None
+        self.path_cost = math.inf
+        self.update()
+
+    def update(self):
+        planner = self.planner
+        with self.setup_stats.timer("zone_compile"):
+            self.blocked = flatten_obstacle_map(planner.obstacle_map)
+            self.step_costs = planner.cost_raster.get_step_costs()
+            self.map_key = calc_map_key(self.blocked, planner.x_width,
+                                        planner.y_width)
+            self.cost_key = calc_cost_key(planner.motion, self.step_costs)
+
+    def get_field(self, gx, gy):
+        """
+        Cost from every cell to the goal at (gx, gy), indexed by
+        iy * x_width + ix (inf where the goal cannot be reached).
+        """
+        planner = self.planner
+        goal = (planner.calc_xy_index(gx, planner.min_x),
+                planner.calc_xy_index(gy, planner.min_y))
+        return self.cache.get_or_build(
+            (self.map_key, goal, self.cost_key),
+            lambda: calc_cost_field(
+                self.blocked, planner.x_width, planner.y_width,
+                planner.motion, goal,
+                planner.cost_raster.get_reverse_step_costs()))
+
+    def planning(self, sx, sy, gx, gy):
+        self.stats = stats = PlannerStats(runs=1)
+        planner = self.planner
+        start = (planner.calc_xy_index(sx, planner.min_x),
+                 planner.calc_xy_index(sy, planner.min_y))
+
+        with stats.timer("search"):
+            field = self.get_field(gx, gy)
+        with stats.timer("path"):
+            path = walk_cost_field(planner.x_width, planner.y_width,
+                                   planner.motion, start, self.step_costs,
+                                   field)
+        stats.expanded = len(path)
+        stats.generated = len(path) * len(planner.motion)
+
+        if path:
+            self.path_cost = field[path[0]]
+            logger.info("Total Trip time required -> %s", self.path_cost)
+        else:
+            logger.warning("Open set is empty..")
+            self.path_cost = math.inf
+            path = [planner.calc_xy_index(gy, planner.min_y) * planner.x_width
+                    + planner.calc_xy_index(gx, planner.min_x)]
+        rx = [planner.calc_grid_position(c_id % planner.x_width,
+                                         planner.min_x)
+              for c_id in reversed(path)]
+        ry = [planner.calc_grid_position(c_id // planner.x_width,
+                                         planner.min_y)
+              for c_id in reversed(path)]
+        logger.debug("Planner stats: %s", stats)
+        return rx, ry
@@ -0,0 +1,304 @@
+import heapq
+import logging
+import math
+from array import array
+
+from grid_search import flatten_obstacle_map
+from heuristics import is_eight_connected, is_four_connected
+from planner_stats import PlannerStats
+
+logger = logging.getLogger(__name__)
+
+
+class DStarLitePlanner:
+    """
+    D* Lite (Koenig and Likhachev) over the grid of an A* planner, for
+    replanning as cells are blocked, cleared or change cost mid-flight.
+
+    The search runs backwards from the goal: g[id] is the cost from a cell
+    to the goal and rhs[id] the one-step lookahead of it, and both are kept
+    between calls together with the open set. replan() moves the start
+    and applies a batch of changes; only the cells whose cost to the goal
+    the changes alter are expanded again, so a replan costs in proportion
+    to the change rather than to the map.
+
+    The planner's obstacle map and step costs are copied when this is
+    made and the changes go to the copies; the planner is left as it is.
+    planning(sx, sy, gx, gy) and replan() return rx, ry like the planner's
+    and leave the cost in path_cost (inf without a path) and the counters
+    of the repair in stats.
+    """
+
+    def __init__(self, planner):
+        self.planner = planner
+        self.motion = planner.motion
+        self.x_width, self.y_width = planner.x_width, planner.y_width
+        self.blocked = bytearray(flatten_obstacle_map(planner.obstacle_map))
+        cost_raster = planner.cost_raster
+        self.step_costs = [array('d', step_cost)
+                           for step_cost in cost_raster.get_step_costs()]
+        self.multiplier = cost_raster.multiplier.copy()
+        self.jet = cost_raster.jet
+        self.cost_per_grid = cost_raster.cost_per_grid
+        # Heuristic costs per unit of distance; must stay a lower bound on
+        # every step for the keys of the open set to stay valid
+        self.unit_cost = cost_raster.calc_min_unit_cost()
+        if is_four_connected(self.motion):
+            self.metric = "manhattan"
+        elif is_eight_connected(self.motion):
+            self.metric = "octile"
+        else:
+            self.metric = "euclidean"
+        self.stats = None
+        self.path_cost = math.inf
+        self.start_id = self.goal_id = -1
+        self.g = self.rhs = None
+        self.open_keys, self.open_heap = {}, []
+        self.km = 0.0
+
+    def calc_distance(self, a_id, b_id):
+        dx = abs(a_id % self.x_width - b_id % self.x_width)
+        dy = abs(a_id // self.x_width - b_id // self.x_width)
+        if self.metric == "manhattan":
+            return dx + dy
+        if self.metric == "octile":
+            return dx + dy + (math.sqrt(2) - 2.0) * min(dx, dy)
+        return math.hypot(dx, dy)
+
+    def calc_key(self, c_id):
+        k = min(self.g[c_id], self.rhs[c_id])
+        return (k + self.calc_distance(c_id, self.start_id) * self.unit_cost
+                + self.km, k)
+
+    @staticmethod
+    def is_key_less(a, b):
+        # Keys are sums of a cost, a heuristic and km, so two that are equal
+        # on paper can differ in the last bits; those compare by k2 alone,
+        # or the search could stop short of a cell tied with the start
+        if abs(a[0] - b[0]) <= 1e-9 * max(abs(a[0]), abs(b[0]), 1.0):
+            return a[1] < b[1]
+        return a[0] < b[0]
+
+    def calc_index(self, x, y):
+        planner = self.planner
+        return (planner.calc_xy_index(y, planner.min_y) * self.x_width
+                + planner.calc_xy_index(x, planner.min_x))
+
+    def planning(self, sx, sy, gx, gy):
+        """
+        Path from (sx, sy) to (gx, gy). A call with the goal of the last
+        one only moves the start, like replan() without changes.
+        """
+        goal_id = self.calc_index(gx, gy)
+        if goal_id != self.goal_id:
+            self.start_id = self.calc_index(sx, sy)
+            self.reset(goal_id)
+        return self.replan(sx, sy)
+
+    def reset(self, goal_id):
+        n = self.x_width * self.y_width
+        self.goal_id = goal_id
+        self.g = array('d', [math.inf]) * n
+        self.rhs = array('d', [math.inf]) * n
+        self.rhs[goal_id] = 0.0
+        self.km = 0.0
+        key = self.calc_key(goal_id)
+        self.open_keys = {goal_id: key}
+        self.open_heap = [(key[0], key[1], goal_id)]
+
+    def replan(self, sx, sy, blocked=(), cleared=(), multipliers=None):
+        """
+        Move the start to (sx, sy) and replan after blocking the cells at
+        the positions in blocked, clearing those in cleared and setting
+        the cost multiplier of the cells in multipliers, a dict {(x, y):
+        multiplier} (1.0 plus the penalty of each zone, like
+        CostRaster.multiplier).
+
+        A multiplier below the cheapest one seen so far lowers the
+        heuristic, which invalidates the open set, so the search then
+        starts over.
+        """
+        self.stats = stats = PlannerStats(runs=1)
+        if self.goal_id == -1:
+            raise ValueError("call planning() with a goal before replan()")
+        start_id = self.calc_index(sx, sy)
+        self.km += self.calc_distance(self.start_id, start_id) * self.unit_cost
+        self.start_id = start_id
+
+        changed = set()
+        with stats.timer("zone_compile"):
+            for positions, value in ((blocked, 1), (cleared, 0)):
+                for x, y in positions:
+                    c_id = self.calc_index(x, y)
+                    if self.blocked[c_id] != value:
+                        self.blocked[c_id] = value
+                        changed.add(c_id)
+            restart = False
+            for (x, y), multiplier in (multipliers or {}).items():
+                c_id = self.calc_index(x, y)
+                if self.set_multiplier(c_id, multiplier):
+                    restart = True
+                changed.add(c_id)
+
+        with stats.timer("search"):
+            if restart:
+                logger.info("Step costs fell below the heuristic, "
+                            "replanning from scratch")
+                self.reset(self.goal_id)
+            else:
+                # A changed cell alters the steps into it and, when blocked
+                # or cleared, those out of it
+                affected = set(changed)
+                for c_id in changed:
+                    affected.update(n_id for n_id, _ in
+                                    self.get_neighbours(c_id, -1))
+                for c_id in affected:
+                    if c_id != self.goal_id:
+                        self.rhs[c_id] = self.calc_rhs(c_id)
+                    self.update_vertex(c_id)
+            self.compute_shortest_path()
+
+        with stats.timer("path"):
+            rx, ry = self.calc_final_path()
+        logger.debug("Planner stats: %s", stats)
+        return rx, ry
+
+    def set_multiplier(self, c_id, multiplier):
+        """
+        Set the multiplier of cell c_id and its step costs; returns True
+        when a step into it now costs less than the heuristic assumes.
+        """
+        ix, iy = c_id % self.x_width, c_id // self.x_width
+        self.multiplier[ix][iy] = multiplier
+        unit_cost = math.inf
+        for i, (_, _, length) in enumerate(self.motion):
+            total = multiplier
+            if self.jet is not None:
+                total += self.jet[i][ix][iy]
+            self.step_costs[i][c_id] = length * self.cost_per_grid * total
+            unit_cost = min(unit_cost, self.cost_per_grid * total)
+        if unit_cost < self.unit_cost:
+            self.unit_cost = unit_cost
+            return True
+        return False
+
+    def get_neighbours(self, c_id, sign):
+        """
+        (id, step cost) of the cells one step from c_id: those it steps to
+        with sign 1 and those that step to it with sign -1. Steps into or
+        out of a blocked cell cost inf.
+        """
+        x_width, y_width, blocked = self.x_width, self.y_width, self.blocked
+        cx, cy = c_id % x_width, c_id // x_width
+        neighbours = []
+        for (dx, dy, _), step_cost in zip(self.motion, self.step_costs):
+            nx, ny = cx + sign * dx, cy + sign * dy
+            if nx < 0 or ny < 0 or nx >= x_width or ny >= y_width:
+                continue
+            n_id = ny * x_width + nx
+            if blocked[c_id] or blocked[n_id]:
+                neighbours.append((n_id, math.inf))
+            else:
+                neighbours.append(
+                    (n_id, step_cost[n_id if sign > 0 else c_id]))
+        return neighbours
+
+    def calc_rhs(self, c_id):
+        g = self.g
+        return min((cost + g[n_id] for n_id, cost
+                    in self.get_neighbours(c_id, 1)), default=math.inf)
+
+    def update_vertex(self, c_id):
+        if self.g[c_id] != self.rhs[c_id]:
+            key = self.calc_key(c_id)
+            if self.open_keys.get(c_id) != key:
+                self.open_keys[c_id] = key
+                heapq.heappush(self.open_heap, (key[0], key[1], c_id))
+                self.stats.heap_pushes += 1
+                self.stats.peak_open = max(self.stats.peak_open,
+                                           len(self.open_keys))
+        elif c_id in self.open_keys:
+            del self.open_keys[c_id]
+
+    def compute_shortest_path(self, until_id=None):
+        """
+        Expand the open set until the cell until_id (the start by default)
+        is consistent and no open cell has a smaller key, so that its g is
+        its cost to the goal.
+        """
+        g, rhs = self.g, self.rhs
+        open_keys, open_heap = self.open_keys, self.open_heap
+        goal_id = self.goal_id
+        if until_id is None:
+            until_id = self.start_id
+        stats = self.stats
+        while open_heap:
+            k1, k2, c_id = open_heap[0]
+            # Entries of cells since rekeyed or made consistent are stale
+            if open_keys.get(c_id) != (k1, k2):
+                heapq.heappop(open_heap)
+                stats.heap_pops += 1
+                continue
+            if (not self.is_key_less((k1, k2), self.calc_key(until_id))
+                    and rhs[until_id] == g[until_id]):
+                break
+            heapq.heappop(open_heap)
+            stats.heap_pops += 1
+            key = self.calc_key(c_id)
+            if (k1, k2) < key:
+                # km has grown since the cell was queued
+                open_keys[c_id] = key
+                heapq.heappush(open_heap, (key[0], key[1], c_id))
+                stats.heap_pushes += 1
+                continue
+
+            del open_keys[c_id]
+            stats.expanded += 1
+            stats.generated += len(self.motion)
+            if g[c_id] > rhs[c_id]:
+                g[c_id] = rhs[c_id]
+                for n_id, cost in self.get_neighbours(c_id, -1):
+                    if n_id != goal_id and cost + g[c_id] < rhs[n_id]:
+                        rhs[n_id] = cost + g[c_id]
+                        self.update_vertex(n_id)
+            else:
+                old_g = g[c_id]
+                g[c_id] = math.inf
+                for n_id, cost in self.get_neighbours(c_id, -1) + [
+                        (c_id, 0.0)]:
+                    if n_id != goal_id and (
+                            n_id == c_id or rhs[n_id] == cost + old_g):
+                        rhs[n_id] = self.calc_rhs(n_id)
+                    self.update_vertex(n_id)
+
+    def calc_final_path(self):
+        # Walk from start down the cheapest step plus cost to go, only ever
+        # onto consistent cells: then g falls with every step and the walk
+        # cannot go round in circles. A cell left inconsistent is settled
+        # (see compute_shortest_path), which can change the cells behind
+        # it, so the walk then starts over
+        planner, g, rhs = self.planner, self.g, self.rhs
+        c_id, path = self.start_id, [self.start_id]
+        while rhs[self.start_id] < math.inf and c_id != self.goal_id:
+            n_id, _ = min(self.get_neighbours(c_id, 1),
+                          key=lambda n: n[1] + g[n[0]])
+            if g[n_id] != rhs[n_id]:
+                self.compute_shortest_path(n_id)
+                self.compute_shortest_path()
+                c_id, path = self.start_id, [self.start_id]
+                continue
+            c_id = n_id
+            path.append(c_id)
+
+        self.path_cost = rhs[self.start_id]
+        if self.path_cost == math.inf:
+            logger.warning("Open set is empty..")
+            path = [self.goal_id]
+        else:
+            logger.info("Total Trip time required -> %s", self.path_cost)
+
+        rx = [planner.calc_grid_position(c_id % self.x_width, planner.min_x)
+              for c_id in reversed(path)]
+        ry = [planner.calc_grid_position(c_id // self.x_width, planner.min_y)
+              for c_id in reversed(path)]
+        return rx, ry
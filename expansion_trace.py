@@ -0,0 +1,152 @@
+import argparse
+from array import array
+
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+
+
+class ExpansionTrace:
+    """
+    Cells a search expanded, in order, with their g and f values.
+
+    Pass one to planning(..., trace=trace) to see what a headless search
+    did. Storage is allocated up front for every cell of the grid (a
+    search expands each cell at most once), so recording an expansion is
+    three array stores. Cells are flat indices iy * x_width + ix.
+    """
+
+    def __init__(self, x_width, y_width):
+        n = x_width * y_width
+        self.x_width, self.y_width = x_width, y_width
+        self.cell = array('i', [0]) * n
+        self.g = array('d', [0.0]) * n
+        self.f = array('d', [0.0]) * n
+        self.size = 0
+
+    def record(self, cell, g, f):
+        n = self.size
+        if n == len(self.cell):
+            # Searches that expand a cell more than once (e.g. from both
+            # ends) outgrow the first allocation
+            self.cell.extend(self.cell)
+            self.g.extend(self.g)
+            self.f.extend(self.f)
+        self.cell[n] = cell
+        self.g[n] = g
+        self.f[n] = f
+        self.size = n + 1
+
+    def clear(self):
+        self.size = 0
+
+    def save(self, path, planner=None):
+        """
+        Write the trace to an .npz file for replay_trace(), together with
+        the obstacle map and grid geometry of planner when given.
+        """
+        data = {
+            "x_width": self.x_width, "y_width": self.y_width,
+            "cell": np.frombuffer(self.cell, dtype=np.int32)[:self.size],
+            "g": np.frombuffer(self.g)[:self.size],
+            "f": np.frombuffer(self.f)[:self.size],
+        }
+        if planner is not None:
+            data.update(obstacle_map=np.asarray(planner.obstacle_map,
+                                                dtype=bool),
+                        min_x=planner.min_x, min_y=planner.min_y,
+                        resolution=planner.resolution)
+        np.savez_compressed(path, **data)
+
+
+def load_trace(path):
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+
+def calc_trace_grid(trace, values=None, count=None):
+    """
+    grid[iy][ix] of values for the first count expansions of a loaded
+    trace (the expansion order by default), NaN where nothing expanded.
+    """
+    cell = trace["cell"][:count]
+    if values is None:
+        values = np.arange(len(trace["cell"]))
+    grid = np.full(int(trace["x_width"]) * int(trace["y_width"]), np.nan)
+    grid[cell] = values[:len(cell)]
+    return grid.reshape(int(trace["y_width"]), int(trace["x_width"]))
+
+
+def plot_trace(trace, values=None, ax=None):
+    """
+    Heatmap of a loaded trace over its obstacle map, in grid positions.
+    """
+    ax = ax if ax is not None else plt.gca()
+    x_width, y_width = int(trace["x_width"]), int(trace["y_width"])
+    resolution = float(trace.get("resolution", 1.0))
+    min_x = float(trace.get("min_x", 0.0))
+    min_y = float(trace.get("min_y", 0.0))
+    extent = (min_x - resolution / 2, min_x + (x_width - 0.5) * resolution,
+              min_y - resolution / 2, min_y + (y_width - 0.5) * resolution)
+    if "obstacle_map" in trace:
+        ax.imshow(trace["obstacle_map"].T, origin="lower", extent=extent,
+                  cmap="Greys", vmin=0, vmax=1.5)
+    image = ax.imshow(calc_trace_grid(trace, values), origin="lower",
+                      extent=extent, cmap="viridis")
+    ax.set_aspect("equal")
+    return image
+
+
+def replay_trace(trace, path, fps=30, frames=150, values=None):
+    """
+    Render a loaded trace to a video (or .gif) with the expansions
+    appearing in order over frames frames.
+    """
+    from matplotlib.animation import FFMpegWriter, FuncAnimation, PillowWriter
+
+    if values is None:
+        values = np.arange(len(trace["cell"]))
+    fig, ax = plt.subplots()
+    image = plot_trace(trace, values, ax)
+    image.set_clim(np.nanmin(values, initial=0), np.nanmax(values, initial=1))
+    counts = np.linspace(0, len(trace["cell"]), frames).astype(int)
+
+    def update(frame):
+        image.set_data(calc_trace_grid(trace, values, counts[frame]))
+        ax.set_title(f"expanded {counts[frame]} / {len(trace['cell'])}")
+        return image,
+
+    animation = FuncAnimation(fig, update, frames=frames, blit=False)
+    writer = PillowWriter(fps=fps) if str(path).endswith(".gif") \
+        else FFMpegWriter(fps=fps)
+    animation.save(path, writer=writer)
+    plt.close(fig)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Render a recorded search expansion trace offline.")
+    parser.add_argument("trace", help=".npz written by ExpansionTrace.save")
+    parser.add_argument("--heatmap", help="write a heatmap image here")
+    parser.add_argument("--video", help="write a video (.mp4, .gif) here")
+    parser.add_argument("--values", choices=("order", "g", "f"),
+                        default="order", help="what the colours show")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--frames", type=int, default=150)
+    args = parser.parse_args()
+
+    matplotlib.use("Agg")
+    trace = load_trace(args.trace)
+    values = None if args.values == "order" else trace[args.values]
+    print("expanded:", len(trace["cell"]))
+    if args.heatmap:
+        fig, ax = plt.subplots()
+        fig.colorbar(plot_trace(trace, values, ax), ax=ax, label=args.values)
+        fig.savefig(args.heatmap)
+        plt.close(fig)
+    if args.video:
+        replay_trace(trace, args.video, args.fps, args.frames, values)
+
+
+if __name__ == '__main__':
+    main()
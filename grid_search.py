@@ -0,0 +1,720 @@
+import heapq
+import math
+import time
+from array import array
+
+import numpy as np
+
+OPEN = 1
+CLOSED = 2
+# Closed, then reached more cheaply (see anytime_search)
+INCONS = 3
+
+
+class SearchState:
+    """
+    Struct-of-arrays bookkeeping for one grid search.
+
+    Every array is indexed by iy * x_width + ix: cost is the g-cost,
+    parent the index of the cell we came from (-1 for none), flags marks
+    cells OPEN or CLOSED, and order records when a cell first entered the
+    open set so ties on f can be broken first-come first-served.
+    The n_* counters and peak_open describe the search once it is done
+    (see PlannerStats).
+    """
+
+    def __init__(self, x_width, y_width):
+        n = x_width * y_width
+        self.x_width, self.y_width = x_width, y_width
+        self.cost = array('d', [math.inf]) * n
+        self.parent = array('i', [-1]) * n
+        self.flags = bytearray(n)
+        self.order = array('i', [0]) * n
+        self.n_expanded = self.n_generated = self.n_rejected = 0
+        self.n_pushes = self.n_pops = self.peak_open = 0
+
+
+def flatten_obstacle_map(obstacle_map):
+    """
+    obstacle_map[ix][iy] as a bytes object indexed by iy * x_width + ix.
+    """
+    return np.ascontiguousarray(np.asarray(obstacle_map, dtype=bool).T).tobytes()
+
+
+def search(blocked, x_width, y_width, motion, start, goal, step_costs,
+           calc_heuristic=None, on_expand=None, trace=None, jump_stops=None,
+           reverse=None, anytime=None):
+    """
+    Best-first search over the grid from start=(ix, iy) to goal=(ix, iy),
+    or over every reachable cell when goal is None.
+
+    step_costs[i][iy * x_width + ix] is the cost of stepping into cell
+    (ix, iy) with motion[i] (see CostRaster.get_step_costs);
+    calc_heuristic(ix, iy) is the estimate to the goal (None for Dijkstra).
+    on_expand(ix, iy, n_closed) is called for every node taken off the
+    open set, and trace (an ExpansionTrace) records each of them with its
+    g and f values.
+
+    With jump_stops (see CostRaster.get_jump_stops) the search runs as
+    jump point search instead; see jump_point_search. With
+    reverse=(reverse_step_costs, calc_reverse_heuristic) it searches from
+    both ends; see bidirectional_search. With anytime=(weights, deadline,
+    on_solution) it runs as anytime repairing A*; see anytime_search.
+
+    Returns (state, goal_id), with goal_id -1 when the goal is unreachable.
+    """
+    if jump_stops is not None and reverse is not None:
+        raise ValueError("jump point search cannot run bidirectionally")
+    if anytime is not None:
+        if jump_stops is not None or reverse is not None:
+            raise ValueError("anytime search runs neither as jump point "
+                             "search nor bidirectionally")
+        weights, deadline, on_solution = anytime
+        return anytime_search(blocked, x_width, y_width, motion, start, goal,
+                              step_costs, calc_heuristic, weights, deadline,
+                              on_solution, on_expand, trace)
+    if reverse is not None:
+        reverse_step_costs, calc_reverse_heuristic = reverse
+        return bidirectional_search(blocked, x_width, y_width, motion, start,
+                                    goal, step_costs, reverse_step_costs,
+                                    calc_heuristic, calc_reverse_heuristic,
+                                    on_expand, trace)
+    if jump_stops is not None:
+        return jump_point_search(blocked, x_width, y_width, motion, start,
+                                 goal, step_costs, jump_stops, calc_heuristic,
+                                 on_expand, trace)
+    state = SearchState(x_width, y_width)
+    cost, parent, flags, order = state.cost, state.parent, state.flags, \
+        state.order
+    heappush, heappop = heapq.heappush, heapq.heappop
+    record = trace.record if trace is not None else None
+
+    start_id = start[1] * x_width + start[0]
+    goal_id = -1 if goal is None else goal[1] * x_width + goal[0]
+    cost[start_id] = 0.0
+    flags[start_id] = OPEN
+    h = calc_heuristic(start[0], start[1]) if calc_heuristic else 0.0
+    open_heap = [(0.0 + h, 0, start_id)]
+    n_open, n_seen, n_closed = 1, 1, 0
+    n_rejected, n_pops, peak_open = 0, 0, 1
+    found_id = -1
+
+    while n_open:
+        f, _, c_id = heappop(open_heap)
+        n_pops += 1
+        # An improved node leaves older, worse entries behind in the heap;
+        # they are popped after the node has been closed and skipped here.
+        if flags[c_id] != OPEN:
+            continue
+
+        cx, cy = c_id % x_width, c_id // x_width
+        if record is not None:
+            record(c_id, cost[c_id], f)
+        if on_expand is not None:
+            on_expand(cx, cy, n_closed)
+
+        if c_id == goal_id:
+            found_id = goal_id
+            break
+
+        flags[c_id] = CLOSED
+        n_open -= 1
+        n_closed += 1
+        c_cost = cost[c_id]
+
+        for (dx, dy, _), step_cost in zip(motion, step_costs):
+            nx, ny = cx + dx, cy + dy
+            if nx < 0 or ny < 0 or nx >= x_width or ny >= y_width:
+                n_rejected += 1
+                continue
+            n_id = ny * x_width + nx
+            if blocked[n_id]:
+                n_rejected += 1
+                continue
+            n_flag = flags[n_id]
+            if n_flag == CLOSED:
+                continue
+
+            n_cost = c_cost + step_cost[n_id]
+            if n_flag == OPEN:
+                if cost[n_id] <= n_cost:
+                    continue
+            else:
+                flags[n_id] = OPEN
+                order[n_id] = n_seen
+                n_seen += 1
+                n_open += 1
+                if n_open > peak_open:
+                    peak_open = n_open
+
+            cost[n_id] = n_cost
+            parent[n_id] = c_id
+            h = calc_heuristic(nx, ny) if calc_heuristic else 0.0
+            heappush(open_heap, (n_cost + h, order[n_id], n_id))
+
+    state.n_expanded = n_closed + (found_id != -1)
+    state.n_generated = n_closed * len(motion)
+    state.n_rejected = n_rejected
+    state.n_pops = n_pops
+    # Every entry pushed was either popped or is still in the heap
+    state.n_pushes = n_pops + len(open_heap)
+    state.peak_open = peak_open
+    return state, found_id
+
+
+def bidirectional_search(blocked, x_width, y_width, motion, start, goal,
+                         step_costs, reverse_step_costs, calc_heuristic=None,
+                         calc_reverse_heuristic=None, on_expand=None,
+                         trace=None):
+    """
+    search() from start and from goal at the same time.
+
+    The backward search steps with reverse_step_costs (see
+    CostRaster.get_reverse_step_costs), so it pays what the forward step
+    it undoes would: the zone cost of the cell the forward step enters and
+    the jet stream discount of its direction. calc_reverse_heuristic(ix,
+    iy) estimates the cost from start to (ix, iy).
+
+    The two heuristics are averaged into one potential p = (h - h_rev) / 2
+    that the forward search adds to g and the backward search subtracts,
+    so both sides order their cells consistently with each other. Each
+    turn expands the side with the smaller open set. Whenever a cell has
+    been reached from both ends the sum of its costs is a candidate path,
+    and the search stops once the smallest keys of the two sides add up
+    to no less than the best candidate; with consistent heuristics no
+    cheaper path can remain.
+
+    Returns (state, goal_id) like search(): state holds the forward search
+    with the backward half of the path linked onto it, so parents walk
+    from goal back to start and state.cost[goal_id] is the path cost. The
+    counters add up both sides.
+    """
+    def calc_potential(ix, iy):
+        h = calc_heuristic(ix, iy) if calc_heuristic else 0.0
+        h_rev = calc_reverse_heuristic(ix, iy) if calc_reverse_heuristic \
+            else 0.0
+        return (h - h_rev) / 2
+
+    start_id = start[1] * x_width + start[0]
+    goal_id = goal[1] * x_width + goal[0]
+    forward = SearchState(x_width, y_width)
+    backward = SearchState(x_width, y_width)
+    heappush, heappop = heapq.heappush, heapq.heappop
+    record = trace.record if trace is not None else None
+
+    # Per side: [state, other side's state, step costs, sign of the
+    # potential, open heap, cells open, cells seen]
+    sides = []
+    for state, other, costs, sign, root in (
+            (forward, backward, step_costs, 1.0, start),
+            (backward, forward, reverse_step_costs, -1.0, goal)):
+        root_id = root[1] * x_width + root[0]
+        state.cost[root_id] = 0.0
+        state.flags[root_id] = OPEN
+        key = sign * calc_potential(root[0], root[1])
+        sides.append([state, other, costs, sign, [(key, 0, root_id)], 1, 1])
+
+    best, meet_id = (0.0, start_id) if start_id == goal_id else (math.inf, -1)
+    n_expanded = n_rejected = n_pops = 0
+    peak_open = 2
+    while sides[0][5] and sides[1][5]:
+        for side in sides:
+            # Drop entries left behind by cells improved since
+            heap, flags = side[4], side[0].flags
+            while flags[heap[0][2]] != OPEN:
+                heappop(heap)
+                n_pops += 1
+        if sides[0][4][0][0] + sides[1][4][0][0] >= best:
+            break
+
+        side = sides[0] if sides[0][5] <= sides[1][5] else sides[1]
+        state, other, costs, sign, heap = side[:5]
+        cost, parent, flags, order = state.cost, state.parent, state.flags, \
+            state.order
+        other_cost = other.cost
+        key, _, c_id = heappop(heap)
+        n_pops += 1
+        cx, cy = c_id % x_width, c_id // x_width
+        if record is not None:
+            record(c_id, cost[c_id], key)
+        if on_expand is not None:
+            on_expand(cx, cy, n_expanded)
+        flags[c_id] = CLOSED
+        side[5] -= 1
+        n_expanded += 1
+        c_cost = cost[c_id]
+
+        for (dx, dy, _), step_cost in zip(motion, costs):
+            nx, ny = cx + dx, cy + dy
+            if nx < 0 or ny < 0 or nx >= x_width or ny >= y_width:
+                n_rejected += 1
+                continue
+            n_id = ny * x_width + nx
+            if blocked[n_id]:
+                n_rejected += 1
+                continue
+            n_flag = flags[n_id]
+            if n_flag == CLOSED:
+                continue
+
+            n_cost = c_cost + step_cost[n_id]
+            if n_flag == OPEN:
+                if cost[n_id] <= n_cost:
+                    continue
+            else:
+                flags[n_id] = OPEN
+                order[n_id] = side[6]
+                side[6] += 1
+                side[5] += 1
+                peak_open = max(peak_open, sides[0][5] + sides[1][5])
+
+            cost[n_id] = n_cost
+            parent[n_id] = c_id
+            if n_cost + other_cost[n_id] < best:
+                best = n_cost + other_cost[n_id]
+                meet_id = n_id
+            heappush(heap, (n_cost + sign * calc_potential(nx, ny),
+                            order[n_id], n_id))
+
+    forward.n_expanded = n_expanded
+    forward.n_generated = n_expanded * len(motion)
+    forward.n_rejected = n_rejected
+    forward.n_pops = n_pops
+    forward.n_pushes = n_pops + len(sides[0][4]) + len(sides[1][4])
+    forward.peak_open = peak_open
+    if meet_id == -1:
+        return forward, -1
+
+    # Link the backward half of the path, meet -> goal, onto the forward
+    # parents so it reads goal -> meet
+    c_id = meet_id
+    while backward.parent[c_id] != -1:
+        n_id = backward.parent[c_id]
+        forward.parent[n_id] = c_id
+        c_id = n_id
+    forward.cost[goal_id] = best
+    return forward, goal_id
+
+
+def anytime_search(blocked, x_width, y_width, motion, start, goal,
+                   step_costs, calc_heuristic, weights, deadline=None,
+                   on_solution=None, on_expand=None, trace=None):
+    """
+    search() with the heuristic inflated by each of weights in turn, as
+    Likhachev's anytime repairing A* (ARA*).
+
+    The first weight finds a path quickly; each later one improves it.
+    Ordering cells by g + w * h can close a cell before its cheapest path
+    is known; such cells are set aside when they improve and reopened for
+    the next weight together with the open set, while every other cost and
+    parent is kept, so each round only repairs what the last one left
+    behind. A round ends once no open cell sorts before the goal.
+
+    After each round on_solution(cost, bound) is called with the cost of
+    the path found so far and a bound on how many times the cheapest path
+    it may cost: the round's weight, or tighter, the cost over the lowest
+    g + h of the cells still open or set aside. A bound of 1.0 means the
+    path is optimal; weights should end with 1.0 to get there.
+
+    deadline is a time.perf_counter() value. Once it has passed, the
+    search stops with the best path so far; the first round always runs
+    to the end, so there is a path with a bound if the goal is reachable.
+
+    Returns (state, goal_id) like search(), with state.cost[goal_id] the
+    cost of the path the parents walk; the counters add up every round.
+    """
+    state = SearchState(x_width, y_width)
+    cost, parent, flags, order = state.cost, state.parent, state.flags, \
+        state.order
+    heappush, heappop = heapq.heappush, heapq.heappop
+    record = trace.record if trace is not None else None
+    perf_counter = time.perf_counter
+    n = x_width * y_width
+    # h of every cell seen, worked out once for all rounds
+    h_cost = array('d', [math.nan]) * n
+
+    start_id = start[1] * x_width + start[0]
+    goal_id = goal[1] * x_width + goal[0]
+    cost[start_id] = 0.0
+    flags[start_id] = OPEN
+    h_cost[start_id] = calc_heuristic(start[0], start[1]) \
+        if calc_heuristic else 0.0
+    open_ids = [start_id]
+    n_seen, n_closed, n_rejected, n_pops, n_pushes, peak_open = \
+        1, 0, 0, 0, 0, 1
+    bound = math.inf
+    timed_out = False
+
+    for w in weights:
+        # The keys of the open cells change with the weight
+        open_heap = [(cost[i] + w * h_cost[i], order[i], i)
+                     for i in set(open_ids) if flags[i] == OPEN]
+        heapq.heapify(open_heap)
+        n_pushes += len(open_heap)
+        closed_ids, incons_ids = [], []
+        n_open = len(open_heap)
+        goal_cost = cost[goal_id]
+
+        while n_open:
+            key, _, c_id = open_heap[0]
+            if flags[c_id] != OPEN:
+                heappop(open_heap)
+                n_pops += 1
+                continue
+            if goal_cost <= key:
+                break
+            if (deadline is not None and bound < math.inf
+                    and perf_counter() >= deadline):
+                timed_out = True
+                break
+            heappop(open_heap)
+            n_pops += 1
+
+            cx, cy = c_id % x_width, c_id // x_width
+            if record is not None:
+                record(c_id, cost[c_id], key)
+            if on_expand is not None:
+                on_expand(cx, cy, n_closed)
+
+            flags[c_id] = CLOSED
+            closed_ids.append(c_id)
+            n_open -= 1
+            n_closed += 1
+            c_cost = cost[c_id]
+
+            for (dx, dy, _), step_cost in zip(motion, step_costs):
+                nx, ny = cx + dx, cy + dy
+                if nx < 0 or ny < 0 or nx >= x_width or ny >= y_width:
+                    n_rejected += 1
+                    continue
+                n_id = ny * x_width + nx
+                if blocked[n_id]:
+                    n_rejected += 1
+                    continue
+                n_cost = c_cost + step_cost[n_id]
+                if cost[n_id] <= n_cost:
+                    continue
+                cost[n_id] = n_cost
+                parent[n_id] = c_id
+                if n_id == goal_id:
+                    goal_cost = n_cost
+                n_flag = flags[n_id]
+                if n_flag == CLOSED:
+                    flags[n_id] = INCONS
+                    incons_ids.append(n_id)
+                    continue
+                if n_flag == INCONS:
+                    continue
+                if n_flag != OPEN:
+                    flags[n_id] = OPEN
+                    if h_cost[n_id] != h_cost[n_id]:
+                        order[n_id] = n_seen
+                        n_seen += 1
+                        h_cost[n_id] = calc_heuristic(nx, ny) \
+                            if calc_heuristic else 0.0
+                    n_open += 1
+                    if n_open > peak_open:
+                        peak_open = n_open
+                heappush(open_heap, (n_cost + w * h_cost[n_id],
+                                     order[n_id], n_id))
+                n_pushes += 1
+
+        if goal_cost == math.inf:
+            # Nothing left to search, so the goal is unreachable
+            break
+        if timed_out:
+            # The path may have improved during the round, but only the
+            # last finished round's bound is known to hold for it
+            if on_solution is not None:
+                on_solution(goal_cost, bound)
+            break
+
+        open_ids = [i for _, _, i in open_heap if flags[i] == OPEN]
+        lower = min((cost[i] + h_cost[i] for i in open_ids + incons_ids),
+                    default=goal_cost)
+        if goal_cost <= lower:
+            bound = 1.0
+        else:
+            bound = min(bound, float(w),
+                        goal_cost / lower if lower > 0.0 else math.inf)
+        if on_solution is not None:
+            on_solution(goal_cost, bound)
+        if bound == 1.0:
+            break
+        for i in incons_ids:
+            flags[i] = OPEN
+        open_ids += incons_ids
+        for i in closed_ids:
+            if flags[i] == CLOSED:
+                flags[i] = 0
+
+    state.n_expanded = n_closed
+    state.n_generated = n_closed * len(motion)
+    state.n_rejected = n_rejected
+    state.n_pops = n_pops
+    state.n_pushes = n_pushes
+    state.peak_open = peak_open
+    if cost[goal_id] == math.inf:
+        return state, -1
+
+    # A cell closed before its cheapest path was found keeps children
+    # costed from the older path, so work out what the path really costs
+    path = [goal_id]
+    while parent[path[-1]] != -1:
+        path.append(parent[path[-1]])
+    step_index = {(dx, dy): i for i, (dx, dy, _) in enumerate(motion)}
+    g = 0.0
+    for p_id, c_id in zip(path[:0:-1], path[-2::-1]):
+        i = step_index[(c_id % x_width - p_id % x_width,
+                        c_id // x_width - p_id // x_width)]
+        g += step_costs[i][c_id]
+    cost[goal_id] = g
+    return state, goal_id
+
+
+def calc_jump_hits(blocked, jump_stops, x_width, y_width):
+    """
+    Where straight jumps end, for jump point search: (east, west, north,
+    south) bytes objects that are 1 where a jump in that direction must
+    stop on entering the cell, as it is blocked, a jump stop or has a
+    forced neighbour. east and west are indexed by iy * x_width + ix,
+    north and south by ix * y_width + iy, so every jump is a bytes.find
+    over one row or column.
+    """
+    shape = (y_width, x_width)
+    grid = np.frombuffer(bytes(blocked), dtype=bool).reshape(shape)
+    ends = grid | np.frombuffer(bytes(jump_stops), dtype=bool).reshape(shape)
+    # padded[iy + 1, ix + 1] is cell (ix, iy); off the map counts as blocked
+    padded = np.pad(grid, 1, constant_values=True)
+    free = ~padded
+    east = ends | (padded[2:, 1:-1] & free[2:, 2:]) \
+        | (padded[:-2, 1:-1] & free[:-2, 2:])
+    west = ends | (padded[2:, 1:-1] & free[2:, :-2]) \
+        | (padded[:-2, 1:-1] & free[:-2, :-2])
+    north = ends | (padded[1:-1, 2:] & free[2:, 2:]) \
+        | (padded[1:-1, :-2] & free[2:, :-2])
+    south = ends | (padded[1:-1, 2:] & free[:-2, 2:]) \
+        | (padded[1:-1, :-2] & free[:-2, :-2])
+    return (east.tobytes(), west.tobytes(),
+            np.ascontiguousarray(north.T).tobytes(),
+            np.ascontiguousarray(south.T).tobytes())
+
+
+def jump_point_search(blocked, x_width, y_width, motion, start, goal,
+                      step_costs, jump_stops, calc_heuristic=None,
+                      on_expand=None, trace=None):
+    """
+    search() for the 8-connected motion model that jumps over cells of
+    uniform cost instead of expanding them one by one.
+
+    From each expanded cell only the neighbours that no cheaper or equal
+    path reaches without it are followed (Harabor and Grastien's pruning
+    rules), and each of those is followed in a straight or diagonal line
+    until it reaches the goal, a cell with a forced neighbour next to an
+    obstacle, or a jump stop. The rules assume every step costs the same
+    multiple of its motion, so jump_stops[iy * x_width + ix] marks the
+    cells where that changes (the edges of cost zones and the jet stream);
+    jumps end there and those cells are expanded in every direction like
+    in search(). Path costs are the same as search() gives, up to rounding.
+
+    Only jump points are expanded, so the state's counters count jumps:
+    n_generated the jumps started and n_rejected those that ran into an
+    obstacle or off the map. Before returning, the parents along the
+    path to the goal are filled in cell by cell, so the path can be
+    walked back one step at a time as after search(); elsewhere parent
+    links jump.
+    """
+    state = SearchState(x_width, y_width)
+    cost, parent, flags, order = state.cost, state.parent, state.flags, \
+        state.order
+    heappush, heappop = heapq.heappush, heapq.heappop
+    record = trace.record if trace is not None else None
+    step_index = {(dx, dy): i for i, (dx, dy, _) in enumerate(motion)}
+    all_directions = [(dx, dy) for dx, dy, _ in motion]
+    if len(step_index) != 8 or any(max(abs(dx), abs(dy)) != 1
+                                   for dx, dy in step_index):
+        raise ValueError("jump point search needs the 8-connected motion "
+                         "model")
+
+    hits = calc_jump_hits(blocked, jump_stops, x_width, y_width)
+    east, west, north, south = hits
+    goal_x, goal_y = goal if goal is not None else (-1, -1)
+
+    def is_free(x, y):
+        return (0 <= x < x_width and 0 <= y < y_width
+                and not blocked[y * x_width + x])
+
+    def find_straight(x, y, dx, dy):
+        # (jump point id, steps to it) of a straight jump from (x, y), or
+        # (-1, 0) when it runs into an obstacle or off the map
+        if dx:
+            row = y * x_width
+            if dx > 0:
+                i = east.find(1, row + x + 1, row + x_width)
+            else:
+                i = west.rfind(1, row, row + x)
+            end = i - row
+            if (goal_y == y and (goal_x - x) * dx > 0
+                    and (i == -1 or (end - goal_x) * dx >= 0)):
+                return goal_id, abs(goal_x - x)
+            if i == -1 or blocked[i]:
+                return -1, 0
+            return i, abs(end - x)
+        column = x * y_width
+        if dy > 0:
+            i = north.find(1, column + y + 1, column + y_width)
+        else:
+            i = south.rfind(1, column, column + y)
+        end = i - column
+        if (goal_x == x and (goal_y - y) * dy > 0
+                and (i == -1 or (end - goal_y) * dy >= 0)):
+            return goal_id, abs(goal_y - y)
+        n_id = end * x_width + x
+        if i == -1 or blocked[n_id]:
+            return -1, 0
+        return n_id, abs(end - y)
+
+    def jump(x, y, dx, dy, g):
+        # (jump point id, cost to reach it) of the jump from (x, y) along
+        # (dx, dy), or (-1, g) when it runs into an obstacle
+        step_cost = step_costs[step_index[(dx, dy)]]
+        if not (dx and dy):
+            n_id, steps = find_straight(x, y, dx, dy)
+            if n_id == -1:
+                return -1, g
+            if steps > 1:
+                # The cells passed over are no jump stops, so they all cost
+                # the plain step cost
+                g += (steps - 1) * step_cost[(y + dy) * x_width + x + dx]
+            return n_id, g + step_cost[n_id]
+        while True:
+            x, y = x + dx, y + dy
+            if not is_free(x, y):
+                return -1, g
+            n_id = y * x_width + x
+            g += step_cost[n_id]
+            if n_id == goal_id or jump_stops[n_id]:
+                return n_id, g
+            if ((not is_free(x - dx, y) and is_free(x - dx, y + dy))
+                    or (not is_free(x, y - dy) and is_free(x + dx, y - dy))
+                    or find_straight(x, y, dx, 0)[0] != -1
+                    or find_straight(x, y, 0, dy)[0] != -1):
+                return n_id, g
+
+    def sign(v):
+        return (v > 0) - (v < 0)
+
+    start_id = start[1] * x_width + start[0]
+    goal_id = -1 if goal is None else goal[1] * x_width + goal[0]
+    cost[start_id] = 0.0
+    flags[start_id] = OPEN
+    h = calc_heuristic(start[0], start[1]) if calc_heuristic else 0.0
+    open_heap = [(0.0 + h, 0, start_id)]
+    n_open, n_seen, n_closed = 1, 1, 0
+    n_generated, n_rejected, n_pops, peak_open = 0, 0, 0, 1
+    found_id = -1
+
+    while n_open:
+        f, _, c_id = heappop(open_heap)
+        n_pops += 1
+        if flags[c_id] != OPEN:
+            continue
+
+        cx, cy = c_id % x_width, c_id // x_width
+        if record is not None:
+            record(c_id, cost[c_id], f)
+        if on_expand is not None:
+            on_expand(cx, cy, n_closed)
+
+        if c_id == goal_id:
+            found_id = goal_id
+            break
+
+        flags[c_id] = CLOSED
+        n_open -= 1
+        n_closed += 1
+        c_cost = cost[c_id]
+
+        p_id = parent[c_id]
+        if p_id == -1 or jump_stops[c_id]:
+            directions = all_directions
+        else:
+            dx = sign(cx - p_id % x_width)
+            dy = sign(cy - p_id // x_width)
+            if dx and dy:
+                directions = [(dx, 0), (0, dy), (dx, dy)]
+                if not is_free(cx - dx, cy):
+                    directions.append((-dx, dy))
+                if not is_free(cx, cy - dy):
+                    directions.append((dx, -dy))
+            elif dx:
+                directions = [(dx, 0)]
+                if not is_free(cx, cy + 1):
+                    directions.append((dx, 1))
+                if not is_free(cx, cy - 1):
+                    directions.append((dx, -1))
+            else:
+                directions = [(0, dy)]
+                if not is_free(cx + 1, cy):
+                    directions.append((1, dy))
+                if not is_free(cx - 1, cy):
+                    directions.append((-1, dy))
+
+        for dx, dy in directions:
+            n_generated += 1
+            n_id, n_cost = jump(cx, cy, dx, dy, c_cost)
+            if n_id == -1:
+                n_rejected += 1
+                continue
+            n_flag = flags[n_id]
+            if n_flag == CLOSED:
+                continue
+            if n_flag == OPEN:
+                if cost[n_id] <= n_cost:
+                    continue
+            else:
+                flags[n_id] = OPEN
+                order[n_id] = n_seen
+                n_seen += 1
+                n_open += 1
+                if n_open > peak_open:
+                    peak_open = n_open
+
+            cost[n_id] = n_cost
+            parent[n_id] = c_id
+            nx, ny = n_id % x_width, n_id // x_width
+            h = calc_heuristic(nx, ny) if calc_heuristic else 0.0
+            heappush(open_heap, (n_cost + h, order[n_id], n_id))
+
+    # Fill in the cells each jump of the path passed over
+    c_id = found_id
+    while c_id != -1 and parent[c_id] != -1:
+        p_id = parent[c_id]
+        cx, cy = c_id % x_width, c_id // x_width
+        dx = sign(p_id % x_width - cx)
+        dy = sign(p_id // x_width - cy)
+        while c_id != p_id:
+            cx, cy = cx + dx, cy + dy
+            parent[c_id] = cy * x_width + cx
+            c_id = parent[c_id]
+
+    state.n_expanded = n_closed + (found_id != -1)
+    state.n_generated = n_generated
+    state.n_rejected = n_rejected
+    state.n_pops = n_pops
+    state.n_pushes = n_pops + len(open_heap)
+    state.peak_open = peak_open
+    return state, found_id
+
+
+def calc_cost_field(blocked, x_width, y_width, motion, root, step_costs):
+    """
+    Cheapest cost from root=(ix, iy) to every cell, indexed by
+    iy * x_width + ix (inf where unreachable).
+
+    With CostRaster.get_reverse_step_costs() this is instead the cheapest
+    cost from every cell to root.
+    """
+    state, _ = search(blocked, x_width, y_width, motion, root, None,
+                      step_costs)
+    return state.cost
@@ -0,0 +1,171 @@
+import math
+
+import numpy as np
+
+HEURISTICS = {}
+
+
+def register_heuristic(name):
+    """
+    Add a heuristic factory to HEURISTICS under name.
+
+    A factory is called as factory(goal, motion, cost_raster, reverse,
+    landmarks) with the goal cell (ix, iy) and returns calc_heuristic(ix,
+    iy) for grid_search.search. With reverse the estimate is for the
+    backward search of a bidirectional search, rooted at goal and stepping
+    with CostRaster.get_reverse_step_costs(). landmarks is a
+    landmarks.LandmarkTable, or None when the caller has not built one.
+    Registered heuristics must be
+    consistent (never drop by more than the cost of a step), as search
+    does not reopen closed cells.
+    """
+    def register(factory):
+        HEURISTICS[name] = factory
+        return factory
+    return register
+
+
+def is_four_connected(motion):
+    return all(abs(dx) + abs(dy) == 1 for dx, dy, _ in motion)
+
+
+def is_eight_connected(motion):
+    return all(max(abs(dx), abs(dy)) == 1 for dx, dy, _ in motion)
+
+
+def select_heuristic(motion):
+    """
+    Tightest registered heuristic that is admissible for motion: Manhattan
+    for 4-connected grids, the zone-aware octile bound for 8-connected ones
+    and Euclidean for any other motion model.
+    """
+    if is_four_connected(motion):
+        return "manhattan"
+    if is_eight_connected(motion):
+        return "zone"
+    return "euclidean"
+
+
+def make_heuristic(name, goal, motion, cost_raster, reverse=False,
+                   landmarks=None):
+    """
+    calc_heuristic(ix, iy) of heuristic name (None selects one for motion)
+    towards goal=(ix, iy), for a search with reversed step costs when
+    reverse is set. The "alt" heuristic needs landmarks, a LandmarkTable.
+    """
+    if name is None:
+        name = select_heuristic(motion)
+    if name not in HEURISTICS:
+        raise ValueError(f"unknown heuristic {name!r}, "
+                         f"expected one of {sorted(HEURISTICS)}")
+    return HEURISTICS[name](goal, motion, cost_raster, reverse, landmarks)
+
+
+@register_heuristic("euclidean")
+def make_euclidean_heuristic(goal, motion, cost_raster, reverse=False,
+                             landmarks=None):
+    gx, gy = goal
+    unit_cost = cost_raster.calc_min_unit_cost()
+
+    def calc_heuristic(ix, iy):
+        return math.hypot(ix - gx, iy - gy) * unit_cost
+    return calc_heuristic
+
+
+@register_heuristic("octile")
+def make_octile_heuristic(goal, motion, cost_raster, reverse=False,
+                          landmarks=None):
+    """
+    Exact step count of an 8-connected grid: straight steps for the
+    difference of the axes and diagonal steps for the rest.
+    """
+    if not is_eight_connected(motion):
+        raise ValueError("octile heuristic needs an 8-connected motion model")
+    gx, gy = goal
+    unit_cost = cost_raster.calc_min_unit_cost()
+    diagonal = math.sqrt(2) - 2.0
+
+    def calc_heuristic(ix, iy):
+        dx, dy = abs(ix - gx), abs(iy - gy)
+        return (dx + dy + diagonal * min(dx, dy)) * unit_cost
+    return calc_heuristic
+
+
+@register_heuristic("manhattan")
+def make_manhattan_heuristic(goal, motion, cost_raster, reverse=False,
+                             landmarks=None):
+    if not is_four_connected(motion):
+        raise ValueError("manhattan heuristic needs a 4-connected motion "
+                         "model; it overestimates diagonal steps")
+    gx, gy = goal
+    unit_cost = cost_raster.calc_min_unit_cost()
+
+    def calc_heuristic(ix, iy):
+        return (abs(ix - gx) + abs(iy - gy)) * unit_cost
+    return calc_heuristic
+
+
+def calc_ring_costs(goal, min_step_cost_grid):
+    """
+    ring_costs[d] is a lower bound on the cost from any cell d rings
+    (Chebyshev distance d) away from goal to goal on an 8-connected grid.
+
+    A step changes the ring by at most one, so a path from ring d enters
+    rings d - 1, ..., 0 in turn and pays at least the cheapest entry cost
+    of each of them.
+    """
+    gx, gy = goal
+    x_width, y_width = min_step_cost_grid.shape
+    n_rings = max(gx, x_width - 1 - gx, gy, y_width - 1 - gy) + 1
+    ring_min = np.empty(n_rings)
+    for k in range(n_rings):
+        x0, x1 = max(gx - k, 0), min(gx + k, x_width - 1) + 1
+        y0, y1 = max(gy - k, 0), min(gy + k, y_width - 1) + 1
+        edges = []
+        if gx - k >= 0:
+            edges.append(min_step_cost_grid[gx - k, y0:y1])
+        if gx + k < x_width:
+            edges.append(min_step_cost_grid[gx + k, y0:y1])
+        if gy - k >= 0:
+            edges.append(min_step_cost_grid[x0:x1, gy - k])
+        if gy + k < y_width:
+            edges.append(min_step_cost_grid[x0:x1, gy + k])
+        ring_min[k] = min(edge.min() for edge in edges)
+    return np.concatenate(([0.0], np.cumsum(ring_min))).tolist()
+
+
+@register_heuristic("zone")
+def make_zone_heuristic(goal, motion, cost_raster, reverse=False,
+                        landmarks=None):
+    """
+    Larger of the octile bound and the ring bound of calc_ring_costs.
+
+    The ring bound sees the cost zones around the goal: when every way in
+    crosses a zone it charges the zone's multiplier for those steps, where
+    the octile bound assumes the cheapest cell of the whole grid.
+    """
+    octile = make_octile_heuristic(goal, motion, cost_raster)
+    ring_costs = calc_ring_costs(
+        goal, cost_raster.get_min_step_cost_grid(reverse))
+    gx, gy = goal
+
+    def calc_heuristic(ix, iy):
+        ring_cost = ring_costs[max(abs(ix - gx), abs(iy - gy))]
+        h = octile(ix, iy)
+        return h if h > ring_cost else ring_cost
+    return calc_heuristic
+
+
+@register_heuristic("alt")
+def make_landmark_heuristic(goal, motion, cost_raster, reverse=False,
+                            landmarks=None):
+    """
+    ALT bound: the largest triangle-inequality bound through the landmarks
+    of a LandmarkTable (see landmarks.get_landmark_table). The landmark
+    costs are exact, zones and jet stream included, so it is far tighter
+    than a distance bound wherever the path bends round obstacles or
+    zones.
+    """
+    if landmarks is None:
+        raise ValueError("alt heuristic needs a landmark table")
+    return landmarks.make_heuristic(goal, reverse)
@@ -0,0 +1,514 @@
+import argparse
+import hashlib
+import heapq
+import json
+import logging
+import math
+import os
+from array import array
+
+import numpy as np
+
+from grid_search import calc_cost_field, flatten_obstacle_map, search
+from obstacle_map import ObstacleMapCache
+from planner_stats import PlannerStats
+
+logger = logging.getLogger(__name__)
+
+# Border runs at least this long get an entrance at each end, shorter ones a
+# single entrance in the middle
+MIN_SPLIT_RUN = 6
+
+
+def calc_runs(free):
+    """
+    (first, last) index of each run of True in the 1-D bool array free.
+    """
+    edges = np.diff(np.concatenate(([0], free.astype(np.int8), [0])))
+    return list(zip(np.flatnonzero(edges == 1).tolist(),
+                    (np.flatnonzero(edges == -1) - 1).tolist()))
+
+
+def calc_exits(padded_blocked, diagonal=False):
+    """
+    Entrances of one cluster as [(lx, ly, dx, dy)]: cell (lx, ly) of the
+    cluster is an entrance and (lx + dx, ly + dy) the entrance of the
+    neighbouring cluster it leads to.
+
+    padded_blocked[ly + 1, lx + 1] is cell (lx, ly) of the cluster, with a
+    ring of the cells around it (blocked off the map). Entrances are placed
+    on the runs of border cells that are free on both sides; the cluster on
+    the other side sees the same runs, so the two agree on them.
+
+    With diagonal (a motion model with the four diagonal steps) clusters
+    can also meet where a diagonal step crosses the border: at a corner
+    into the cluster diagonally across, and along a side wherever neither
+    of the two cells it joins lies on a run. Elsewhere a run next to the
+    step already connects the same cells, so only those crossings get an
+    entrance of their own, again seen alike from both sides.
+    """
+    free = ~padded_blocked
+    y_width, x_width = free.shape[0] - 2, free.shape[1] - 2
+    exits = []
+    for dx, dy, inside, outside in (
+            (-1, 0, free[1:-1, 1], free[1:-1, 0]),
+            (1, 0, free[1:-1, -2], free[1:-1, -1]),
+            (0, -1, free[1, 1:-1], free[0, 1:-1]),
+            (0, 1, free[-2, 1:-1], free[-1, 1:-1])):
+        for first, last in calc_runs(inside & outside):
+            if last - first + 1 < MIN_SPLIT_RUN:
+                positions = [(first + last) // 2]
+            else:
+                positions = [first, last]
+            for k in positions:
+                lx = k if dy else (0 if dx < 0 else x_width - 1)
+                ly = k if dx else (0 if dy < 0 else y_width - 1)
+                exits.append((lx, ly, dx, dy))
+        if not diagonal:
+            continue
+        straight = inside & outside
+        for s in (-1, 1):
+            # Crossings from border cell k to the outside cell k + s
+            for k in range(max(0, -s), len(inside) - max(0, s)):
+                if (inside[k] and outside[k + s] and not straight[k]
+                        and not straight[k + s]):
+                    lx = k if dy else (0 if dx < 0 else x_width - 1)
+                    ly = k if dx else (0 if dy < 0 else y_width - 1)
+                    exits.append((lx, ly, dx or s, dy or s))
+    if diagonal:
+        for dx, dy in ((-1, -1), (1, -1), (-1, 1), (1, 1)):
+            lx = 0 if dx < 0 else x_width - 1
+            ly = 0 if dy < 0 else y_width - 1
+            if free[ly + 1, lx + 1] and free[ly + 1 + dy, lx + 1 + dx]:
+                exits.append((lx, ly, dx, dy))
+    return exits
+
+
+def calc_cluster_key(padded_blocked, step_cost_grids, motion):
+    """
+    Hash of everything the entrances and entrance costs of a cluster depend
+    on: its obstacles and those around it, its step costs and the motion
+    model. It does not include where the cluster is, so clusters that look
+    the same share their cache entry.
+    """
+    h = hashlib.sha256()
+    h.update(str(ClusterCache.version).encode())
+    h.update(repr((padded_blocked.shape, tuple(motion))).encode())
+    h.update(np.packbits(padded_blocked).tobytes())
+    for grid in step_cost_grids:
+        h.update(np.ascontiguousarray(grid).tobytes())
+    return h.hexdigest()
+
+
+def calc_entrance_costs(blocked, x_width, y_width, motion, step_costs,
+                        entrances):
+    """
+    costs[i][j] is the cheapest cost from entrance i to entrance j that
+    stays inside the cluster (inf when there is none); entrances are local
+    ids ly * x_width + lx.
+    """
+    costs = np.empty((len(entrances), len(entrances)))
+    for i, entrance in enumerate(entrances):
+        field = calc_cost_field(blocked, x_width, y_width, motion,
+                                (entrance % x_width, entrance // x_width),
+                                step_costs)
+        costs[i] = [field[j] for j in entrances]
+    return costs
+
+
+class ClusterCache(ObstacleMapCache):
+    """
+    On-disk cache of the entrance costs of single clusters.
+
+    Entries are keyed by calc_cluster_key, so a change to the map only
+    misses for the clusters it touches, and are evicted like the obstacle
+    maps. Each entry is a .npy file holding the cost matrix plus a small
+    .json file with the entrances it is for.
+    """
+
+    version = 2
+
+    def __init__(self, cache_dir=None, max_bytes=256 * 1024 * 1024):
+        if cache_dir is None:
+            cache_dir = os.environ.get(
+                "CLUSTER_CACHE_DIR",
+                os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             ".cluster_cache"))
+        super().__init__(cache_dir, max_bytes)
+        self.enabled = os.environ.get("CLUSTER_CACHE", "1") != "0"
+
+    def load(self, key, entrances):
+        costs_path, entrances_path = self.calc_paths(key)
+        try:
+            with open(entrances_path) as f:
+                stored_entrances = json.load(f)["entrances"]
+            costs = np.load(costs_path)
+        except (OSError, ValueError, KeyError):
+            return None
+        if stored_entrances != entrances or \
+                costs.shape != (len(entrances), len(entrances)):
+            return None
+        try:
+            os.utime(costs_path)
+        except OSError:
+            pass
+        return costs
+
+    def store(self, key, entrances, costs):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        costs_path, entrances_path = self.calc_paths(key)
+        tmp_suffix = ".%d.tmp" % os.getpid()
+        with open(costs_path + tmp_suffix, "wb") as f:
+            np.save(f, costs)
+        with open(entrances_path + tmp_suffix, "w") as f:
+            json.dump({"entrances": entrances}, f)
+        os.replace(entrances_path + tmp_suffix, entrances_path)
+        os.replace(costs_path + tmp_suffix, costs_path)
+        self.evict()
+
+    def load_or_build(self, key, entrances, build):
+        """
+        build() is only called on a miss and must return the cost matrix.
+        """
+        if not self.enabled:
+            return build()
+        costs = self.load(key, entrances)
+        if costs is None:
+            costs = build()
+            try:
+                self.store(key, entrances, costs)
+            except OSError:
+                pass
+        return costs
+
+
+cluster_cache = ClusterCache()
+
+
+class Cluster:
+    """
+    One cluster_size x cluster_size block of the grid: cells x0 <= ix < x1,
+    y0 <= iy < y1. entrances are global cell ids, costs[i][j] the cost from
+    entrance i to entrance j inside the cluster, and exits (id, neighbour
+    id, motion index) the steps from its entrances into neighbouring
+    clusters.
+    """
+
+    def __init__(self, x0, y0, x1, y1, key, entrances, costs, exits):
+        self.x0, self.y0, self.x1, self.y1 = x0, y0, x1, y1
+        self.key = key
+        self.entrances = entrances
+        self.costs = costs
+        self.exits = exits
+
+
+class HierarchicalPlanner:
+    """
+    HPA* (Botea, Müller and Schaeffer) over the grid of an A* planner.
+
+    The planner's obstacle map and cost raster are split into clusters of
+    cluster_size cells square. Entrances are placed where clusters meet and
+    the cost between every two entrances of a cluster, zone costs and jet
+    stream included, is worked out once (and kept in cache, a ClusterCache).
+    A query searches the graph of entrances, joined to the start and goal
+    through their own clusters, and then refines each hop of that abstract
+    path with a search inside one cluster.
+
+    Paths stay inside the clusters they pass and cross between them at
+    entrances only, so they may cost a few percent more than the planner's
+    own on open maps, and more where obstacles leave short gaps between
+    clusters. Every goal the planner can reach is found.
+    planning(sx, sy, gx, gy) returns rx, ry like the planner's and leaves
+    the cost in path_cost (inf without a path) and the counters, abstract
+    and refining searches together, in stats. Call update() after changing
+    the planner's obstacle map or cost raster.
+    """
+
+    def __init__(self, planner, cluster_size=16, cache=None):
+        self.planner = planner
+        self.cluster_size = cluster_size
+        self.cache = cluster_cache if cache is None else cache
+        self.motion = planner.motion
+        self.step_index = {(dx, dy): i
+                           for i, (dx, dy, _) in enumerate(self.motion)}
+        if any(step not in self.step_index
+               for step in ((1, 0), (-1, 0), (0, 1), (0, -1))):
+            raise ValueError("hierarchical planning needs the four straight "
+                             "steps in the motion model")
+        self.diagonal = all(step in self.step_index for step in
+                            ((1, 1), (-1, 1), (1, -1), (-1, -1)))
+        self.setup_stats = PlannerStats()
+        self.stats = None
+        self.path_cost = math.inf
+        self.clusters = {}
+        self.edges = {}
+        self.update()
+
+    def update(self):
+        """
+        Re-read the planner's obstacle map and cost raster and rebuild the
+        clusters whose cells, or the cells around them, have changed.
+        Returns the number of clusters rebuilt.
+        """
+        planner, size = self.planner, self.cluster_size
+        x_width, y_width = planner.x_width, planner.y_width
+        with self.setup_stats.timer("zone_compile"):
+            self.blocked = flatten_obstacle_map(planner.obstacle_map)
+            self.padded = np.pad(
+                np.frombuffer(self.blocked, dtype=bool).reshape(
+                    y_width, x_width), 1, constant_values=True)
+            cost_raster = planner.cost_raster
+            self.step_cost_grids = [
+                np.frombuffer(step_cost).reshape(y_width, x_width)
+                for step_cost in cost_raster.get_step_costs()]
+            self.reverse_step_cost_grids = [
+                np.frombuffer(step_cost).reshape(y_width, x_width)
+                for step_cost in cost_raster.get_reverse_step_costs()]
+            self.unit_cost = cost_raster.calc_min_unit_cost()
+
+            n_rebuilt = 0
+            for y0 in range(0, y_width, size):
+                for x0 in range(0, x_width, size):
+                    x1, y1 = min(x0 + size, x_width), min(y0 + size, y_width)
+                    key = calc_cluster_key(
+                        self.padded[y0:y1 + 2, x0:x1 + 2],
+                        [grid[y0:y1, x0:x1] for grid in self.step_cost_grids],
+                        self.motion)
+                    cluster = self.clusters.get((x0 // size, y0 // size))
+                    if cluster is not None and cluster.key == key:
+                        continue
+                    self.clusters[(x0 // size, y0 // size)] = \
+                        self.build_cluster(x0, y0, x1, y1, key)
+                    n_rebuilt += 1
+            if n_rebuilt:
+                self.edges = self.calc_edges()
+        logger.info("Rebuilt %d of %d clusters", n_rebuilt,
+                    len(self.clusters))
+        return n_rebuilt
+
+    def build_cluster(self, x0, y0, x1, y1, key):
+        x_width, local_width = self.planner.x_width, x1 - x0
+        exits = calc_exits(self.padded[y0:y1 + 2, x0:x1 + 2], self.diagonal)
+        local_entrances = sorted({ly * local_width + lx
+                                  for lx, ly, _, _ in exits})
+        blocked, step_costs = self.calc_local_grid(x0, y0, x1, y1,
+                                                   self.step_cost_grids)
+        costs = self.cache.load_or_build(
+            key, local_entrances, lambda: calc_entrance_costs(
+                blocked, local_width, y1 - y0, self.motion, step_costs,
+                local_entrances))
+        entrances = [(y0 + i // local_width) * x_width + x0 + i % local_width
+                     for i in local_entrances]
+        exits = [((y0 + ly) * x_width + x0 + lx,
+                  (y0 + ly + dy) * x_width + x0 + lx + dx,
+                  self.step_index[(dx, dy)])
+                 for lx, ly, dx, dy in exits]
+        return Cluster(x0, y0, x1, y1, key, entrances, costs, exits)
+
+    def calc_edges(self):
+        """
+        The abstract graph: edges[id] lists (neighbour id, cost) of every
+        entrance, within its cluster and across to the next.
+        """
+        step_costs = self.planner.cost_raster.get_step_costs()
+        edges = {}
+        for cluster in self.clusters.values():
+            for i, c_id in enumerate(cluster.entrances):
+                edges[c_id] = [(n_id, cost) for n_id, cost
+                               in zip(cluster.entrances,
+                                      cluster.costs[i].tolist())
+                               if n_id != c_id and cost < math.inf]
+            for c_id, n_id, i in cluster.exits:
+                edges[c_id].append((n_id, step_costs[i][n_id]))
+        return edges
+
+    def calc_local_grid(self, x0, y0, x1, y1, step_cost_grids):
+        """
+        Obstacles and step costs of cells x0 <= ix < x1, y0 <= iy < y1 laid
+        out as a grid of their own for grid_search.
+        """
+        blocked = self.padded[y0 + 1:y1 + 1, x0 + 1:x1 + 1].tobytes()
+        step_costs = [array('d', grid[y0:y1, x0:x1].tobytes())
+                      for grid in step_cost_grids]
+        return blocked, step_costs
+
+    def get_cluster(self, ix, iy):
+        return self.clusters[(ix // self.cluster_size,
+                              iy // self.cluster_size)]
+
+    def calc_heuristic(self, c_id, goal):
+        x_width = self.planner.x_width
+        return math.hypot(c_id % x_width - goal[0],
+                          c_id // x_width - goal[1]) * self.unit_cost
+
+    def planning(self, sx, sy, gx, gy):
+        self.stats = stats = PlannerStats(runs=1)
+        planner = self.planner
+        start = (planner.calc_xy_index(sx, planner.min_x),
+                 planner.calc_xy_index(sy, planner.min_y))
+        goal = (planner.calc_xy_index(gx, planner.min_x),
+                planner.calc_xy_index(gy, planner.min_y))
+
+        with stats.timer("search"):
+            path = self.search_abstract(start, goal)
+        self.path_cost = math.inf
+        if path is None:
+            logger.warning("Open set is empty..")
+            path = [goal[1] * planner.x_width + goal[0]]
+        else:
+            self.path_cost = path[-1][1]
+            logger.info("Total Trip time required -> %s", self.path_cost)
+            with stats.timer("path"):
+                path = self.refine_path([c_id for c_id, _ in path])
+
+        rx = [planner.calc_grid_position(c_id % planner.x_width,
+                                         planner.min_x)
+              for c_id in reversed(path)]
+        ry = [planner.calc_grid_position(c_id // planner.x_width,
+                                         planner.min_y)
+              for c_id in reversed(path)]
+        logger.debug("Planner stats: %s", stats)
+        return rx, ry
+
+    def search_abstract(self, start, goal):
+        """
+        A* over the entrances from start to goal; returns the abstract path
+        as [(id, cost so far)] or None when the goal cannot be reached.
+        """
+        x_width = self.planner.x_width
+        start_id = start[1] * x_width + start[0]
+        goal_id = goal[1] * x_width + goal[0]
+
+        # Join start to the entrances of its cluster and those of the goal's
+        # cluster to goal, searching backwards from goal
+        start_cluster = self.get_cluster(*start)
+        field = self.calc_local_field(start_cluster, start,
+                                      self.step_cost_grids)
+        start_edges = [(n_id, field[n_id]) for n_id in start_cluster.entrances
+                       if field[n_id] < math.inf]
+        goal_cluster = self.get_cluster(*goal)
+        if goal_cluster is start_cluster and field[goal_id] < math.inf:
+            start_edges.append((goal_id, field[goal_id]))
+        field = self.calc_local_field(goal_cluster, goal,
+                                      self.reverse_step_cost_grids)
+        goal_edges = {c_id: field[c_id] for c_id in goal_cluster.entrances
+                      if field[c_id] < math.inf}
+
+        edges = self.edges
+        cost, parent, closed = {start_id: 0.0}, {start_id: -1}, set()
+        open_heap = [(self.calc_heuristic(start_id, goal), 0, start_id)]
+        n_seen, n_generated, n_pops = 1, 0, 0
+        peak_open = 1
+        found = False
+        while open_heap:
+            _, _, c_id = heapq.heappop(open_heap)
+            n_pops += 1
+            if c_id in closed:
+                continue
+            if c_id == goal_id:
+                found = True
+                break
+            closed.add(c_id)
+            c_cost = cost[c_id]
+            neighbours = edges.get(c_id, [])
+            if c_id == start_id:
+                neighbours = neighbours + start_edges
+            if c_id in goal_edges:
+                neighbours = neighbours + [(goal_id, goal_edges[c_id])]
+            for n_id, step_cost in neighbours:
+                n_generated += 1
+                n_cost = c_cost + step_cost
+                if n_id in closed or cost.get(n_id, math.inf) <= n_cost:
+                    continue
+                cost[n_id] = n_cost
+                parent[n_id] = c_id
+                heapq.heappush(open_heap, (
+                    n_cost + self.calc_heuristic(n_id, goal), n_seen, n_id))
+                n_seen += 1
+                peak_open = max(peak_open, len(open_heap))
+
+        stats = self.stats
+        stats.expanded += len(closed) + found
+        stats.generated += n_generated
+        stats.peak_open = max(stats.peak_open, peak_open)
+        stats.heap_pops += n_pops
+        stats.heap_pushes += n_seen
+        if not found:
+            return None
+        path = [goal_id]
+        while parent[path[-1]] != -1:
+            path.append(parent[path[-1]])
+        return [(c_id, cost[c_id]) for c_id in reversed(path)]
+
+    def calc_local_field(self, cluster, root, step_cost_grids):
+        """
+        calc_cost_field from root inside cluster, as {global id: cost}.
+        """
+        x_width = self.planner.x_width
+        local_width = cluster.x1 - cluster.x0
+        blocked, step_costs = self.calc_local_grid(
+            cluster.x0, cluster.y0, cluster.x1, cluster.y1, step_cost_grids)
+        local_field = calc_cost_field(
+            blocked, local_width, cluster.y1 - cluster.y0, self.motion,
+            (root[0] - cluster.x0, root[1] - cluster.y0), step_costs)
+        return {(cluster.y0 + i // local_width) * x_width + cluster.x0
+                + i % local_width: cost
+                for i, cost in enumerate(local_field)}
+
+    def refine_path(self, abstract_path):
+        """
+        Cell ids from start to goal along abstract_path, searching each hop
+        within a cluster inside that cluster.
+        """
+        x_width = self.planner.x_width
+        path = [abstract_path[0]]
+        for c_id, n_id in zip(abstract_path, abstract_path[1:]):
+            c = (c_id % x_width, c_id // x_width)
+            n = (n_id % x_width, n_id // x_width)
+            cluster = self.get_cluster(*c)
+            if cluster is not self.get_cluster(*n):
+                path.append(n_id)
+                continue
+            path += self.search_cluster(cluster, c, n)[1:]
+        return path
+
+    def search_cluster(self, cluster, start, goal):
+        x_width = self.planner.x_width
+        x0, y0 = cluster.x0, cluster.y0
+        local_width = cluster.x1 - x0
+        blocked, step_costs = self.calc_local_grid(
+            x0, y0, cluster.x1, cluster.y1, self.step_cost_grids)
+
+        def calc_heuristic(ix, iy):
+            return math.hypot(ix + x0 - goal[0],
+                              iy + y0 - goal[1]) * self.unit_cost
+
+        state, goal_id = search(blocked, local_width, cluster.y1 - y0,
+                                self.motion, (start[0] - x0, start[1] - y0),
+                                (goal[0] - x0, goal[1] - y0), step_costs,
+                                calc_heuristic)
+        self.stats.add_search(state)
+        path = [goal_id]
+        while state.parent[path[-1]] != -1:
+            path.append(state.parent[path[-1]])
+        return [(y0 + i // local_width) * x_width + x0 + i % local_width
+                for i in reversed(path)]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Inspect or clear the cluster cache.")
+    parser.add_argument("--clear", action="store_true",
+                        help="remove every cached cluster")
+    args = parser.parse_args()
+
+    if args.clear:
+        cluster_cache.invalidate()
+    entries = cluster_cache.entries()
+    print("cache dir:", cluster_cache.cache_dir)
+    print("entries:", len(entries))
+    print("size (bytes):", sum(size for _, size, _ in entries))
+
+
+if __name__ == '__main__':
+    main()
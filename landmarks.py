@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+from array import array
+
+import numpy as np
+
+from grid_search import calc_cost_field, flatten_obstacle_map
+from obstacle_map import ObstacleMapCache
+
+# Stand-in for inf in the bounds, so two unreachable distances cancel out
+# instead of making nan
+UNREACHABLE = 1e18
+
+
+def select_landmarks(blocked, x_width, y_width, multiplier, n_landmarks):
+    """
+    Up to n_landmarks free cells (ix, iy) to measure distances from: the
+    corners of the map, then two opposite corners just outside each cost
+    zone (largest first), then their other two corners, each moved to the
+    nearest free cell.
+
+    Landmarks pay off when the goal lies behind them as seen from the
+    start, and the corners of the map and of the zones are where paths
+    bend most.
+    """
+    grid = np.frombuffer(bytes(blocked), dtype=bool).reshape(
+        y_width, x_width)
+    free_y, free_x = np.nonzero(~grid)
+    if free_x.size == 0:
+        return []
+    candidates = [(0, 0), (x_width - 1, y_width - 1),
+                  (x_width - 1, 0), (0, y_width - 1)]
+    boxes = []
+    zone_values = [value for value in np.unique(multiplier)
+                   if value > multiplier.min()]
+    for value in zone_values:
+        xs, ys = np.nonzero(multiplier == value)
+        boxes.append((xs.size, xs.min() - 1, ys.min() - 1,
+                      xs.max() + 1, ys.max() + 1))
+    boxes.sort(reverse=True)
+    candidates += [corner for _, x0, y0, x1, y1 in boxes
+                   for corner in ((x0, y0), (x1, y1))]
+    candidates += [corner for _, x0, y0, x1, y1 in boxes
+                   for corner in ((x1, y0), (x0, y1))]
+
+    landmarks = []
+    for cx, cy in candidates:
+        i = int(np.argmin((free_x - cx) ** 2 + (free_y - cy) ** 2))
+        landmark = (int(free_x[i]), int(free_y[i]))
+        if landmark not in landmarks:
+            landmarks.append(landmark)
+        if len(landmarks) == n_landmarks:
+            break
+    return landmarks
+
+
+def calc_landmark_key(blocked, motion, step_costs, landmarks):
+    h = hashlib.sha256()
+    h.update(str(LandmarkCache.version).encode())
+    h.update(repr((tuple(motion), landmarks)).encode())
+    h.update(bytes(blocked))
+    for step_cost in step_costs:
+        h.update(np.frombuffer(step_cost).tobytes())
+    return "alt-" + h.hexdigest()
+
+
+class LandmarkCache(ObstacleMapCache):
+    """
+    Landmark distance tables, kept in the obstacle map cache directory and
+    evicted with its entries. Each entry is a .npy file holding the
+    distances (see LandmarkTable) plus a small .json file with the
+    landmarks they are for.
+    """
+
+    version = 1
+
+    def load(self, key, landmarks):
+        distances_path, landmarks_path = self.calc_paths(key)
+        try:
+            with open(landmarks_path) as f:
+                stored_landmarks = [tuple(landmark) for landmark
+                                    in json.load(f)["landmarks"]]
+            distances = np.load(distances_path, mmap_mode="r")
+        except (OSError, ValueError, KeyError):
+            return None
+        if stored_landmarks != landmarks or \
+                distances.shape[:2] != (2, len(landmarks)):
+            return None
+        try:
+            os.utime(distances_path)
+        except OSError:
+            pass
+        return distances
+
+    def store(self, key, landmarks, distances):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        distances_path, landmarks_path = self.calc_paths(key)
+        tmp_suffix = ".%d.tmp" % os.getpid()
+        with open(distances_path + tmp_suffix, "wb") as f:
+            np.save(f, distances)
+        with open(landmarks_path + tmp_suffix, "w") as f:
+            json.dump({"landmarks": landmarks}, f)
+        os.replace(landmarks_path + tmp_suffix, landmarks_path)
+        os.replace(distances_path + tmp_suffix, distances_path)
+        self.evict()
+
+    def load_or_build(self, key, landmarks, build):
+        """
+        build() is only called on a miss and must return the distances.
+        """
+        if not self.enabled:
+            return build()
+        distances = self.load(key, landmarks)
+        if distances is None:
+            distances = build()
+            try:
+                self.store(key, landmarks, distances)
+            except OSError:
+                pass
+        return distances
+
+
+landmark_cache = LandmarkCache()
+
+
+class LandmarkTable:
+    """
+    Exact costs between a few landmark cells and every cell, for the ALT
+    heuristic (Goldberg and Harrelson: A*, landmarks and the triangle
+    inequality).
+
+    distances[0][k] is the cost from landmark k to every cell and
+    distances[1][k] the cost from every cell to landmark k, indexed by
+    iy * x_width + ix. The two differ where the jet stream makes the cost
+    of a step depend on its direction.
+    """
+
+    def __init__(self, landmarks, distances, x_width):
+        self.landmarks = landmarks
+        self.x_width = x_width
+        self.distances = np.where(np.isinf(distances), UNREACHABLE,
+                                  distances)
+
+    def make_heuristic(self, goal, reverse=False):
+        """
+        calc_heuristic(ix, iy) bounding the cost from (ix, iy) to goal, or
+        with reverse the cost from goal to (ix, iy), by the triangle
+        inequality through each landmark: d(v, t) >= d(L, t) - d(L, v)
+        and d(v, t) >= d(v, L) - d(t, L).
+        """
+        goal_id = goal[1] * self.x_width + goal[0]
+        from_landmarks, to_landmarks = self.distances
+        from_goal = from_landmarks[:, goal_id, None]
+        to_goal = to_landmarks[:, goal_id, None]
+        if reverse:
+            bounds = np.maximum(from_landmarks - from_goal,
+                                to_goal - to_landmarks)
+        else:
+            bounds = np.maximum(from_goal - from_landmarks,
+                                to_landmarks - to_goal)
+        h = array('d', np.maximum(bounds.max(axis=0), 0.0).tobytes())
+        x_width = self.x_width
+
+        def calc_heuristic(ix, iy):
+            return h[iy * x_width + ix]
+        return calc_heuristic
+
+
+def get_landmark_table(obstacle_map, motion, cost_raster, n_landmarks=8):
+    """
+    LandmarkTable of n_landmarks landmarks (see select_landmarks) for the
+    obstacle map and cost raster, loaded from landmark_cache when it has
+    been built for the same obstacles, step costs and landmarks before.
+    """
+    x_width, y_width = cost_raster.x_width, cost_raster.y_width
+    blocked = flatten_obstacle_map(obstacle_map)
+    step_costs = cost_raster.get_step_costs()
+    landmarks = select_landmarks(blocked, x_width, y_width,
+                                 cost_raster.multiplier, n_landmarks)
+
+    def build():
+        reverse_step_costs = cost_raster.get_reverse_step_costs()
+        distances = np.empty((2, len(landmarks), x_width * y_width))
+        for k, landmark in enumerate(landmarks):
+            distances[0][k] = calc_cost_field(blocked, x_width, y_width,
+                                              motion, landmark, step_costs)
+            distances[1][k] = calc_cost_field(blocked, x_width, y_width,
+                                              motion, landmark,
+                                              reverse_step_costs)
+        return distances
+
+    key = calc_landmark_key(blocked, motion, step_costs, landmarks)
+    return LandmarkTable(landmarks,
+                         landmark_cache.load_or_build(key, landmarks, build),
+                         x_width)
@@ -0,0 +1,80 @@
+import math
+import time
+
+import matplotlib.pyplot as plt
+
+
+class LiveAnimation:
+    """
+    Live plot of a running search that keeps one artist for all of it.
+
+    add() only queues points; at most fps times a second the queued points
+    are drawn on top of a saved background and blitted, and the background
+    is saved again with them in it. A frame therefore costs the same however
+    many points are already on screen, and the search runs at full speed
+    between frames. finish() hands the points over to the figure as an
+    ordinary artist, so they stay in later full redraws, and disconnects
+    the canvas handlers.
+    """
+
+    def __init__(self, fmt="xc", fps=30, ax=None):
+        self.ax = ax if ax is not None else plt.gca()
+        self.canvas = self.ax.figure.canvas
+        self.artist, = self.ax.plot([], [], fmt,
+                                    animated=self.canvas.supports_blit)
+        self.frame_time = 1.0 / fps
+        self.last_frame = -math.inf
+        self.x, self.y = [], []
+        self.n_drawn = 0
+        self.background = None
+        # Disconnected again in finish(), so the handlers of one planning()
+        # call after another do not pile up on the shared canvas
+        self.callback_ids = [
+            self.canvas.mpl_connect('draw_event', self.on_draw),
+            self.canvas.mpl_connect('key_release_event',
+                                    lambda event: [exit(
+                                        0) if event.key == 'escape' else None])]
+
+    def on_draw(self, event):
+        # A full redraw (e.g. a resize) leaves out animated artists, so the
+        # next frame redraws every point onto a fresh background
+        self.background = None
+
+    def add(self, x, y):
+        self.x.append(x)
+        self.y.append(y)
+        if time.perf_counter() - self.last_frame >= self.frame_time:
+            self.draw_frame()
+
+    def add_segment(self, x1, y1, x2, y2):
+        # NaN breaks the line, so one artist holds every segment
+        self.x.extend((x1, x2, math.nan))
+        self.y.extend((y1, y2, math.nan))
+        if time.perf_counter() - self.last_frame >= self.frame_time:
+            self.draw_frame()
+
+    def draw_frame(self):
+        if self.background is None:
+            self.canvas.draw()
+            self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+            self.n_drawn = 0
+        if self.canvas.supports_blit:
+            self.canvas.restore_region(self.background)
+            self.artist.set_data(self.x[self.n_drawn:], self.y[self.n_drawn:])
+            self.ax.draw_artist(self.artist)
+            self.canvas.blit(self.ax.bbox)
+            self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+            self.n_drawn = len(self.x)
+        else:
+            self.artist.set_data(self.x, self.y)
+            self.canvas.draw_idle()
+        self.canvas.flush_events()
+        self.last_frame = time.perf_counter()
+
+    def finish(self):
+        self.draw_frame()
+        self.artist.set_data(self.x, self.y)
+        self.artist.set_animated(False)
+        for callback_id in self.callback_ids:
+            self.canvas.mpl_disconnect(callback_id)
+        self.callback_ids = []
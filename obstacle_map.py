@@ -0,0 +1,388 @@
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# How far past the planner's robot radius its distance field is built, so
+# that trying a separation up to this many times wider is a threshold too
+RADIUS_HEADROOM = 4.0
+
+
+class Segment:
+    """
+    Straight wall from (x1, y1) to (x2, y2).
+    """
+
+    def __init__(self, x1, y1, x2, y2):
+        self.x1, self.y1 = float(x1), float(y1)
+        self.x2, self.y2 = float(x2), float(y2)
+
+    def calc_bounds(self):
+        return (min(self.x1, self.x2), min(self.y1, self.y2),
+                max(self.x1, self.x2), max(self.y1, self.y2))
+
+    def calc_distance(self, x, y):
+        dx, dy = self.x2 - self.x1, self.y2 - self.y1
+        length_sq = dx * dx + dy * dy
+        if length_sq == 0.0:
+            return np.hypot(x - self.x1, y - self.y1)
+        t = np.clip(((x - self.x1) * dx + (y - self.y1) * dy) / length_sq,
+                    0.0, 1.0)
+        return np.hypot(x - (self.x1 + t * dx), y - (self.y1 + t * dy))
+
+    def get_key(self):
+        return ("segment", self.x1, self.y1, self.x2, self.y2)
+
+    def get_outline(self):
+        return [self.x1, self.x2], [self.y1, self.y2]
+
+
+class Polyline:
+    """
+    Chain of walls through points [(x0, y0), (x1, y1), ...].
+    """
+
+    def __init__(self, points):
+        self.points = [(float(x), float(y)) for x, y in points]
+        self.segments = [Segment(x1, y1, x2, y2) for (x1, y1), (x2, y2)
+                         in zip(self.points[:-1], self.points[1:])]
+        if len(self.points) == 1:
+            x, y = self.points[0]
+            self.segments = [Segment(x, y, x, y)]
+
+    def calc_bounds(self):
+        xs = [x for x, _ in self.points]
+        ys = [y for _, y in self.points]
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def calc_distance(self, x, y):
+        d = self.segments[0].calc_distance(x, y)
+        for segment in self.segments[1:]:
+            d = np.minimum(d, segment.calc_distance(x, y))
+        return d
+
+    def get_key(self):
+        return ("polyline",) + tuple(self.points)
+
+    def get_outline(self):
+        return [x for x, _ in self.points], [y for _, y in self.points]
+
+
+class Rectangle:
+    """
+    Solid axis-aligned block covering [x_min, x_max] x [y_min, y_max].
+    """
+
+    def __init__(self, x_min, y_min, x_max, y_max):
+        self.x_min, self.y_min = float(x_min), float(y_min)
+        self.x_max, self.y_max = float(x_max), float(y_max)
+
+    def calc_bounds(self):
+        return self.x_min, self.y_min, self.x_max, self.y_max
+
+    def calc_distance(self, x, y):
+        dx = np.maximum(np.maximum(self.x_min - x, x - self.x_max), 0.0)
+        dy = np.maximum(np.maximum(self.y_min - y, y - self.y_max), 0.0)
+        return np.hypot(dx, dy)
+
+    def get_key(self):
+        return ("rectangle", self.x_min, self.y_min, self.x_max, self.y_max)
+
+    def get_outline(self):
+        return ([self.x_min, self.x_max, self.x_max, self.x_min, self.x_min],
+                [self.y_min, self.y_min, self.y_max, self.y_max, self.y_min])
+
+
+class Circle:
+    """
+    Solid disc of the given radius around (cx, cy).
+    """
+
+    def __init__(self, cx, cy, radius):
+        self.cx, self.cy = float(cx), float(cy)
+        self.radius = float(radius)
+
+    def calc_bounds(self):
+        return (self.cx - self.radius, self.cy - self.radius,
+                self.cx + self.radius, self.cy + self.radius)
+
+    def calc_distance(self, x, y):
+        return np.maximum(np.hypot(x - self.cx, y - self.cy) - self.radius,
+                          0.0)
+
+    def get_key(self):
+        return ("circle", self.cx, self.cy, self.radius)
+
+    def get_outline(self):
+        theta = np.linspace(0.0, 2.0 * math.pi, 73)
+        return (list(self.cx + self.radius * np.cos(theta)),
+                list(self.cy + self.radius * np.sin(theta)))
+
+
+def calc_obstacle_extent(ox, oy, primitives=()):
+    """
+    (min_x, min_y, max_x, max_y) over the obstacle points and primitives.
+    """
+    xs, ys = list(ox), list(oy)
+    for primitive in primitives:
+        p_min_x, p_min_y, p_max_x, p_max_y = primitive.calc_bounds()
+        xs += [p_min_x, p_max_x]
+        ys += [p_min_y, p_max_y]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def calc_distance_field(ox, oy, min_x, min_y, x_width, y_width, resolution,
+                        max_radius, primitives=()):
+    """
+    Euclidean distance from every grid position to its nearest obstacle, as
+    a (x_width, y_width) float array indexed [ix, iy].
+
+    The obstacle points are rasterised to their nearest cell and each point
+    only updates the cells around it, so the cost scales with the number of
+    points rather than cells x points. Primitives are measured with their
+    exact distance over their bounding box grown by max_radius. Distances
+    are exact up to max_radius; cells further than that from every obstacle
+    are left at inf.
+    """
+    field = np.full((x_width, y_width), np.inf)
+    if x_width <= 0 or y_width <= 0:
+        return field
+
+    for primitive in primitives:
+        p_min_x, p_min_y, p_max_x, p_max_y = primitive.calc_bounds()
+        ix0 = math.floor((p_min_x - max_radius - min_x) / resolution)
+        iy0 = math.floor((p_min_y - max_radius - min_y) / resolution)
+        ix1 = math.ceil((p_max_x + max_radius - min_x) / resolution) + 1
+        iy1 = math.ceil((p_max_y + max_radius - min_y) / resolution) + 1
+        ix0, iy0 = max(ix0, 0), max(iy0, 0)
+        ix1, iy1 = min(ix1, x_width), min(iy1, y_width)
+        if ix0 >= ix1 or iy0 >= iy1:
+            continue
+        x = (np.arange(ix0, ix1) * resolution + min_x)[:, None]
+        y = (np.arange(iy0, iy1) * resolution + min_y)[None, :]
+        d = primitive.calc_distance(x, y)
+        d = np.where(d <= max_radius, d, np.inf)
+        np.minimum(field[ix0:ix1, iy0:iy1], d, out=field[ix0:ix1, iy0:iy1])
+
+    ox = np.asarray(ox, dtype=float)
+    oy = np.asarray(oy, dtype=float)
+    if ox.size == 0:
+        return field
+
+    cx = np.rint((ox - min_x) / resolution).astype(np.int64)
+    cy = np.rint((oy - min_y) / resolution).astype(np.int64)
+    reach = int(math.ceil(max_radius / resolution)) + 1
+
+    for dix in range(-reach, reach + 1):
+        ix = cx + dix
+        x = ix * resolution + min_x
+        for diy in range(-reach, reach + 1):
+            iy = cy + diy
+            y = iy * resolution + min_y
+            d = np.hypot(ox - x, oy - y)
+            keep = ((ix >= 0) & (ix < x_width) & (iy >= 0) & (iy < y_width)
+                    & (d <= max_radius))
+            np.minimum.at(field, (ix[keep], iy[keep]), d[keep])
+
+    return field
+
+
+class DistanceField:
+    """
+    Distance-to-nearest-obstacle raster kept by the planners.
+
+    threshold(rr) gives the inflated obstacle map for robot radius rr, so
+    trying a different radius is a comparison instead of a full rebuild.
+    The field is computed on first use, out to RADIUS_HEADROOM times the
+    planner's radius rr, so any radius up to that is only a threshold; a
+    wider one recomputes the field, and that is logged.
+    """
+
+    def __init__(self, ox, oy, min_x, min_y, x_width, y_width, resolution,
+                 rr, primitives=()):
+        self.ox = np.asarray(ox, dtype=float)
+        self.oy = np.asarray(oy, dtype=float)
+        self.primitives = list(primitives)
+        self.min_x, self.min_y = min_x, min_y
+        self.x_width, self.y_width = x_width, y_width
+        self.resolution = resolution
+        self.max_radius = rr * RADIUS_HEADROOM
+        self.dist = None
+
+    def extend(self, max_radius):
+        if self.dist is not None:
+            if max_radius <= self.max_radius:
+                return
+            logger.info("Rebuilding the distance field out to %s, past the "
+                        "%s it was built for", max_radius, self.max_radius)
+        self.max_radius = max(max_radius, self.max_radius)
+        self.dist = calc_distance_field(self.ox, self.oy, self.min_x,
+                                        self.min_y, self.x_width,
+                                        self.y_width, self.resolution,
+                                        self.max_radius, self.primitives)
+
+    def threshold(self, rr):
+        self.extend(rr)
+        return self.dist <= rr
+
+
+class ObstacleMapCache:
+    """
+    Content-addressed on-disk cache of inflated obstacle maps.
+
+    Entries are keyed by a hash of (ox, oy, resolution, rr) and any obstacle
+    primitives. Each entry is a .npy file holding the boolean map, loaded
+    memory-mapped, plus a small .json file with the grid bounds it was built
+    for. The least recently used entries are evicted once the cache grows
+    past max_bytes.
+    """
+
+    version = 1
+
+    def __init__(self, cache_dir=None, max_bytes=256 * 1024 * 1024):
+        if cache_dir is None:
+            cache_dir = os.environ.get(
+                "OBSTACLE_CACHE_DIR",
+                os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             ".obstacle_cache"))
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.enabled = os.environ.get("OBSTACLE_CACHE", "1") != "0"
+
+    def calc_key(self, ox, oy, resolution, rr, primitives=()):
+        h = hashlib.sha256()
+        h.update(str(self.version).encode())
+        h.update(np.asarray(ox, dtype=float).tobytes())
+        h.update(b"|")
+        h.update(np.asarray(oy, dtype=float).tobytes())
+        h.update(repr((float(resolution), float(rr))).encode())
+        for primitive in primitives:
+            h.update(repr(primitive.get_key()).encode())
+        return h.hexdigest()
+
+    def calc_paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + ".npy", base + ".json"
+
+    def load(self, key, bounds):
+        map_path, bounds_path = self.calc_paths(key)
+        try:
+            with open(bounds_path) as f:
+                stored_bounds = tuple(json.load(f)["bounds"])
+            obstacle_map = np.load(map_path, mmap_mode="r").view(np.ndarray)
+        except (OSError, ValueError, KeyError):
+            return None
+        if stored_bounds != tuple(bounds) or \
+                obstacle_map.shape != (bounds[4], bounds[5]):
+            return None
+        try:
+            os.utime(map_path)
+        except OSError:
+            pass
+        return obstacle_map
+
+    def store(self, key, bounds, obstacle_map):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        map_path, bounds_path = self.calc_paths(key)
+        tmp_suffix = ".%d.tmp" % os.getpid()
+        with open(map_path + tmp_suffix, "wb") as f:
+            np.save(f, np.asarray(obstacle_map, dtype=bool))
+        with open(bounds_path + tmp_suffix, "w") as f:
+            json.dump({"bounds": list(bounds)}, f)
+        os.replace(bounds_path + tmp_suffix, bounds_path)
+        os.replace(map_path + tmp_suffix, map_path)
+        self.evict()
+
+    def load_or_build(self, ox, oy, resolution, rr, bounds, build,
+                      primitives=()):
+        """
+        bounds is (min_x, min_y, max_x, max_y, x_width, y_width); build() is
+        only called on a miss and must return the obstacle map.
+        """
+        if not self.enabled:
+            return build()
+        key = self.calc_key(ox, oy, resolution, rr, primitives)
+        obstacle_map = self.load(key, bounds)
+        if obstacle_map is None:
+            obstacle_map = build()
+            try:
+                self.store(key, bounds, obstacle_map)
+            except OSError:
+                pass
+        return obstacle_map
+
+    def entries(self):
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".npy"):
+                continue
+            key = name[:-len(".npy")]
+            map_path, bounds_path = self.calc_paths(key)
+            try:
+                st = os.stat(map_path)
+                size = st.st_size + os.path.getsize(bounds_path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, size, key))
+        return sorted(entries)
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            self.remove(key)
+            total -= size
+
+    def remove(self, key):
+        for path in self.calc_paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def invalidate(self, ox=None, oy=None, resolution=None, rr=None,
+                   primitives=()):
+        """
+        Drop the entry for (ox, oy, resolution, rr, primitives), or every
+        entry when called without arguments.
+        """
+        if ox is None:
+            for _, _, key in self.entries():
+                self.remove(key)
+        else:
+            self.remove(self.calc_key(ox, oy, resolution, rr, primitives))
+
+
+obstacle_cache = ObstacleMapCache()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Inspect or clear the obstacle map cache.")
+    parser.add_argument("--clear", action="store_true",
+                        help="remove every cached obstacle map")
+    args = parser.parse_args()
+
+    if args.clear:
+        obstacle_cache.invalidate()
+    entries = obstacle_cache.entries()
+    print("cache dir:", obstacle_cache.cache_dir)
+    print("entries:", len(entries))
+    print("size (bytes):", sum(size for _, size, _ in entries))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+PHASES = ("map_build", "zone_compile", "search", "path")
+
+
+def start_memory_profiling():
+    """
+    Opt in to per-phase memory figures in PlannerStats.
+
+    Tracing every allocation slows planning down several times over, so it
+    is off unless this is called or PLANNER_MEMORY_PROFILE=1 is set.
+    """
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def stop_memory_profiling():
+    tracemalloc.stop()
+
+
+def is_memory_profiling():
+    return tracemalloc.is_tracing()
+
+
+class PlannerStats:
+    """
+    Counters and phase timings of one or more planning runs.
+
+    expanded, generated and rejected count nodes taken off the open set,
+    neighbours produced from them and neighbours rejected as off the map
+    or in an obstacle. peak_open is the largest open set seen, heap_pushes
+    and heap_pops the open-set heap operations, and timings the wall time
+    in seconds of each phase in PHASES. Stats add up, so the stats of a
+    batch are sum(run_stats).
+
+    While memory profiling is on (start_memory_profiling), memory_net and
+    memory_peak hold the bytes each phase left allocated and the most it
+    had allocated at once above where it started, as traced by tracemalloc.
+    Obstacle maps memory-mapped from the cache are not traced.
+
+    Planners keep the stats of their latest planning() call in
+    planner.stats, and the map build and zone compile work done outside
+    planning() in planner.setup_stats.
+    """
+
+    def __init__(self, runs=0):
+        self.runs = runs
+        self.expanded = 0
+        self.generated = 0
+        self.rejected = 0
+        self.peak_open = 0
+        self.heap_pushes = 0
+        self.heap_pops = 0
+        self.timings = dict.fromkeys(PHASES, 0.0)
+        self.memory_net = dict.fromkeys(PHASES, 0)
+        self.memory_peak = dict.fromkeys(PHASES, 0)
+
+    @contextmanager
+    def timer(self, phase):
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[phase] = (self.timings.get(phase, 0.0)
+                                   + time.perf_counter() - start)
+            if tracing:
+                memory, peak = tracemalloc.get_traced_memory()
+                self.memory_net[phase] = (self.memory_net.get(phase, 0)
+                                          + memory - start_memory)
+                self.memory_peak[phase] = max(self.memory_peak.get(phase, 0),
+                                              peak - start_memory)
+
+    def add_search(self, state):
+        # Counters kept by grid_search.search on its SearchState
+        self.expanded += state.n_expanded
+        self.generated += state.n_generated
+        self.rejected += state.n_rejected
+        self.peak_open = max(self.peak_open, state.peak_open)
+        self.heap_pushes += state.n_pushes
+        self.heap_pops += state.n_pops
+
+    def __radd__(self, other):
+        # sum() starts from 0
+        return self if other == 0 else NotImplemented
+
+    def __add__(self, other):
+        total = PlannerStats()
+        for stats in (self, other):
+            total.runs += stats.runs
+            total.expanded += stats.expanded
+            total.generated += stats.generated
+            total.rejected += stats.rejected
+            total.peak_open = max(total.peak_open, stats.peak_open)
+            total.heap_pushes += stats.heap_pushes
+            total.heap_pops += stats.heap_pops
+            for phase, seconds in stats.timings.items():
+                total.timings[phase] = total.timings.get(phase, 0.0) + seconds
+            for phase, memory in stats.memory_net.items():
+                total.memory_net[phase] = total.memory_net.get(phase, 0) + memory
+            for phase, peak in stats.memory_peak.items():
+                total.memory_peak[phase] = max(total.memory_peak.get(phase, 0),
+                                               peak)
+        return total
+
+    def as_dict(self):
+        return {
+            "runs": self.runs, "expanded": self.expanded,
+            "generated": self.generated, "rejected": self.rejected,
+            "peak_open": self.peak_open, "heap_pushes": self.heap_pushes,
+            "heap_pops": self.heap_pops, "timings": dict(self.timings),
+            "memory_net": dict(self.memory_net),
+            "memory_peak": dict(self.memory_peak),
+        }
+
+    def __str__(self):
+        timings = ", ".join(f"{phase} {seconds * 1e3:.1f} ms"
+                            for phase, seconds in self.timings.items())
+        return (f"runs {self.runs}, expanded {self.expanded}, "
+                f"generated {self.generated}, rejected {self.rejected}, "
+                f"peak open {self.peak_open}, "
+                f"heap ops {self.heap_pushes + self.heap_pops} | {timings}")
+
+
+def format_memory_report(planner):
+    """
+    Memory of a planner's setup and latest planning() call, per phase and
+    per grid cell / expanded node, for sizing runs on larger grids.
+    """
+    setup, run = planner.setup_stats, planner.stats
+    stats = setup + run if run is not None else setup
+    cells = planner.x_width * planner.y_width
+    lines = [f"{'phase':<14}{'net (bytes)':>14}{'peak (bytes)':>14}"]
+    for phase in PHASES:
+        lines.append(f"{phase:<14}{stats.memory_net[phase]:>14}"
+                     f"{stats.memory_peak[phase]:>14}")
+    if cells:
+        lines.append(f"map bytes per grid cell: "
+                     f"{stats.memory_net['map_build'] / cells:.1f}")
+        lines.append(f"search peak bytes per grid cell: "
+                     f"{stats.memory_peak['search'] / cells:.1f}")
+    if stats.expanded:
+        lines.append(f"search peak bytes per expanded node: "
+                     f"{stats.memory_peak['search'] / stats.expanded:.1f}")
+    return "\n".join(lines)
+
+
+if os.environ.get("PLANNER_MEMORY_PROFILE", "0") not in ("", "0"):
+    start_memory_profiling()
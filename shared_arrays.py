@@ -0,0 +1,52 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class SharedArrays:
+    """
+    NumPy arrays copied once into multiprocessing.shared_memory blocks.
+
+    specs is a small picklable dict (name -> (block name, shape, dtype))
+    that worker processes pass to attach() to map the same memory instead
+    of receiving a pickled copy of every array with every task. The
+    creating process owns the blocks and unlinks them on close().
+    """
+
+    def __init__(self, arrays):
+        self.blocks = []
+        self.specs = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True,
+                                               size=max(array.nbytes, 1))
+            np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+            self.blocks.append(block)
+            self.specs[name] = (block.name, array.shape, array.dtype.str)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    @staticmethod
+    def attach(specs):
+        """
+        Map the arrays described by specs in this process.
+
+        Returns (arrays, blocks); keep blocks referenced for as long as the
+        arrays are in use.
+        """
+        arrays, blocks = {}, []
+        for name, (block_name, shape, dtype) in specs.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            arrays[name] = np.ndarray(shape, dtype, buffer=block.buf)
+            blocks.append(block)
+        return arrays, blocks
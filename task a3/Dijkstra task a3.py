@@ -1,20 +1,42 @@
+import logging
 import math
+import os
+import sys
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cost_raster import CostRaster
+from grid_search import flatten_obstacle_map, search
+from live_animation import LiveAnimation
+from obstacle_map import (DistanceField, Segment, calc_obstacle_extent,
+                          obstacle_cache)
+from planner_stats import (PlannerStats, format_memory_report,
+                           is_memory_profiling)
+
 show_animation = True
+animation_fps = 30
+
+logger = logging.getLogger(__name__)
 
 
 class DijkstraPlanner:
 
-    def __init__(self, ox, oy, resolution, rr, fc_x, fc_y, tc_x, tc_y):
+    def __init__(self, ox, oy, resolution, rr, fc_x, fc_y, tc_x, tc_y,
+                 primitives=()):
         self.resolution = resolution
         self.rr = rr
         self.min_x, self.min_y = 0, 0
         self.max_x, self.max_y = 0, 0
         self.obstacle_map = None
+        self.distance_field = None
+        self.cost_raster = None
+        self.animation = None
         self.x_width, self.y_width = 0, 0
         self.motion = self.get_motion_model()
-        self.calc_obstacle_map(ox, oy)
+        self.setup_stats = PlannerStats()
+        self.stats = None
+        self.path_cost = None
+        self.calc_obstacle_map(ox, oy, primitives)
 
         self.fc_x = fc_x
         self.fc_y = fc_y
@@ -24,6 +46,7 @@ class DijkstraPlanner:
         self.Delta_C1 = 0.3
         self.Delta_C2 = 0.15
         self.costPerGrid = 1
+        self.calc_cost_raster()
 
     class Node:
         def __init__(self, x, y, cost, parent_index):
@@ -36,84 +59,71 @@ class DijkstraPlanner:
             return str(self.x) + "," + str(self.y) + "," + str(
                 self.cost) + "," + str(self.parent_index)
 
-    def planning(self, sx, sy, gx, gy):
+    def planning(self, sx, sy, gx, gy, trace=None):
+        self.stats = stats = PlannerStats(runs=1)
+
         start_node = self.Node(self.calc_xy_index(sx, self.min_x),
                                self.calc_xy_index(sy, self.min_y), 0.0, -1)
         goal_node = self.Node(self.calc_xy_index(gx, self.min_x),
                               self.calc_xy_index(gy, self.min_y), 0.0, -1)
 
-        open_set, closed_set = dict(), dict()
-        open_set[self.calc_grid_index(start_node)] = start_node
-
-        while 1:
-            if len(open_set) == 0:
-                print("Open set is empty..")
-                break
-
-            # Dijkstra: Select node with minimum cost (no heuristic)
-            c_id = min(open_set, key=lambda o: open_set[o].cost)
-            current = open_set[c_id]
-
-            if show_animation:
-                plt.plot(self.calc_grid_position(current.x, self.min_x),
-                         self.calc_grid_position(current.y, self.min_y), "xc")
-                plt.gcf().canvas.mpl_connect('key_release_event',
-                                             lambda event: [exit(
-                                                 0) if event.key == 'escape' else None])
-                if len(closed_set.keys()) % 10 == 0:
-                    plt.pause(0.001)
-
-            if current.x == goal_node.x and current.y == goal_node.y:
-                print("Total Trip time required -> ", current.cost)
-                goal_node.parent_index = current.parent_index
-                goal_node.cost = current.cost
-                break
-
-            del open_set[c_id]
-            closed_set[c_id] = current
-
-            for i, _ in enumerate(self.motion):
-                node = self.Node(current.x + self.motion[i][0],
-                                 current.y + self.motion[i][1],
-                                 current.cost + self.motion[i][2] * self.costPerGrid, c_id)
-
-                # Apply cost penalty for terrain cost zone (tc)
-                if self.calc_grid_position(node.x, self.min_x) in self.tc_x:
-                    if self.calc_grid_position(node.y, self.min_y) in self.tc_y:
-                        node.cost = node.cost + self.Delta_C1 * self.motion[i][2]
-
-                # Apply cost penalty for fuel consumption zone (fc)
-                if self.calc_grid_position(node.x, self.min_x) in self.fc_x:
-                    if self.calc_grid_position(node.y, self.min_y) in self.fc_y:
-                        node.cost = node.cost + self.Delta_C2 * self.motion[i][2]
-
-                n_id = self.calc_grid_index(node)
-
-                if not self.verify_node(node):
-                    continue
-
-                if n_id in closed_set:
-                    continue
-
-                if n_id not in open_set:
-                    open_set[n_id] = node
-                else:
-                    if open_set[n_id].cost > node.cost:
-                        open_set[n_id] = node
-
-        rx, ry = self.calc_final_path(goal_node, closed_set)
+        if show_animation:
+            self.animation = LiveAnimation("xc", animation_fps)
+
+        # Dijkstra: no heuristic, nodes are taken in order of cost
+        with stats.timer("zone_compile"):
+            step_costs = self.cost_raster.get_step_costs()
+        with stats.timer("search"):
+            state, goal_id = search(
+                flatten_obstacle_map(self.obstacle_map), self.x_width,
+                self.y_width, self.motion, (start_node.x, start_node.y),
+                (goal_node.x, goal_node.y), step_costs,
+                None,
+                self.plot_expansion if show_animation else None, trace)
+        stats.add_search(state)
+        if show_animation:
+            self.animation.finish()
+
+        self.path_cost = math.inf
+        if goal_id == -1:
+            logger.warning("Open set is empty..")
+        else:
+            goal_node.parent_index = state.parent[goal_id]
+            goal_node.cost = state.cost[goal_id]
+            logger.info("Total Trip time required -> %s", goal_node.cost)
+            self.path_cost = goal_node.cost
+
+        with stats.timer("path"):
+            rx, ry = self.calc_final_path(goal_node, state)
+        logger.debug("Planner stats: %s", stats)
 
         return rx, ry
 
-    def calc_final_path(self, goal_node, closed_set):
+    def calc_cost_raster(self):
+        with self.setup_stats.timer("zone_compile"):
+            self.cost_raster = CostRaster(self.min_x, self.min_y,
+                                          self.x_width, self.y_width,
+                                          self.resolution, self.motion,
+                                          self.costPerGrid)
+            self.cost_raster.add_zone(self.tc_x, self.tc_y, self.Delta_C1,
+                                      per_grid=False)
+            self.cost_raster.add_zone(self.fc_x, self.fc_y, self.Delta_C2,
+                                      per_grid=False)
+
+    def plot_expansion(self, ix, iy, n_closed):
+        self.animation.add(self.calc_grid_position(ix, self.min_x),
+                           self.calc_grid_position(iy, self.min_y))
+
+    def calc_final_path(self, goal_node, state):
         rx, ry = [self.calc_grid_position(goal_node.x, self.min_x)], [
             self.calc_grid_position(goal_node.y, self.min_y)]
         parent_index = goal_node.parent_index
         while parent_index != -1:
-            n = closed_set[parent_index]
-            rx.append(self.calc_grid_position(n.x, self.min_x))
-            ry.append(self.calc_grid_position(n.y, self.min_y))
-            parent_index = n.parent_index
+            rx.append(self.calc_grid_position(parent_index % self.x_width,
+                                              self.min_x))
+            ry.append(self.calc_grid_position(parent_index // self.x_width,
+                                              self.min_y))
+            parent_index = state.parent[parent_index]
 
         return rx, ry
 
@@ -125,7 +135,7 @@ class DijkstraPlanner:
         return round((position - min_pos) / self.resolution)
 
     def calc_grid_index(self, node):
-        return (node.y - self.min_y) * self.x_width + (node.x - self.min_x)
+        return node.y * self.x_width + node.x
 
     def verify_node(self, node):
         px = self.calc_grid_position(node.x, self.min_x)
@@ -145,31 +155,38 @@ class DijkstraPlanner:
 
         return True
 
-    def calc_obstacle_map(self, ox, oy):
-        self.min_x = round(min(ox))
-        self.min_y = round(min(oy))
-        self.max_x = round(max(ox))
-        self.max_y = round(max(oy))
-        print("min_x:", self.min_x)
-        print("min_y:", self.min_y)
-        print("max_x:", self.max_x)
-        print("max_y:", self.max_y)
-
-        self.x_width = round((self.max_x - self.min_x) / self.resolution)
-        self.y_width = round((self.max_y - self.min_y) / self.resolution)
-        print("x_width:", self.x_width)
-        print("y_width:", self.y_width)
-
-        self.obstacle_map = [[False for _ in range(self.y_width)]
-                             for _ in range(self.x_width)]
-        for ix in range(self.x_width):
-            x = self.calc_grid_position(ix, self.min_x)
-            for iy in range(self.y_width):
-                y = self.calc_grid_position(iy, self.min_y)
-                for iox, ioy in zip(ox, oy):
-                    d = math.hypot(iox - x, ioy - y)
-                    if d <= self.rr:
-                        self.obstacle_map[ix][iy] = True
+    def calc_obstacle_map(self, ox, oy, primitives=()):
+        with self.setup_stats.timer("map_build"):
+            min_x, min_y, max_x, max_y = calc_obstacle_extent(ox, oy,
+                                                              primitives)
+            self.min_x = round(min_x)
+            self.min_y = round(min_y)
+            self.max_x = round(max_x)
+            self.max_y = round(max_y)
+            logger.debug("min_x: %s", self.min_x)
+            logger.debug("min_y: %s", self.min_y)
+            logger.debug("max_x: %s", self.max_x)
+            logger.debug("max_y: %s", self.max_y)
+
+            self.x_width = round((self.max_x - self.min_x) / self.resolution)
+            self.y_width = round((self.max_y - self.min_y) / self.resolution)
+            logger.debug("x_width: %s", self.x_width)
+            logger.debug("y_width: %s", self.y_width)
+
+            self.distance_field = DistanceField(
+                ox, oy, self.min_x, self.min_y, self.x_width, self.y_width,
+                self.resolution, self.rr, primitives)
+            self.obstacle_map = obstacle_cache.load_or_build(
+                ox, oy, self.resolution, self.rr,
+                (self.min_x, self.min_y, self.max_x, self.max_y,
+                 self.x_width, self.y_width),
+                lambda: self.distance_field.threshold(self.rr),
+                primitives)
+
+    def set_robot_radius(self, rr):
+        with self.setup_stats.timer("map_build"):
+            self.rr = rr
+            self.obstacle_map = self.distance_field.threshold(rr)
 
     @staticmethod
     def get_motion_model():
@@ -186,6 +203,7 @@ class DijkstraPlanner:
 
 
 def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     print(__file__ + " start the Dijkstra algorithm demo !!")
 
     sx = 0.0
@@ -208,33 +226,9 @@ def main():
     for i in range(-10, 61):
         ox.append(-10.0)
         oy.append(i)
-    start_x, start_y = 20, 0
-    end_x, end_y = 25, 20
-    steps = 425
-    for i in range(steps + 1):
-        t = i / steps
-        x = start_x + t * (end_x - start_x)
-        y = start_y + t * (end_y - start_y)
-        ox.append(x)
-        oy.append(y)
-    start_x, start_y = 10, 55
-    end_x, end_y = 25, 45
-    steps = 325
-    for i in range(steps + 1):
-        t = i / steps
-        x = start_x + t * (end_x - start_x)
-        y = start_y + t * (end_y - start_y)
-        ox.append(x)
-        oy.append(y)
-    start_x, start_y = 30, 0
-    end_x, end_y = 45, 10
-    steps = 325
-    for i in range(steps + 1):
-        t = i / steps
-        x = start_x + t * (end_x - start_x)
-        y = start_y + t * (end_y - start_y)
-        ox.append(x)
-        oy.append(y)
+    primitives = [Segment(20, 0, 25, 20),
+                  Segment(10, 55, 25, 45),
+                  Segment(30, 0, 45, 10)]
 
     tc_x, tc_y = [], []
     for i in range(10, 26):
@@ -249,6 +243,8 @@ def main():
 
     if show_animation:
         plt.plot(ox, oy, ".k")
+        for primitive in primitives:
+            plt.plot(*primitive.get_outline(), "-k")
         plt.plot(sx, sy, "og")
         plt.plot(gx, gy, "xb")
         plt.plot(fc_x, fc_y, "oy")
@@ -256,8 +252,11 @@ def main():
         plt.grid(True)
         plt.axis("equal")
 
-    dijkstra = DijkstraPlanner(ox, oy, grid_size, robot_radius, fc_x, fc_y, tc_x, tc_y)
+    dijkstra = DijkstraPlanner(ox, oy, grid_size, robot_radius, fc_x, fc_y, tc_x, tc_y,
+                               primitives=primitives)
     rx, ry = dijkstra.planning(sx, sy, gx, gy)
+    if is_memory_profiling():
+        logger.info("Memory profile:\n%s", format_memory_report(dijkstra))
 
     if show_animation:
         plt.plot(rx, ry, "-r")
@@ -1,18 +1,36 @@
+import logging
 import math
+import os
+import sys
 import random
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cost_raster import CostRaster
+from live_animation import LiveAnimation
+from obstacle_map import (DistanceField, Segment, calc_obstacle_extent,
+                          obstacle_cache)
+from planner_stats import (PlannerStats, format_memory_report,
+                           is_memory_profiling)
+
 show_animation = True
+animation_fps = 30
+
+logger = logging.getLogger(__name__)
 
 
 class RRTPlanner:
 
-    def __init__(self, ox, oy, resolution, rr, fc_x, fc_y, tc_x, tc_y):
+    def __init__(self, ox, oy, resolution, rr, fc_x, fc_y, tc_x, tc_y,
+                 primitives=()):
         self.resolution = resolution
         self.rr = rr
         self.min_x, self.min_y = 0, 0
         self.max_x, self.max_y = 0, 0
         self.obstacle_map = None
+        self.distance_field = None
+        self.cost_raster = None
+        self.animation = None
         self.x_width, self.y_width = 0, 0
         
         self.fc_x = fc_x
@@ -23,7 +41,11 @@ class RRTPlanner:
         self.Delta_C1 = 0.3
         self.Delta_C2 = 0.15
         
-        self.calc_obstacle_map(ox, oy)
+        self.setup_stats = PlannerStats()
+        self.stats = None
+        self.path_cost = None
+        self.calc_obstacle_map(ox, oy, primitives)
+        self.calc_cost_raster()
         
         self.expand_dis = 1.0
         self.path_resolution = 0.5
@@ -42,44 +64,57 @@ class RRTPlanner:
                 self.cost) + "," + str(self.parent_index)
 
     def planning(self, sx, sy, gx, gy):
+        self.stats = stats = PlannerStats(runs=1)
+
         start_node = self.Node(sx, sy, 0.0, -1)
         goal_node = self.Node(gx, gy, 0.0, -1)
         
         node_list = [start_node]
+        self.path_cost = math.inf
+        if show_animation:
+            self.animation = LiveAnimation("-c", animation_fps)
         
-        for i in range(self.max_iter):
-            # Sample random point
-            rnd_node = self.get_random_node(goal_node)
-            
-            # Find nearest node
-            nearest_ind = self.get_nearest_node_index(node_list, rnd_node)
-            nearest_node = node_list[nearest_ind]
-            
-            # Expand towards random point
-            new_node = self.steer(nearest_node, rnd_node, self.expand_dis)
-            
-            # Check collision
-            if self.check_collision(nearest_node, new_node):
-                new_node.parent_index = nearest_ind
-                node_list.append(new_node)
+        with stats.timer("search"):
+            for i in range(self.max_iter):
+                # Sample random point
+                rnd_node = self.get_random_node(goal_node)
                 
-                if show_animation and i % 5 == 0:
-                    plt.plot([nearest_node.x, new_node.x],
-                            [nearest_node.y, new_node.y], "-c")
-                    plt.gcf().canvas.mpl_connect('key_release_event',
-                                                lambda event: [exit(0) if event.key == 'escape' else None])
-                    plt.pause(0.001)
+                # Find nearest node
+                nearest_ind = self.get_nearest_node_index(node_list, rnd_node)
+                nearest_node = node_list[nearest_ind]
                 
-                # Check if goal is reached
-                if self.calc_dist_to_goal(new_node, goal_node) <= self.expand_dis:
-                    goal_node.parent_index = len(node_list) - 1
-                    goal_node.cost = new_node.cost + self.calc_cost(new_node, goal_node)
-                    print("Total Trip time required -> ", goal_node.cost)
+                # Expand towards random point
+                new_node = self.steer(nearest_node, rnd_node, self.expand_dis)
+                stats.generated += 1
+                
+                # Check collision
+                if self.check_collision(nearest_node, new_node):
+                    new_node.parent_index = nearest_ind
+                    node_list.append(new_node)
+                    stats.expanded += 1
+                    
+                    if show_animation:
+                        self.animation.add_segment(nearest_node.x, nearest_node.y,
+                                                   new_node.x, new_node.y)
                     
-                    node_list.append(goal_node)
-                    break
+                    # Check if goal is reached
+                    if self.calc_dist_to_goal(new_node, goal_node) <= self.expand_dis:
+                        goal_node.parent_index = len(node_list) - 1
+                        goal_node.cost = new_node.cost + self.calc_cost(new_node, goal_node)
+                        logger.info("Total Trip time required -> %s", goal_node.cost)
+                        self.path_cost = goal_node.cost
+                        
+                        node_list.append(goal_node)
+                        break
+                else:
+                    stats.rejected += 1
         
-        rx, ry = self.calc_final_path(goal_node, node_list)
+        if show_animation:
+            self.animation.finish()
+
+        with stats.timer("path"):
+            rx, ry = self.calc_final_path(goal_node, node_list)
+        logger.debug("Planner stats: %s", stats)
         return rx, ry
 
     def steer(self, from_node, to_node, expand_dis):
@@ -108,16 +143,18 @@ class RRTPlanner:
         mid_x = (from_node.x + to_node.x) / 2
         mid_y = (from_node.y + to_node.y) / 2
         
-        cost = dist
-        
-        if mid_x in self.tc_x and mid_y in self.tc_y:
-            cost += self.Delta_C1 * dist
-        
-        if mid_x in self.fc_x and mid_y in self.fc_y:
-            cost += self.Delta_C2 * dist
+        cost = dist * self.cost_raster.calc_multiplier(mid_x, mid_y)
         
         return cost
 
+    def calc_cost_raster(self):
+        with self.setup_stats.timer("zone_compile"):
+            self.cost_raster = CostRaster(self.min_x, self.min_y,
+                                          self.x_width, self.y_width,
+                                          self.resolution)
+            self.cost_raster.add_zone(self.tc_x, self.tc_y, self.Delta_C1)
+            self.cost_raster.add_zone(self.fc_x, self.fc_y, self.Delta_C2)
+
     def get_random_node(self, goal_node):
         if random.random() < self.goal_sample_rate:
             return self.Node(goal_node.x, goal_node.y)
@@ -181,34 +218,42 @@ class RRTPlanner:
         pos = index * self.resolution + min_position
         return pos
 
-    def calc_obstacle_map(self, ox, oy):
-        self.min_x = round(min(ox))
-        self.min_y = round(min(oy))
-        self.max_x = round(max(ox))
-        self.max_y = round(max(oy))
-        print("min_x:", self.min_x)
-        print("min_y:", self.min_y)
-        print("max_x:", self.max_x)
-        print("max_y:", self.max_y)
-
-        self.x_width = round((self.max_x - self.min_x) / self.resolution)
-        self.y_width = round((self.max_y - self.min_y) / self.resolution)
-        print("x_width:", self.x_width)
-        print("y_width:", self.y_width)
-
-        self.obstacle_map = [[False for _ in range(self.y_width)]
-                             for _ in range(self.x_width)]
-        for ix in range(self.x_width):
-            x = self.calc_grid_position(ix, self.min_x)
-            for iy in range(self.y_width):
-                y = self.calc_grid_position(iy, self.min_y)
-                for iox, ioy in zip(ox, oy):
-                    d = math.hypot(iox - x, ioy - y)
-                    if d <= self.rr:
-                        self.obstacle_map[ix][iy] = True
+    def calc_obstacle_map(self, ox, oy, primitives=()):
+        with self.setup_stats.timer("map_build"):
+            min_x, min_y, max_x, max_y = calc_obstacle_extent(ox, oy,
+                                                              primitives)
+            self.min_x = round(min_x)
+            self.min_y = round(min_y)
+            self.max_x = round(max_x)
+            self.max_y = round(max_y)
+            logger.debug("min_x: %s", self.min_x)
+            logger.debug("min_y: %s", self.min_y)
+            logger.debug("max_x: %s", self.max_x)
+            logger.debug("max_y: %s", self.max_y)
+
+            self.x_width = round((self.max_x - self.min_x) / self.resolution)
+            self.y_width = round((self.max_y - self.min_y) / self.resolution)
+            logger.debug("x_width: %s", self.x_width)
+            logger.debug("y_width: %s", self.y_width)
+
+            self.distance_field = DistanceField(
+                ox, oy, self.min_x, self.min_y, self.x_width, self.y_width,
+                self.resolution, self.rr, primitives)
+            self.obstacle_map = obstacle_cache.load_or_build(
+                ox, oy, self.resolution, self.rr,
+                (self.min_x, self.min_y, self.max_x, self.max_y,
+                 self.x_width, self.y_width),
+                lambda: self.distance_field.threshold(self.rr),
+                primitives)
+
+    def set_robot_radius(self, rr):
+        with self.setup_stats.timer("map_build"):
+            self.rr = rr
+            self.obstacle_map = self.distance_field.threshold(rr)
 
 
 def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     print(__file__ + " start the RRT algorithm demo !!")
 
     sx = 0.0
@@ -231,33 +276,9 @@ def main():
     for i in range(-10, 61):
         ox.append(-10.0)
         oy.append(i)
-    start_x, start_y = 20, 0
-    end_x, end_y = 25, 20
-    steps = 425
-    for i in range(steps + 1):
-        t = i / steps
-        x = start_x + t * (end_x - start_x)
-        y = start_y + t * (end_y - start_y)
-        ox.append(x)
-        oy.append(y)
-    start_x, start_y = 10, 55
-    end_x, end_y = 25, 45
-    steps = 325
-    for i in range(steps + 1):
-        t = i / steps
-        x = start_x + t * (end_x - start_x)
-        y = start_y + t * (end_y - start_y)
-        ox.append(x)
-        oy.append(y)
-    start_x, start_y = 30, 0
-    end_x, end_y = 45, 10
-    steps = 325
-    for i in range(steps + 1):
-        t = i / steps
-        x = start_x + t * (end_x - start_x)
-        y = start_y + t * (end_y - start_y)
-        ox.append(x)
-        oy.append(y)
+    primitives = [Segment(20, 0, 25, 20),
+                  Segment(10, 55, 25, 45),
+                  Segment(30, 0, 45, 10)]
 
     tc_x, tc_y = [], []
     for i in range(10, 26):
@@ -272,6 +293,8 @@ def main():
 
     if show_animation:
         plt.plot(ox, oy, ".k")
+        for primitive in primitives:
+            plt.plot(*primitive.get_outline(), "-k")
         plt.plot(sx, sy, "og")
         plt.plot(gx, gy, "xb")
         plt.plot(fc_x, fc_y, "oy")
@@ -279,8 +302,11 @@ def main():
         plt.grid(True)
         plt.axis("equal")
     
-    rrt = RRTPlanner(ox, oy, grid_size, robot_radius, fc_x, fc_y, tc_x, tc_y)
+    rrt = RRTPlanner(ox, oy, grid_size, robot_radius, fc_x, fc_y, tc_x, tc_y,
+                     primitives=primitives)
     rx, ry = rrt.planning(sx, sy, gx, gy)
+    if is_memory_profiling():
+        logger.info("Memory profile:\n%s", format_memory_report(rrt))
 
     if show_animation:
         plt.plot(rx, ry, "-r")
@@ -0,0 +1,170 @@
+import argparse
+import importlib.util
+import json
+import logging
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from obstacle_map import Segment
+from planner_stats import (is_memory_profiling, start_memory_profiling,
+                           stop_memory_profiling)
+
+TASK_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Planner name -> (script in this directory, planner class)
+PLANNERS = {
+    "astar": ("A star task a3.py", "AStarPlanner"),
+    "dijkstra": ("Dijkstra task a3.py", "DijkstraPlanner"),
+    "rrt": ("RRT task a3.py", "RRTPlanner"),
+}
+
+# Start and goal of each scenario on the shared map
+SCENARIOS = {
+    "corner": ((0.0, 0.0), (50.0, 50.0)),
+    "cross_zones": ((-5.0, 30.0), (55.0, 20.0)),
+    "behind_wall": ((15.0, 5.0), (40.0, 0.0)),
+    "short_hop": ((0.0, 0.0), (8.0, 6.0)),
+    "top_edge": ((0.0, 55.0), (55.0, 55.0)),
+}
+
+
+def load_planner_module(script):
+    path = os.path.join(TASK_DIR, script)
+    name = os.path.splitext(script)[0].lower().replace(" ", "_")
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.show_animation = False
+    return module
+
+
+def build_demo_map():
+    """
+    Walls, obstacle segments and cost zones shared by the task a3 scripts.
+    """
+    ox, oy = [], []
+    for i in range(-10, 60):
+        ox.append(i)
+        oy.append(-10.0)
+    for i in range(-10, 60):
+        ox.append(60.0)
+        oy.append(i)
+    for i in range(-10, 61):
+        ox.append(i)
+        oy.append(60.0)
+    for i in range(-10, 61):
+        ox.append(-10.0)
+        oy.append(i)
+    primitives = [Segment(20, 0, 25, 20),
+                  Segment(10, 55, 25, 45),
+                  Segment(30, 0, 45, 10)]
+
+    tc_x, tc_y = [], []
+    for i in range(10, 26):
+        for j in range(20, 46):
+            tc_x.append(i)
+            tc_y.append(j)
+    fc_x, fc_y = [], []
+    for i in range(30, 46):
+        for j in range(10, 36):
+            fc_x.append(i)
+            fc_y.append(j)
+    return ox, oy, primitives, tc_x, tc_y, fc_x, fc_y
+
+
+def run_planner(planner, start, goal, seed):
+    # RRT samples from the global random module; seeding before every run
+    # makes its runs repeat exactly
+    random.seed(seed)
+    start_time = time.perf_counter()
+    planner.planning(*start, *goal)
+    return time.perf_counter() - start_time
+
+
+def compare_planners(planners, scenarios, repeat=3, seed=5, memory=True):
+    """
+    Plan every scenario with every planner.
+
+    Returns one row per (scenario, planner) with the path cost, the nodes
+    expanded (grid search) or added to the tree (RRT), the candidates
+    generated or sampled, the median wall time of repeat runs and, with
+    memory on, the peak memory of one extra run traced by tracemalloc.
+    Timed runs are never traced, as tracing slows them down.
+    """
+    rows = []
+    for scenario, (start, goal) in scenarios.items():
+        for name, planner in planners.items():
+            times = [run_planner(planner, start, goal, seed)
+                     for _ in range(repeat)]
+            stats = planner.stats
+            row = {
+                "scenario": scenario, "planner": name,
+                "found": math.isfinite(planner.path_cost),
+                "cost": planner.path_cost,
+                "expanded": stats.expanded, "generated": stats.generated,
+                "time": statistics.median(times), "peak_memory": None,
+            }
+            if memory:
+                tracing = is_memory_profiling()
+                start_memory_profiling()
+                run_planner(planner, start, goal, seed)
+                row["peak_memory"] = max(planner.stats.memory_peak.values())
+                if not tracing:
+                    stop_memory_profiling()
+            rows.append(row)
+    return rows
+
+
+def format_table(rows):
+    lines = [f"{'scenario':<13}{'planner':<10}{'cost':>10}{'expanded':>10}"
+             f"{'generated':>11}{'time (ms)':>11}{'peak (KiB)':>12}"]
+    for row in rows:
+        cost = f"{row['cost']:.2f}" if row["found"] else "no path"
+        peak = (f"{row['peak_memory'] / 1024:.1f}"
+                if row["peak_memory"] is not None else "-")
+        lines.append(f"{row['scenario']:<13}{row['planner']:<10}{cost:>10}"
+                     f"{row['expanded']:>10}{row['generated']:>11}"
+                     f"{row['time'] * 1e3:>11.1f}{peak:>12}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run A*, Dijkstra and RRT on the same map and scenarios.")
+    parser.add_argument("--planners", nargs="+", choices=PLANNERS,
+                        default=list(PLANNERS))
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS,
+                        default=list(SCENARIOS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=5,
+                        help="random seed of every RRT run")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip the traced run that measures memory")
+    parser.add_argument("--output", help="also write the rows as JSON here")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    ox, oy, primitives, tc_x, tc_y, fc_x, fc_y = build_demo_map()
+    planners = {}
+    for name in args.planners:
+        script, class_name = PLANNERS[name]
+        planner_class = getattr(load_planner_module(script), class_name)
+        planners[name] = planner_class(ox, oy, 1.0, 1.0, fc_x, fc_y,
+                                       tc_x, tc_y, primitives=primitives)
+
+    rows = compare_planners(planners,
+                            {name: SCENARIOS[name] for name in args.scenarios},
+                            args.repeat, args.seed, not args.no_memory)
+    print(format_table(rows))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,52 @@
+import logging
 import math
+import time
 
 import matplotlib.pyplot as plt
 
+from batch_planning import plan_many
+from cost_raster import CostRaster
+from grid_search import flatten_obstacle_map, search
+from heuristics import make_heuristic
+from landmarks import get_landmark_table
+from live_animation import LiveAnimation
+from obstacle_map import (DistanceField, Segment, calc_obstacle_extent,
+                          obstacle_cache)
+from planner_stats import PlannerStats
+
 show_animation = True
+animation_fps = 30
+
+logger = logging.getLogger(__name__)
 
 
 class AStarPlanner:
 
-    def __init__(self, ox, oy, resolution, rr, fc_x, fc_y, tc_x, tc_y):
+    def __init__(self, ox, oy, resolution, rr, fc_x, fc_y, tc_x, tc_y,
+                 primitives=()):
 
         self.resolution = resolution
         self.rr = rr
         self.min_x, self.min_y = 0, 0
         self.max_x, self.max_y = 0, 0
         self.obstacle_map = None
+        self.distance_field = None
+        self.cost_raster = None
+        self.animation = None
         self.x_width, self.y_width = 0, 0
         self.motion = self.get_motion_model()
-        self.calc_obstacle_map(ox, oy)
+        self.setup_stats = PlannerStats()
+        self.stats = None
+        self.heuristic = None
+        self.jump_points = False
+        self.bidirectional = False
+        # Heuristic weights of the anytime search, e.g. (3.0, 2.0, 1.0), and
+        # the seconds it may run; see grid_search.anytime_search
+        self.anytime_weights = None
+        self.deadline = None
+        self.solutions = []
+        self.path_cost = None
+        self.calc_obstacle_map(ox, oy, primitives)
 
         self.fc_x = fc_x
         self.fc_y = fc_y
@@ -27,6 +57,7 @@ class AStarPlanner:
         self.Delta_C2 = 0.15
 
         self.costPerGrid = 1
+        self.calc_cost_raster()
 
 
     class Node:
@@ -40,100 +71,119 @@ class AStarPlanner:
             return str(self.x) + "," + str(self.y) + "," + str(
                 self.cost) + "," + str(self.parent_index)
 
-    def planning(self, sx, sy, gx, gy):
+    def planning(self, sx, sy, gx, gy, trace=None):
+        self.stats = stats = PlannerStats(runs=1)
 
         start_node = self.Node(self.calc_xy_index(sx, self.min_x),
                                self.calc_xy_index(sy, self.min_y), 0.0, -1)
         goal_node = self.Node(self.calc_xy_index(gx, self.min_x),
                               self.calc_xy_index(gy, self.min_y), 0.0, -1)
 
-        open_set, closed_set = dict(), dict()
-        open_set[self.calc_grid_index(start_node)] = start_node
-
-        while 1:
-            if len(open_set) == 0:
-                print("Open set is empty..")
-                break
-
-            c_id = min(
-                open_set,
-                key=lambda o: open_set[o].cost + self.calc_heuristic(self, goal_node,
-                                                                     open_set[o]))
-            current = open_set[c_id]
-
-            if show_animation:
-                plt.plot(self.calc_grid_position(current.x, self.min_x),
-                         self.calc_grid_position(current.y, self.min_y), "xc")
-                plt.gcf().canvas.mpl_connect('key_release_event',
-                                             lambda event: [exit(
-                                                 0) if event.key == 'escape' else None])
-                if len(closed_set.keys()) % 10 == 0:
-                    plt.pause(0.001)
-
-            if current.x == goal_node.x and current.y == goal_node.y:
-                print("Total Trip time required -> ",current.cost )
-                goal_node.parent_index = current.parent_index
-                goal_node.cost = current.cost
-                break
-
-            del open_set[c_id]
-
-            closed_set[c_id] = current
-
-            for i, _ in enumerate(self.motion):
-                node = self.Node(current.x + self.motion[i][0],
-                                 current.y + self.motion[i][1],
-                                 current.cost + self.motion[i][2] * self.costPerGrid, c_id)
-
-                if self.calc_grid_position(node.x, self.min_x) in self.tc_x:
-                    if self.calc_grid_position(node.y, self.min_y) in self.tc_y:
-                        node.cost = node.cost + self.Delta_C1 * self.motion[i][2]
-
-                if self.calc_grid_position(node.x, self.min_x) in self.fc_x:
-                    if self.calc_grid_position(node.y, self.min_y) in self.fc_y:
-                        node.cost = node.cost + self.Delta_C2 * self.motion[i][2]
-
-                n_id = self.calc_grid_index(node)
-
-                if not self.verify_node(node):
-                    continue
-
-                if n_id in closed_set:
-                    continue
-
-                if n_id not in open_set:
-                    open_set[n_id] = node
-                else:
-                    if open_set[n_id].cost > node.cost:
-                        open_set[n_id] = node
+        if show_animation:
+            self.animation = LiveAnimation("xc", animation_fps)
+
+        with stats.timer("zone_compile"):
+            step_costs = self.cost_raster.get_step_costs()
+            landmarks = (get_landmark_table(self.obstacle_map, self.motion,
+                                            self.cost_raster)
+                         if self.heuristic == "alt" else None)
+            calc_heuristic = make_heuristic(
+                self.heuristic, (goal_node.x, goal_node.y), self.motion,
+                self.cost_raster, landmarks=landmarks)
+            reverse = None
+            if self.bidirectional:
+                reverse = (self.cost_raster.get_reverse_step_costs(),
+                           make_heuristic(self.heuristic,
+                                          (start_node.x, start_node.y),
+                                          self.motion, self.cost_raster,
+                                          reverse=True, landmarks=landmarks))
+            jump_stops = (self.cost_raster.get_jump_stops()
+                          if self.jump_points else None)
+            anytime = None
+            if self.anytime_weights is not None:
+                self.solutions = []
+                anytime = (self.anytime_weights,
+                           None if self.deadline is None
+                           else time.perf_counter() + self.deadline,
+                           self.add_solution)
+        with stats.timer("search"):
+            state, goal_id = search(
+                flatten_obstacle_map(self.obstacle_map), self.x_width,
+                self.y_width, self.motion, (start_node.x, start_node.y),
+                (goal_node.x, goal_node.y), step_costs,
+                calc_heuristic,
+                self.plot_expansion if show_animation else None, trace,
+                jump_stops, reverse, anytime)
+        stats.add_search(state)
+        if show_animation:
+            self.animation.finish()
+
+        self.path_cost = math.inf
+        if goal_id == -1:
+            logger.warning("Open set is empty..")
+        else:
+            goal_node.parent_index = state.parent[goal_id]
+            goal_node.cost = state.cost[goal_id]
+            logger.info("Total Trip time required -> %s", goal_node.cost)
+            self.path_cost = goal_node.cost
 
-        rx, ry = self.calc_final_path(goal_node, closed_set)
+        with stats.timer("path"):
+            rx, ry = self.calc_final_path(goal_node, state)
+        logger.debug("Planner stats: %s", stats)
 
         return rx, ry
 
-    def calc_final_path(self, goal_node, closed_set):
+    def plan_many(self, queries, workers=None):
+        """
+        Plan many (start, goal) or (start, goal, overrides) queries, over a
+        process pool with workers > 1, yielding (i, rx, ry, cost, stats) as
+        each query is planned; see batch_planning.plan_many.
+        """
+        return plan_many(self, queries, workers)
+
+    def calc_cost_raster(self):
+        with self.setup_stats.timer("zone_compile"):
+            self.cost_raster = CostRaster(self.min_x, self.min_y,
+                                          self.x_width, self.y_width,
+                                          self.resolution, self.motion,
+                                          self.costPerGrid)
+            self.cost_raster.add_zone(self.tc_x, self.tc_y, self.Delta_C1,
+                                      per_grid=False)
+            self.cost_raster.add_zone(self.fc_x, self.fc_y, self.Delta_C2,
+                                      per_grid=False)
+
+    def plot_expansion(self, ix, iy, n_closed):
+        self.animation.add(self.calc_grid_position(ix, self.min_x),
+                           self.calc_grid_position(iy, self.min_y))
+
+    def add_solution(self, cost, bound):
+        logger.info("Anytime path cost %s, at most %.3f times optimal",
+                    cost, bound)
+        self.solutions.append((cost, bound))
+
+    def calc_final_path(self, goal_node, state):
         rx, ry = [self.calc_grid_position(goal_node.x, self.min_x)], [
             self.calc_grid_position(goal_node.y, self.min_y)]
         parent_index = goal_node.parent_index
         while parent_index != -1:
-            n = closed_set[parent_index]
-            rx.append(self.calc_grid_position(n.x, self.min_x))
-            ry.append(self.calc_grid_position(n.y, self.min_y))
-            parent_index = n.parent_index
+            rx.append(self.calc_grid_position(parent_index % self.x_width,
+                                              self.min_x))
+            ry.append(self.calc_grid_position(parent_index // self.x_width,
+                                              self.min_y))
+            parent_index = state.parent[parent_index]
 
         return rx, ry
 
-    @staticmethod
     def calc_heuristic(self, n1, n2):
         w = 1.0
         d = w * math.hypot(n1.x - n2.x, n1.y - n2.y)
         d = d * self.costPerGrid
         return d
 
-    def calc_heuristic_maldis(n1, n2):
+    def calc_heuristic_maldis(self, n1, n2):
         w = 1.0
-        dx = w * math.abs(n1.x - n2.x)
-        dy = w *math.abs(n1.y - n2.y)
+        dx = w * abs(n1.x - n2.x)
+        dy = w * abs(n1.y - n2.y)
         return dx + dy
 
     def calc_grid_position(self, index, min_position):
@@ -144,7 +194,7 @@ class AStarPlanner:
         return round((position - min_pos) / self.resolution)
 
     def calc_grid_index(self, node):
-        return (node.y - self.min_y) * self.x_width + (node.x - self.min_x)
+        return node.y * self.x_width + node.x
 
     def verify_node(self, node):
         px = self.calc_grid_position(node.x, self.min_x)
@@ -164,33 +214,38 @@ class AStarPlanner:
 
         return True
 
-    def calc_obstacle_map(self, ox, oy):
-
-        self.min_x = round(min(ox))
-        self.min_y = round(min(oy))
-        self.max_x = round(max(ox))
-        self.max_y = round(max(oy))
-        print("min_x:", self.min_x)
-        print("min_y:", self.min_y)
-        print("max_x:", self.max_x)
-        print("max_y:", self.max_y)
-
-        self.x_width = round((self.max_x - self.min_x) / self.resolution)
-        self.y_width = round((self.max_y - self.min_y) / self.resolution)
-        print("x_width:", self.x_width)
-        print("y_width:", self.y_width)
-
-        self.obstacle_map = [[False for _ in range(self.y_width)]
-                             for _ in range(self.x_width)]
-        for ix in range(self.x_width):
-            x = self.calc_grid_position(ix, self.min_x)
-            for iy in range(self.y_width):
-                y = self.calc_grid_position(iy, self.min_y)
-                for iox, ioy in zip(ox, oy):
-                    d = math.hypot(iox - x, ioy - y)
-                    if d <= self.rr:
-                        self.obstacle_map[ix][iy] = True
-                        break
+    def calc_obstacle_map(self, ox, oy, primitives=()):
+        with self.setup_stats.timer("map_build"):
+            min_x, min_y, max_x, max_y = calc_obstacle_extent(ox, oy,
+                                                              primitives)
+            self.min_x = round(min_x)
+            self.min_y = round(min_y)
+            self.max_x = round(max_x)
+            self.max_y = round(max_y)
+            logger.debug("min_x: %s", self.min_x)
+            logger.debug("min_y: %s", self.min_y)
+            logger.debug("max_x: %s", self.max_x)
+            logger.debug("max_y: %s", self.max_y)
+
+            self.x_width = round((self.max_x - self.min_x) / self.resolution)
+            self.y_width = round((self.max_y - self.min_y) / self.resolution)
+            logger.debug("x_width: %s", self.x_width)
+            logger.debug("y_width: %s", self.y_width)
+
+            self.distance_field = DistanceField(
+                ox, oy, self.min_x, self.min_y, self.x_width, self.y_width,
+                self.resolution, self.rr, primitives)
+            self.obstacle_map = obstacle_cache.load_or_build(
+                ox, oy, self.resolution, self.rr,
+                (self.min_x, self.min_y, self.max_x, self.max_y,
+                 self.x_width, self.y_width),
+                lambda: self.distance_field.threshold(self.rr),
+                primitives)
+
+    def set_robot_radius(self, rr):
+        with self.setup_stats.timer("map_build"):
+            self.rr = rr
+            self.obstacle_map = self.distance_field.threshold(rr)
 
     @staticmethod
     def get_motion_model():
@@ -206,7 +261,94 @@ class AStarPlanner:
         return motion
 
 
+airbuses = {
+    "A321neo": {
+        "fuel_rate": 54,      # kg/min
+        "capacity": 200,
+        "time_cost": {"low": 10, "medium": 15, "high": 20},  # $/min
+        "fixed": 1800         # $
+    },
+    "A330-900neo": {
+        "fuel_rate": 84,
+        "capacity": 300,
+        "time_cost": {"low": 15, "medium": 21, "high": 27},
+        "fixed": 2000
+    },
+    "A350-900": {
+        "fuel_rate": 90,
+        "capacity": 350,
+        "time_cost": {"low": 20, "medium": 27, "high": 34},
+        "fixed": 2500
+    }
+}
+
+
+def per_flight_cost(spec, Tbest_min, fuel_cost_per_kg, time_cost_level):
+    fuel_mass = spec["fuel_rate"] * Tbest_min
+    fuel_cost = fuel_mass * fuel_cost_per_kg
+    time_cost = spec["time_cost"][time_cost_level] * Tbest_min
+    return fuel_cost + time_cost + spec["fixed"]
+
+
+def evaluate_scenario(name, passengers, max_flights, time_cost_level, fuel_cost_per_kg,
+                      Tbest):
+    print(f"\n## ✈️ {name}: Tbest={Tbest} min, time cost={time_cost_level}, fuel cost={fuel_cost_per_kg} $/kg")
+
+    # --- New: Prepare for Table Output ---
+    results = []
+    best_model = None
+    best_total = float("inf")
+
+    # Define table headers
+    header = ["Model", "Flights Needed", "Per-Flight Cost ($)", "Total Cost ($)", "Feasibility"]
+
+    # Calculate results for each model
+    for model, spec in airbuses.items():
+        flights_needed = math.ceil(passengers / spec["capacity"])
+        feasible = flights_needed <= max_flights
+        pf_cost = per_flight_cost(spec, Tbest, fuel_cost_per_kg, time_cost_level)
+
+        total_cost = 0.0
+        feasibility_text = "Feasible"
+
+        if feasible:
+            total_cost = pf_cost * flights_needed
+            if total_cost < best_total:
+                best_total = total_cost
+                best_model = model
+        else:
+            feasibility_text = f"Infeasible (Max {max_flights})"
+            total_cost = float('nan') # Use NaN for infeasible total cost
+
+        results.append({
+            "Model": model,
+            "Flights": flights_needed,
+            "PerFlight": f"{pf_cost:.2f}",
+            "TotalCost": f"{total_cost:.2f}" if feasible else "-",
+            "Feasibility": feasibility_text
+        })
+
+    # --- New: Print Table ---
+    print("-" * 85)
+    # Print Header
+    print(f"{header[0]:<15} | {header[1]:^15} | {header[2]:^20} | {header[3]:^15} | {header[4]:<15}")
+    print("-" * 85)
+
+    # Print Rows
+    for row in results:
+        print(f"{row['Model']:<15} | {row['Flights']:^15} | {row['PerFlight']:>20} | {row['TotalCost']:>15} | {row['Feasibility']:<15}")
+
+    print("-" * 85)
+
+    # Print Best Model Summary
+    if best_model is not None:
+        print(f"**Best Aircraft: {best_model}** with Total Cost **${best_total:.2f}**")
+    else:
+        print("No feasible aircraft for this scenario.")
+
+
 def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     print(__file__ + " start the A star algorithm demo !!")
 
     sx = 0.0
@@ -230,33 +372,9 @@ def main():
     for i in range(-10, 61):
         ox.append(-10.0)
         oy.append(i)
-    start_x, start_y = 20, 0
-    end_x, end_y = 25, 20
-    steps = 425
-    for i in range(steps + 1):
-        t = i / steps
-        x = start_x + t * (end_x - start_x)
-        y = start_y + t * (end_y - start_y)
-        ox.append(x)
-        oy.append(y)
-    start_x, start_y = 10, 55
-    end_x, end_y = 25, 45
-    steps = 325
-    for i in range(steps + 1):
-        t = i / steps
-        x = start_x + t * (end_x - start_x)
-        y = start_y + t * (end_y - start_y)
-        ox.append(x)
-        oy.append(y)
-    start_x, start_y = 30, 0
-    end_x, end_y = 45, 10
-    steps = 325
-    for i in range(steps + 1):
-        t = i / steps
-        x = start_x + t * (end_x - start_x)
-        y = start_y + t * (end_y - start_y)
-        ox.append(x)
-        oy.append(y)
+    primitives = [Segment(20, 0, 25, 20),
+                  Segment(10, 55, 25, 45),
+                  Segment(30, 0, 45, 10)]
 
 
     tc_x, tc_y = [], []
@@ -273,6 +391,8 @@ def main():
 
     if show_animation:
         plt.plot(ox, oy, ".k")
+        for primitive in primitives:
+            plt.plot(*primitive.get_outline(), "-k")
         plt.plot(sx, sy, "og")
         plt.plot(gx, gy, "xb")
 
@@ -282,102 +402,21 @@ def main():
         plt.grid(True)
         plt.axis("equal")
 
-    a_star = AStarPlanner(ox, oy, grid_size, robot_radius, fc_x, fc_y, tc_x, tc_y)
+    a_star = AStarPlanner(ox, oy, grid_size, robot_radius, fc_x, fc_y, tc_x, tc_y,
+                          primitives=primitives)
     rx, ry = a_star.planning(sx, sy, gx, gy)
 
     # ==== Added lines (cost evaluation) ====
     Tbest = 74.52905473706207  # minutes (given trip time)
 
-    airbuses = {
-        "A321neo": {
-            "fuel_rate": 54,      # kg/min
-            "capacity": 200,
-            "time_cost": {"low": 10, "medium": 15, "high": 20},  # $/min
-            "fixed": 1800         # $
-        },
-        "A330-900neo": {
-            "fuel_rate": 84,
-            "capacity": 300,
-            "time_cost": {"low": 15, "medium": 21, "high": 27},
-            "fixed": 2000
-        },
-        "A350-900": {
-            "fuel_rate": 90,
-            "capacity": 350,
-            "time_cost": {"low": 20, "medium": 27, "high": 34},
-            "fixed": 2500
-        }
-    }
-
-    def per_flight_cost(spec, Tbest_min, fuel_cost_per_kg, time_cost_level):
-        fuel_mass = spec["fuel_rate"] * Tbest_min
-        fuel_cost = fuel_mass * fuel_cost_per_kg
-        time_cost = spec["time_cost"][time_cost_level] * Tbest_min
-        return fuel_cost + time_cost + spec["fixed"]
-
-    def evaluate_scenario(name, passengers, max_flights, time_cost_level, fuel_cost_per_kg):
-        print(f"\n## ✈️ {name}: Tbest={Tbest} min, time cost={time_cost_level}, fuel cost={fuel_cost_per_kg} $/kg")
-
-        # --- New: Prepare for Table Output ---
-        results = []
-        best_model = None
-        best_total = float("inf")
-
-        # Define table headers
-        header = ["Model", "Flights Needed", "Per-Flight Cost ($)", "Total Cost ($)", "Feasibility"]
-
-        # Calculate results for each model
-        for model, spec in airbuses.items():
-            flights_needed = math.ceil(passengers / spec["capacity"])
-            feasible = flights_needed <= max_flights
-            pf_cost = per_flight_cost(spec, Tbest, fuel_cost_per_kg, time_cost_level)
-
-            total_cost = 0.0
-            feasibility_text = "Feasible"
-
-            if feasible:
-                total_cost = pf_cost * flights_needed
-                if total_cost < best_total:
-                    best_total = total_cost
-                    best_model = model
-            else:
-                feasibility_text = f"Infeasible (Max {max_flights})"
-                total_cost = float('nan') # Use NaN for infeasible total cost
-
-            results.append({
-                "Model": model,
-                "Flights": flights_needed,
-                "PerFlight": f"{pf_cost:.2f}",
-                "TotalCost": f"{total_cost:.2f}" if feasible else "-",
-                "Feasibility": feasibility_text
-            })
-
-        # --- New: Print Table ---
-        print("-" * 85)
-        # Print Header
-        print(f"{header[0]:<15} | {header[1]:^15} | {header[2]:^20} | {header[3]:^15} | {header[4]:<15}")
-        print("-" * 85)
-
-        # Print Rows
-        for row in results:
-            print(f"{row['Model']:<15} | {row['Flights']:^15} | {row['PerFlight']:>20} | {row['TotalCost']:>15} | {row['Feasibility']:<15}")
-
-        print("-" * 85)
-
-        # Print Best Model Summary
-        if best_model is not None:
-            print(f"**Best Aircraft: {best_model}** with Total Cost **${best_total:.2f}**")
-        else:
-            print("No feasible aircraft for this scenario.")
-
-
     # Scenario 1
     evaluate_scenario(
         "Scenario 1",
         passengers=3300,
         max_flights=13,
         time_cost_level="medium",
-        fuel_cost_per_kg=0.85
+        fuel_cost_per_kg=0.85,
+        Tbest=Tbest
     )
 
     # Scenario 2 (max_flights changed from 7 to 8)
@@ -386,7 +425,8 @@ def main():
         passengers=1500,
         max_flights=8,
         time_cost_level="high",
-        fuel_cost_per_kg=0.96
+        fuel_cost_per_kg=0.96,
+        Tbest=Tbest
     )
 
     # Scenario 3
@@ -395,7 +435,8 @@ def main():
         passengers=2250,
         max_flights=25,
         time_cost_level="low",
-        fuel_cost_per_kg=0.78
+        fuel_cost_per_kg=0.78,
+        Tbest=Tbest
     )
     # ==== End added lines ====
 
@@ -1,11 +1,28 @@
+import copy
+import logging
 import math
+import time
+from concurrent.futures import ProcessPoolExecutor
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 import io
 
+from batch_planning import plan_many
+from cost_raster import CostRaster
+from grid_search import calc_cost_field, flatten_obstacle_map, search
+from heuristics import make_heuristic
+from landmarks import get_landmark_table
+from obstacle_map import (DistanceField, Segment, calc_obstacle_extent,
+                          obstacle_cache)
+from planner_stats import PlannerStats
+from shared_arrays import SharedArrays
+
 # Keep the original show_animation setting
 show_animation = True
 
+logger = logging.getLogger(__name__)
+
 
 class AStarPlanner:
     """
@@ -16,16 +33,30 @@ class AStarPlanner:
 
     def __init__(self, ox, oy, resolution, rr, fc_x, fc_y, tc_x, tc_y,
                  rc_x=None, rc_y=None, jet_vx=1.0, jet_vy=1.0,
-                 J_max_discount=0.5, J_counter_penalty=0.0):
+                 J_max_discount=0.5, J_counter_penalty=0.0, primitives=()):
 
         self.resolution = resolution
         self.rr = rr
         self.min_x, self.min_y = 0, 0
         self.max_x, self.max_y = 0, 0
         self.obstacle_map = None
+        self.distance_field = None
+        self.cost_raster = None
         self.x_width, self.y_width = 0, 0
         self.motion = self.get_motion_model()
-        self.calc_obstacle_map(ox, oy)
+        self.setup_stats = PlannerStats()
+        self.stats = None
+        self.heuristic = None
+        self.jump_points = False
+        self.bidirectional = False
+        # Heuristic weights of the anytime search, e.g. (3.0, 2.0, 1.0), and
+        # the seconds it may run; see grid_search.anytime_search
+        self.anytime_weights = None
+        self.deadline = None
+        self.solutions = []
+        self.path_cost = None
+        self.sweep_stats = None
+        self.calc_obstacle_map(ox, oy, primitives)
 
         # Use sets for faster 'in' checks for cost zones
         self.fc_x = set(fc_x) # Fuel consumption cost zone X
@@ -47,6 +78,7 @@ class AStarPlanner:
         self.Delta_C1 = 0.3 # Time cost zone multiplier
         self.Delta_C2 = 0.15 # Fuel cost zone multiplier
         self.costPerGrid = 1 # Base cost per step
+        self.calc_cost_raster()
 
     class Node:
         def __init__(self, x, y, cost, parent_index):
@@ -58,107 +90,255 @@ class AStarPlanner:
         def __str__(self):
             return f"{self.x},{self.y},{self.cost},{self.parent_index}"
 
-    def planning(self, sx, sy, gx, gy):
+    def planning(self, sx, sy, gx, gy, trace=None):
+        self.stats = stats = PlannerStats(runs=1)
 
         start_node = self.Node(self.calc_xy_index(sx, self.min_x),
                                self.calc_xy_index(sy, self.min_y), 0.0, -1)
         goal_node = self.Node(self.calc_xy_index(gx, self.min_x),
                               self.calc_xy_index(gy, self.min_y), 0.0, -1)
 
-        open_set, closed_set = dict(), dict()
-        open_set[self.calc_grid_index(start_node)] = start_node
-
-        while len(open_set) > 0:
-            
-            # Get the node with the lowest f = g + h score
-            c_id = min(
-                open_set,
-                key=lambda o: open_set[o].cost + self.calc_heuristic(open_set[o], goal_node))
-            current = open_set[c_id]
-
-            # Reached goal
-            if current.x == goal_node.x and current.y == goal_node.y:
-                goal_node.parent_index = current.parent_index
-                goal_node.cost = current.cost
-                break
-
-            del open_set[c_id]
-            closed_set[c_id] = current
-
-            # Explore neighbor nodes
-            for i, _ in enumerate(self.motion):
-                node = self.Node(current.x + self.motion[i][0],
-                                 current.y + self.motion[i][1],
-                                 current.cost + self.motion[i][2] * self.costPerGrid, c_id)
-
-                # --- Cost calculation logic with variable zones ---
-                gx_pos = self.calc_grid_position(node.x, self.min_x)
-                gy_pos = self.calc_grid_position(node.y, self.min_y)
-                step_cost = self.motion[i][2] * self.costPerGrid
-
-                # 1. High-Cost Area Checks (Penalties)
-                if gx_pos in self.tc_x and gy_pos in self.tc_y:
-                    node.cost += self.Delta_C1 * step_cost
-
-                if gx_pos in self.fc_x and gy_pos in self.fc_y:
-                    node.cost += self.Delta_C2 * step_cost
-
-                # 2. Jet Stream Reward Zone Check (Discount)
-                if gx_pos in self.rc_x and gy_pos in self.rc_y:
-                    # motion direction vector (normalized)
-                    mvx, mvy = float(self.motion[i][0]), float(self.motion[i][1])
-                    mv_norm = math.hypot(mvx, mvy)
-                    
-                    # jet flow vector (normalized)
-                    jvx, jvy = float(self.jet_vx), float(self.jet_vy)
-                    jv_norm = math.hypot(jvx, jvy)
-
-                    if mv_norm > 0 and jv_norm > 0:
-                        # Cosine of angle: 1 for perfect alignment, -1 for counter-flow
-                        cos_align = (mvx * jvx + mvy * jvy) / (mv_norm * jv_norm)
-
-                        # align_pos: Max discount for alignment (cos_align=1)
-                        align_pos = max(0.0, cos_align) 
-                        # align_neg: Max penalty for counter-flow (cos_align=-1)
-                        align_neg = max(0.0, -cos_align) 
-
-                        # Apply discount for aligned motion (max J_max_discount)
-                        node.cost -= align_pos * self.J_max_discount * step_cost
-                        
-                        # Apply penalty for counter-flow motion (J_counter_penalty)
-                        node.cost += align_neg * self.J_counter_penalty * step_cost
-
-                n_id = self.calc_grid_index(node)
-
-                if not self.verify_node(node):
-                    continue
-
-                if n_id in closed_set:
-                    continue
-
-                if n_id not in open_set:
-                    open_set[n_id] = node
-                else:
-                    if open_set[n_id].cost > node.cost:
-                        open_set[n_id] = node
-        
-        if len(open_set) == 0 and not (current.x == goal_node.x and current.y == goal_node.y):
-             # Path not found
-             return [], [], float('inf')
-
-
-        rx, ry = self.calc_final_path(goal_node, closed_set)
+        with stats.timer("zone_compile"):
+            step_costs = self.cost_raster.get_step_costs()
+            landmarks = (get_landmark_table(self.obstacle_map, self.motion,
+                                            self.cost_raster)
+                         if self.heuristic == "alt" else None)
+            calc_heuristic = make_heuristic(
+                self.heuristic, (goal_node.x, goal_node.y), self.motion,
+                self.cost_raster, landmarks=landmarks)
+            reverse = None
+            if self.bidirectional:
+                reverse = (self.cost_raster.get_reverse_step_costs(),
+                           make_heuristic(self.heuristic,
+                                          (start_node.x, start_node.y),
+                                          self.motion, self.cost_raster,
+                                          reverse=True, landmarks=landmarks))
+            jump_stops = (self.cost_raster.get_jump_stops()
+                          if self.jump_points else None)
+            anytime = None
+            if self.anytime_weights is not None:
+                self.solutions = []
+                anytime = (self.anytime_weights,
+                           None if self.deadline is None
+                           else time.perf_counter() + self.deadline,
+                           self.add_solution)
+        with stats.timer("search"):
+            state, goal_id = search(
+                flatten_obstacle_map(self.obstacle_map), self.x_width,
+                self.y_width, self.motion, (start_node.x, start_node.y),
+                (goal_node.x, goal_node.y), step_costs,
+                calc_heuristic, trace=trace, jump_stops=jump_stops,
+                reverse=reverse, anytime=anytime)
+        stats.add_search(state)
+
+        self.path_cost = math.inf
+        if goal_id == -1:
+            # Path not found
+            return [], [], float('inf')
+
+        goal_node.parent_index = state.parent[goal_id]
+        goal_node.cost = state.cost[goal_id]
+        self.path_cost = goal_node.cost
+        with stats.timer("path"):
+            rx, ry = self.calc_final_path(goal_node, state)
+        logger.debug("Planner stats: %s", stats)
         return rx, ry, goal_node.cost
 
-    def calc_final_path(self, goal_node, closed_set):
+    def plan_many(self, queries, workers=None):
+        """
+        Plan many (start, goal) or (start, goal, overrides) queries, over a
+        process pool with workers > 1, yielding (i, rx, ry, cost, stats) as
+        each query is planned; see batch_planning.plan_many.
+        """
+        return plan_many(self, queries, workers)
+
+    def calc_cost_raster(self):
+        with self.setup_stats.timer("zone_compile"):
+            self.cost_raster = CostRaster(self.min_x, self.min_y,
+                                          self.x_width, self.y_width,
+                                          self.resolution, self.motion,
+                                          self.costPerGrid)
+            self.cost_raster.add_zone(self.tc_x, self.tc_y, self.Delta_C1)
+            self.cost_raster.add_zone(self.fc_x, self.fc_y, self.Delta_C2)
+            self.cost_raster.set_jet(self.rc_x, self.rc_y,
+                                     self.jet_vx, self.jet_vy,
+                                     self.J_max_discount,
+                                     self.J_counter_penalty)
+
+    def set_jet_stream(self, rc_x, rc_y, J_max_discount=None):
+        # Only the jet overlay of the cost raster depends on the reward zone
+        self.rc_x = set(rc_x)
+        self.rc_y = set(rc_y)
+        if J_max_discount is not None:
+            self.J_max_discount = J_max_discount
+        with self.setup_stats.timer("zone_compile"):
+            self.cost_raster.set_jet(self.rc_x, self.rc_y,
+                                     self.jet_vx, self.jet_vy,
+                                     self.J_max_discount,
+                                     self.J_counter_penalty)
+
+    def plan_jet_band(self, sx, sy, gx, gy, placement, band):
+        self.set_jet_stream(*band)
+        rx, ry, cost = self.planning(sx, sy, gx, gy)
+        return placement, cost, (rx, ry)
+
+    def sweep_jet_stream(self, sx, sy, gx, gy, bands, workers=1):
+        """
+        Plan once per jet stream placement on this planner's obstacle map and
+        base cost raster, swapping only the jet overlay between runs.
+
+        bands maps each placement to its (rc_x, rc_y) zone, or to
+        (rc_x, rc_y, J_max_discount) to sweep discount strengths too.
+        With workers > 1 the placements are spread over a process pool and
+        the obstacle map and zone multipliers reach the workers once through
+        shared memory. Either way the result is a list of
+        (placement, cost, (rx, ry)) in the order of bands, for
+        select_jet_band() to pick from. The stats of all runs add up in
+        self.sweep_stats.
+        """
+        if workers <= 1:
+            rows, run_stats = [], []
+            for placement, band in bands.items():
+                rows.append(self.plan_jet_band(sx, sy, gx, gy, placement,
+                                               band))
+                run_stats.append(self.stats)
+            self.sweep_stats = sum(run_stats, PlannerStats())
+            return rows
+
+        # The workers get a copy of the planner without the arrays; those
+        # are attached from shared memory in _init_sweep_worker.
+        planner = copy.copy(self)
+        planner.obstacle_map = None
+        planner.distance_field = None
+        planner.cost_raster = copy.copy(self.cost_raster)
+        planner.cost_raster.multiplier = None
+        planner.cost_raster.clear_jet()
+
+        tasks = [(sx, sy, gx, gy, placement, band)
+                 for placement, band in bands.items()]
+        chunksize = max(1, len(tasks) // (workers * 4))
+        with SharedArrays({"obstacle_map": self.obstacle_map,
+                           "multiplier": self.cost_raster.multiplier}) as shared:
+            with ProcessPoolExecutor(
+                    workers, initializer=_init_sweep_worker,
+                    initargs=(planner, shared.specs)) as executor:
+                results = list(executor.map(_plan_sweep_task, tasks,
+                                            chunksize=chunksize))
+        self.sweep_stats = sum((stats for _, stats in results), PlannerStats())
+        return [row for row, _ in results]
+
+    def optimise_jet_stream(self, sx, sy, gx, gy, bands):
+        """
+        Cheapest placement of bands, as select_jet_band() would pick from
+        the rows of sweep_jet_stream(), running full searches only for bands
+        whose lower bound can still come within the tolerance of the
+        cheapest.
+
+        The route planned without a jet (cost C0) prices every band cheaply:
+        replaying it under the band gives an upper bound, and the lower bound
+        is the smaller of C0 (paths that avoid the band) and
+        calc_band_lower_bound() (paths through it). A band whose bound
+        reaches its upper bound is settled by the jet-free route without a
+        search, which covers most bands that route never crosses.
+
+        Returns ((placement, cost, (rx, ry)), n_searches); the stats of the
+        searches add up in self.sweep_stats.
+        """
+        self.cost_raster.clear_jet()
+        rx, ry, base_cost = self.planning(sx, sy, gx, gy)
+        n_searches = 1
+        run_stats = [self.stats]
+        if base_cost == float('inf'):
+            # A jet stream changes costs, never which cells are reachable
+            self.sweep_stats = self.stats
+            return (None, base_cost, ([], [])), n_searches
+
+        blocked = flatten_obstacle_map(self.obstacle_map)
+        start = (self.calc_xy_index(sx, self.min_x),
+                 self.calc_xy_index(sy, self.min_y))
+        goal = (self.calc_xy_index(gx, self.min_x),
+                self.calc_xy_index(gy, self.min_y))
+        from_start = self.calc_cost_grid(calc_cost_field(
+            blocked, self.x_width, self.y_width, self.motion, start,
+            self.cost_raster.get_step_costs()))
+        to_goal = self.calc_cost_grid(calc_cost_field(
+            blocked, self.x_width, self.y_width, self.motion, goal,
+            self.cost_raster.get_reverse_step_costs()))
+        max_step = np.max([self.cost_raster.calc_step_cost_grid(i)
+                           for i in range(len(self.motion))], axis=0)
+        reachable = np.isfinite(from_start) & np.isfinite(to_goal)
+
+        # Steps of the jet-free route as (motion, cell), start to goal
+        motion_index = {(dx, dy): i for i, (dx, dy, _) in enumerate(self.motion)}
+        route = [(self.calc_xy_index(x, self.min_x),
+                  self.calc_xy_index(y, self.min_y))
+                 for x, y in zip(reversed(rx), reversed(ry))]
+        route_steps = [(motion_index[(x2 - x1, y2 - y1)],
+                        y2 * self.x_width + x2)
+                       for (x1, y1), (x2, y2) in zip(route, route[1:])]
+
+        # Bounds and searches agree only up to rounding; a band is settled
+        # or pruned only past this margin, no narrower than the tie
+        # tolerance of select_jet_band
+        eps = COST_RTOL * base_cost
+        candidates = []
+        rows = []
+        best_cost = base_cost
+        for order, (placement, band) in enumerate(bands.items()):
+            self.set_jet_stream(*band)
+            step_costs = self.cost_raster.get_step_costs()
+            upper = 0.0
+            for i, n_id in route_steps:
+                upper = upper + step_costs[i][n_id]
+
+            discount = self.J_max_discount
+            inside = self.cost_raster.calc_zone_mask(self.rc_x, self.rc_y) \
+                & reachable
+            lower = min(base_cost, calc_band_lower_bound(
+                inside, from_start, to_goal, max_step, discount,
+                self.costPerGrid))
+
+            best_cost = min(best_cost, upper)
+            if lower < upper - eps:
+                candidates.append((lower, order, placement, band))
+            else:
+                rows.append((order, (placement, upper, (rx, ry))))
+
+        # A band whose lower bound is more than the margin above a cost
+        # already found can neither be the cheapest nor tie with it
+        for lower, order, placement, band in sorted(candidates,
+                                                    key=lambda c: c[:2]):
+            if lower - eps > best_cost:
+                break
+            row = self.plan_jet_band(sx, sy, gx, gy, placement, band)
+            n_searches += 1
+            run_stats.append(self.stats)
+            rows.append((order, row))
+            best_cost = min(best_cost, row[1])
+
+        self.sweep_stats = sum(run_stats, PlannerStats())
+        rows.sort(key=lambda row: row[0])
+        return select_jet_band([row for _, row in rows]), n_searches
+
+    def calc_cost_grid(self, cost_field):
+        # cost_field[iy * x_width + ix] as cost_grid[ix][iy]
+        return np.asarray(cost_field).reshape(self.y_width, self.x_width).T
+
+    def add_solution(self, cost, bound):
+        logger.info("Anytime path cost %s, at most %.3f times optimal",
+                    cost, bound)
+        self.solutions.append((cost, bound))
+
+    def calc_final_path(self, goal_node, state):
         rx, ry = [self.calc_grid_position(goal_node.x, self.min_x)], [
             self.calc_grid_position(goal_node.y, self.min_y)]
         parent_index = goal_node.parent_index
         while parent_index != -1:
-            n = closed_set[parent_index]
-            rx.append(self.calc_grid_position(n.x, self.min_x))
-            ry.append(self.calc_grid_position(n.y, self.min_y))
-            parent_index = n.parent_index
+            rx.append(self.calc_grid_position(parent_index % self.x_width,
+                                              self.min_x))
+            ry.append(self.calc_grid_position(parent_index // self.x_width,
+                                              self.min_y))
+            parent_index = state.parent[parent_index]
 
         return rx, ry
 
@@ -177,7 +357,7 @@ class AStarPlanner:
         return round((position - min_pos) / self.resolution)
 
     def calc_grid_index(self, node):
-        return (node.y - self.min_y) * self.x_width + (node.x - self.min_x)
+        return node.y * self.x_width + node.x
 
     def verify_node(self, node):
         px = self.calc_grid_position(node.x, self.min_x)
@@ -197,33 +377,36 @@ class AStarPlanner:
 
         return True
 
-    def calc_obstacle_map(self, ox, oy):
-
-        self.min_x = round(min(ox))
-        self.min_y = round(min(oy))
-        self.max_x = round(max(ox))
-        self.max_y = round(max(oy))
-
-        self.x_width = round((self.max_x - self.min_x) / self.resolution)
-        self.y_width = round((self.max_y - self.min_y) / self.resolution)
-        
-        # Ensure x_width and y_width are at least 1 for map creation
-        if self.x_width <= 0: self.x_width = 1
-        if self.y_width <= 0: self.y_width = 1
-
-        self.obstacle_map = [[False for _ in range(self.y_width)]
-                             for _ in range(self.x_width)]
+    def calc_obstacle_map(self, ox, oy, primitives=()):
+        with self.setup_stats.timer("map_build"):
+            min_x, min_y, max_x, max_y = calc_obstacle_extent(ox, oy,
+                                                              primitives)
+            self.min_x = round(min_x)
+            self.min_y = round(min_y)
+            self.max_x = round(max_x)
+            self.max_y = round(max_y)
+
+            self.x_width = round((self.max_x - self.min_x) / self.resolution)
+            self.y_width = round((self.max_y - self.min_y) / self.resolution)
         
-        # Populate obstacle map based on radius
-        for ix in range(self.x_width):
-            x = self.calc_grid_position(ix, self.min_x)
-            for iy in range(self.y_width):
-                y = self.calc_grid_position(iy, self.min_y)
-                for iox, ioy in zip(ox, oy):
-                    d = math.hypot(iox - x, ioy - y)
-                    if d <= self.rr:
-                        self.obstacle_map[ix][iy] = True
-                        break
+            # Ensure x_width and y_width are at least 1 for map creation
+            if self.x_width <= 0: self.x_width = 1
+            if self.y_width <= 0: self.y_width = 1
+
+            self.distance_field = DistanceField(
+                ox, oy, self.min_x, self.min_y, self.x_width, self.y_width,
+                self.resolution, self.rr, primitives)
+            self.obstacle_map = obstacle_cache.load_or_build(
+                ox, oy, self.resolution, self.rr,
+                (self.min_x, self.min_y, self.max_x, self.max_y,
+                 self.x_width, self.y_width),
+                lambda: self.distance_field.threshold(self.rr),
+                primitives)
+
+    def set_robot_radius(self, rr):
+        with self.setup_stats.timer("map_build"):
+            self.rr = rr
+            self.obstacle_map = self.distance_field.threshold(rr)
 
     @staticmethod
     def get_motion_model():
@@ -241,6 +424,85 @@ class AStarPlanner:
 
 # --- COST ANALYSIS SECTION ---
 
+# Relative difference below which two placements cost the same, see
+# select_jet_band
+COST_RTOL = 1e-9
+
+# Per-process planner of a parallel sweep, see sweep_jet_stream
+_sweep_planner = None
+_sweep_blocks = None
+
+
+def _init_sweep_worker(planner, specs):
+    global _sweep_planner, _sweep_blocks
+    arrays, _sweep_blocks = SharedArrays.attach(specs)
+    planner.obstacle_map = arrays["obstacle_map"]
+    planner.cost_raster.multiplier = arrays["multiplier"]
+    _sweep_planner = planner
+
+
+def _plan_sweep_task(task):
+    row = _sweep_planner.plan_jet_band(*task)
+    return row, _sweep_planner.stats
+
+
+def select_jet_band(rows, rtol=COST_RTOL):
+    """
+    The row of rows, (placement, cost, (rx, ry)) in the order of bands,
+    with the cheapest cost, ties going to the earliest band (the lowest
+    y_start in main()). Costs within rtol of the cheapest tie: the same
+    route costs a few ulps more or less depending on the order its steps
+    are summed in, which would otherwise decide between equal placements.
+    """
+    best_cost = min(cost for _, cost, _ in rows)
+    for row in rows:
+        if row[1] <= best_cost + rtol * abs(best_cost):
+            return row
+
+
+def calc_band_lower_bound(inside, from_start, to_goal, max_step, discount,
+                          cost_per_grid=1.0, max_pairs=1 << 20):
+    """
+    Lower bound on the cost of any path that enters the jet band.
+
+    With g and h the jet-free cost from the start and to the goal, s the
+    dearest step into a cell and J the discount, a path entering the band
+    at a and last leaving it at b costs at least
+    g(a) - J * s(a) + (1 - J) * d(a, b) + h(b), where the jet-free cost
+    d(a, b) of the stretch between them is at least g(b) - g(a),
+    h(a) - h(b) and the octile distance. Bands with more than max_pairs
+    (a, b) pairs fall back to d(a, b) >= g(b) - g(a), which separates.
+    """
+    if not inside.any():
+        return math.inf
+    ix, iy = np.nonzero(inside)
+    g, h, s = from_start[inside], to_goal[inside], max_step[inside]
+    if len(g) ** 2 > max_pairs:
+        return discount * np.min(g - s) + np.min((1.0 - discount) * g + h)
+
+    dx = np.abs(ix[:, None] - ix[None, :])
+    dy = np.abs(iy[:, None] - iy[None, :])
+    octile = (np.maximum(dx, dy)
+              + (math.sqrt(2) - 1) * np.minimum(dx, dy)) * cost_per_grid
+    stretch = np.maximum(np.maximum(g[None, :] - g[:, None],
+                                    h[:, None] - h[None, :]), octile)
+    return np.min(g[:, None] - discount * s[:, None]
+                  + (1.0 - discount) * stretch + h[None, :])
+
+
+def calc_jet_band(y_start, height=5, x_min=-10, x_max=60):
+    """
+    Jet stream zone spanning the map laterally (x_min to x_max) and height
+    units vertically from y_start.
+    """
+    rc_x, rc_y = [], []
+    for i in range(x_min, x_max + 1):
+        # e.g., range(10, 15) gives 10, 11, 12, 13, 14 (5 points)
+        for j in range(y_start, y_start + height):
+            rc_x.append(i); rc_y.append(j)
+    return rc_x, rc_y
+
+
 def perform_cost_analysis(trip_time):
     """
     Performs cost analysis for different aircraft based on the optimal trip time.
@@ -347,6 +609,7 @@ A350-900,90,350,20,27,34,2500
 
 
 def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     print("Starting A* optimization for optimal jet stream placement...")
 
     # --- SETUP MAP AND BOUNDARIES ---
@@ -365,18 +628,9 @@ def main():
         ox.append(-10.0); oy.append(i)# Left wall
     
     # Complex Obstacles
-    start_x, start_y = 20, 0; end_x, end_y = 25, 20; steps = 425
-    for i in range(steps + 1):
-        t = i / steps; x = start_x + t * (end_x - start_x); y = start_y + t * (end_y - start_y)
-        ox.append(x); oy.append(y)
-    start_x, start_y = 10, 55; end_x, end_y = 25, 45; steps = 325
-    for i in range(steps + 1):
-        t = i / steps; x = start_x + t * (end_x - start_x); y = start_y + t * (end_y - start_y)
-        ox.append(x); oy.append(y)
-    start_x, start_y = 30, 0; end_x, end_y = 45, 10; steps = 325
-    for i in range(steps + 1):
-        t = i / steps; x = start_x + t * (end_x - start_x); y = start_y + t * (end_y - start_y)
-        ox.append(x); oy.append(y)
+    primitives = [Segment(20, 0, 25, 20),
+                  Segment(10, 55, 25, 45),
+                  Segment(30, 0, 45, 10)]
 
     # Time-related Cost Zone (tc_x, tc_y)
     tc_x, tc_y = [], []
@@ -391,57 +645,40 @@ def main():
             fc_x.append(i); fc_y.append(j)
 
     # --- TASK 2 OPTIMIZATION LOOP ---
-    best_time = float('inf')
-    best_y_start = -1
-    best_path_rx, best_path_ry = [], []
-    
     # CORRECTED: Loop through all possible vertical start positions for the 5-unit jet stream
     # The map goes from y=-10 to y=60. 
     # If y_start is 56, the range is 56, 57, 58, 59, 60 (5 units, up to the max boundary).
     # So we loop from -10 up to 57 (exclusive) to include 56 (inclusive).
-    for y_start in range(-10, 57, 1):
-        
-        # 1. Dynamically define the Jet Stream Area (rc_x, rc_y)
-        # Requirement: Span across the map laterally (x=-10 to x=60) and 5-unit length vertically
-        rc_x, rc_y = [], []
-        # X range from -10 to 60 (full lateral span)
-        for i in range(-10, 61): 
-            # Y range from y_start (inclusive) to y_start + 5 (exclusive) = 5 units total
-            # e.g., range(10, 15) gives 10, 11, 12, 13, 14 (5 points)
-            for j in range(y_start, y_start + 5): 
-                rc_x.append(i); rc_y.append(j)
-        
-        # 2. Configure the A* Planner
-        # J_max_discount set to 0.05 (5% reduction as per task)
-        a_star = AStarPlanner(ox, oy, grid_size, robot_radius,
-                              fc_x, fc_y, tc_x, tc_y,
-                              rc_x, rc_y,
-                              jet_vx=1.0, jet_vy=1.0, # Jet stream direction (e.g., 45 degrees)
-                              J_max_discount=0.05,  
-                              J_counter_penalty=0.0) # No counter penalty specified
-        
-        # 3. Run the planner
-        rx, ry, current_time = a_star.planning(sx, sy, gx, gy)
-        
-        # 4. Check for the best result
-        if current_time < best_time:
-            best_time = current_time
-            best_y_start = y_start
-            best_path_rx = rx
-            best_path_ry = ry
+    # 1. Dynamically define the Jet Stream Areas (rc_x, rc_y)
+    # Requirement: Span across the map laterally (x=-10 to x=60) and 5-unit length vertically
+    bands = {y_start: calc_jet_band(y_start) for y_start in range(-10, 57, 1)}
+
+    # 2. Configure the A* Planner once; the obstacle map and the zone costs
+    # are shared by every placement, only the jet overlay changes
+    # J_max_discount set to 0.05 (5% reduction as per task)
+    a_star = AStarPlanner(ox, oy, grid_size, robot_radius,
+                          fc_x, fc_y, tc_x, tc_y,
+                          jet_vx=1.0, jet_vy=1.0, # Jet stream direction (e.g., 45 degrees)
+                          J_max_discount=0.05,  
+                          J_counter_penalty=0.0, # No counter penalty specified
+                          primitives=primitives)
+
+    # 3. Run the planner only for the placements that can still win
+    # (same result as checking every placement in turn)
+    best, n_searches = a_star.optimise_jet_stream(sx, sy, gx, gy, bands)
+    best_y_start, best_time, (best_path_rx, best_path_ry) = best
+    print(f"Full A* searches: {n_searches} for {len(bands)} placements")
+    logger.info("Sweep stats: %s", a_star.sweep_stats)
 
     # --- FINAL RESULTS AND ANALYSIS ---
     print("\n" + "#"*70)
     print("      TASK 2 OPTIMIZATION AND COST ANALYSIS COMPLETE")
     print("#"*70)
     
-    if best_y_start != -1:
+    if best_y_start is not None:
         # Redefine the optimal jet stream area for accurate plotting and reporting
         # This uses the best_y_start found in the loop
-        optimal_rc_x, optimal_rc_y = [], []
-        for i in range(-10, 61):
-            for j in range(best_y_start, best_y_start + 5):
-                optimal_rc_x.append(i); optimal_rc_y.append(j)
+        optimal_rc_x, optimal_rc_y = calc_jet_band(best_y_start)
 
         print(f"**OPTIMAL JET STREAM PLACEMENT FOUND**")
         print(f"Vertical start position (y-start): {best_y_start:.0f}")
@@ -455,6 +692,8 @@ def main():
         if show_animation:
             plt.figure(figsize=(10, 8))
             plt.plot(ox, oy, ".k", label="Obstacles")
+            for primitive in primitives:
+                plt.plot(*primitive.get_outline(), "-k")
             plt.plot(sx, sy, "og", markersize=8, label="Start (0, 0)")
             plt.plot(gx, gy, "xb", markersize=8, label="Goal (50, 50)")
             
@@ -1,24 +1,51 @@
+import logging
 import math
+import time
 
 import matplotlib.pyplot as plt
 
 import random 
 
+from batch_planning import plan_many
+from cost_raster import CostRaster
+from grid_search import flatten_obstacle_map, search
+from heuristics import make_heuristic
+from landmarks import get_landmark_table
+from live_animation import LiveAnimation
+from obstacle_map import DistanceField, calc_obstacle_extent, obstacle_cache
+from planner_stats import PlannerStats
+
 show_animation = True
+animation_fps = 30
+
+logger = logging.getLogger(__name__)
 
 
 class AStarPlanner:
 
-    def __init__(self, ox, oy, resolution, rr, fc_x, fc_y):
+    def __init__(self, ox, oy, resolution, rr, fc_x, fc_y, primitives=()):
         
         self.resolution = resolution 
         self.rr = rr
         self.min_x, self.min_y = 0, 0
         self.max_x, self.max_y = 0, 0
         self.obstacle_map = None
+        self.distance_field = None
+        self.cost_raster = None
+        self.animation = None
         self.x_width, self.y_width = 0, 0
         self.motion = self.get_motion_model() 
-        self.calc_obstacle_map(ox, oy)
+        self.setup_stats = PlannerStats()
+        self.stats = None
+        self.heuristic = None
+        self.bidirectional = False
+        # Heuristic weights of the anytime search, e.g. (3.0, 2.0, 1.0), and
+        # the seconds it may run; see grid_search.anytime_search
+        self.anytime_weights = None
+        self.deadline = None
+        self.solutions = []
+        self.path_cost = None
+        self.calc_obstacle_map(ox, oy, primitives)
 
         self.fc_x = fc_x
         self.fc_y = fc_y
@@ -26,6 +53,7 @@ class AStarPlanner:
         self.Delta_C2 = 0.15
 
         self.costPerGrid = 1 
+        self.calc_cost_raster()
 
 
     class Node: 
@@ -39,112 +67,118 @@ class AStarPlanner:
             return str(self.x) + "," + str(self.y) + "," + str(
                 self.cost) + "," + str(self.parent_index)
 
-    def planning(self, sx, sy, gx, gy):
+    def planning(self, sx, sy, gx, gy, trace=None):
+        self.stats = stats = PlannerStats(runs=1)
+
         
         start_node = self.Node(self.calc_xy_index(sx, self.min_x), 
                                self.calc_xy_index(sy, self.min_y), 0.0, -1) 
         goal_node = self.Node(self.calc_xy_index(gx, self.min_x), 
                               self.calc_xy_index(gy, self.min_y), 0.0, -1)
 
-        open_set, closed_set = dict(), dict() 
-
-        open_set[self.calc_grid_index(start_node)] = start_node 
-
-        while 1:
-            if len(open_set) == 0:
-                print("Open set is empty..")
-                break
-
-            c_id = min(
-                open_set,
-                key=lambda o: open_set[o].cost + self.calc_heuristic(self, goal_node,
-                                                                     open_set[
-                                                                         o])) 
-            current = open_set[c_id]
-
-
-            if show_animation: 
-                plt.plot(self.calc_grid_position(current.x, self.min_x),
-                         self.calc_grid_position(current.y, self.min_y), "xc")
-               
-                plt.gcf().canvas.mpl_connect('key_release_event',
-                                             lambda event: [exit(
-                                                 0) if event.key == 'escape' else None])
-                if len(closed_set.keys()) % 10 == 0:
-                    plt.pause(0.001)
-
-          
-            if current.x == goal_node.x and current.y == goal_node.y:
-                print("Total Trip time required -> ",current.cost )
-                goal_node.parent_index = current.parent_index
-                goal_node.cost = current.cost
-                break
-
-            
-            del open_set[c_id]
-
-          
-            closed_set[c_id] = current
-
-           
-            for i, _ in enumerate(self.motion): 
-                node = self.Node(current.x + self.motion[i][0],
-                                 current.y + self.motion[i][1],
-                                 current.cost + self.motion[i][2] * self.costPerGrid, c_id)
-                
-               
-               
-                if self.calc_grid_position(node.x, self.min_x) in self.fc_x:
-                    if self.calc_grid_position(node.y, self.min_y) in self.fc_y:
-                        
-                        node.cost = node.cost + self.Delta_C2 * self.motion[i][2]
-                   
-                
-                n_id = self.calc_grid_index(node)
-
-                
-                if not self.verify_node(node):
-                    continue
-
-                if n_id in closed_set:
-                    continue
-
-                if n_id not in open_set:
-                    open_set[n_id] = node  # discovered a new node
-                else:
-                    if open_set[n_id].cost > node.cost:
-                        # This path is the best until now. record it
-                        open_set[n_id] = node
-
-        rx, ry = self.calc_final_path(goal_node, closed_set)
+        if show_animation:
+            self.animation = LiveAnimation("xc", animation_fps)
+
+        with stats.timer("zone_compile"):
+            step_costs = self.cost_raster.get_step_costs()
+            landmarks = (get_landmark_table(self.obstacle_map, self.motion,
+                                            self.cost_raster)
+                         if self.heuristic == "alt" else None)
+            calc_heuristic = make_heuristic(
+                self.heuristic, (goal_node.x, goal_node.y), self.motion,
+                self.cost_raster, landmarks=landmarks)
+            reverse = None
+            if self.bidirectional:
+                reverse = (self.cost_raster.get_reverse_step_costs(),
+                           make_heuristic(self.heuristic,
+                                          (start_node.x, start_node.y),
+                                          self.motion, self.cost_raster,
+                                          reverse=True, landmarks=landmarks))
+            anytime = None
+            if self.anytime_weights is not None:
+                self.solutions = []
+                anytime = (self.anytime_weights,
+                           None if self.deadline is None
+                           else time.perf_counter() + self.deadline,
+                           self.add_solution)
+        with stats.timer("search"):
+            state, goal_id = search(
+                flatten_obstacle_map(self.obstacle_map), self.x_width,
+                self.y_width, self.motion, (start_node.x, start_node.y),
+                (goal_node.x, goal_node.y), step_costs,
+                calc_heuristic,
+                self.plot_expansion if show_animation else None, trace,
+                reverse=reverse, anytime=anytime)
+        stats.add_search(state)
+        if show_animation:
+            self.animation.finish()
+
+        self.path_cost = math.inf
+        if goal_id == -1:
+            logger.warning("Open set is empty..")
+        else:
+            goal_node.parent_index = state.parent[goal_id]
+            goal_node.cost = state.cost[goal_id]
+            logger.info("Total Trip time required -> %s", goal_node.cost)
+            self.path_cost = goal_node.cost
+
+        with stats.timer("path"):
+            rx, ry = self.calc_final_path(goal_node, state)
+        logger.debug("Planner stats: %s", stats)
         
 
         return rx, ry
 
-    def calc_final_path(self, goal_node, closed_set):
+    def plan_many(self, queries, workers=None):
+        """
+        Plan many (start, goal) or (start, goal, overrides) queries, over a
+        process pool with workers > 1, yielding (i, rx, ry, cost, stats) as
+        each query is planned; see batch_planning.plan_many.
+        """
+        return plan_many(self, queries, workers)
+
+    def calc_cost_raster(self):
+        with self.setup_stats.timer("zone_compile"):
+            self.cost_raster = CostRaster(self.min_x, self.min_y,
+                                          self.x_width, self.y_width,
+                                          self.resolution, self.motion,
+                                          self.costPerGrid)
+            self.cost_raster.add_zone(self.fc_x, self.fc_y, self.Delta_C2,
+                                      per_grid=False)
+
+    def plot_expansion(self, ix, iy, n_closed):
+        self.animation.add(self.calc_grid_position(ix, self.min_x),
+                           self.calc_grid_position(iy, self.min_y))
+
+    def add_solution(self, cost, bound):
+        logger.info("Anytime path cost %s, at most %.3f times optimal",
+                    cost, bound)
+        self.solutions.append((cost, bound))
+
+    def calc_final_path(self, goal_node, state):
         
         rx, ry = [self.calc_grid_position(goal_node.x, self.min_x)], [
             self.calc_grid_position(goal_node.y, self.min_y)] 
         parent_index = goal_node.parent_index
         while parent_index != -1:
-            n = closed_set[parent_index]
-            rx.append(self.calc_grid_position(n.x, self.min_x))
-            ry.append(self.calc_grid_position(n.y, self.min_y))
-            parent_index = n.parent_index
+            rx.append(self.calc_grid_position(parent_index % self.x_width,
+                                              self.min_x))
+            ry.append(self.calc_grid_position(parent_index // self.x_width,
+                                              self.min_y))
+            parent_index = state.parent[parent_index]
 
         return rx, ry
 
-    @staticmethod
     def calc_heuristic(self, n1, n2):
         w = 1.0  
         d = w * math.hypot(n1.x - n2.x, n1.y - n2.y)
         d = d * self.costPerGrid
         return d
     
-    def calc_heuristic_maldis(n1, n2):
+    def calc_heuristic_maldis(self, n1, n2):
         w = 1.0  # weight of heuristic
-        dx = w * math.abs(n1.x - n2.x)
-        dy = w *math.abs(n1.y - n2.y)
+        dx = w * abs(n1.x - n2.x)
+        dy = w * abs(n1.y - n2.y)
         return dx + dy
 
     def calc_grid_position(self, index, min_position):
@@ -162,7 +196,7 @@ class AStarPlanner:
         return round((position - min_pos) / self.resolution)
 
     def calc_grid_index(self, node):
-        return (node.y - self.min_y) * self.x_width + (node.x - self.min_x) 
+        return node.y * self.x_width + node.x
 
     def verify_node(self, node):
         px = self.calc_grid_position(node.x, self.min_x)
@@ -183,34 +217,39 @@ class AStarPlanner:
 
         return True
 
-    def calc_obstacle_map(self, ox, oy):
-
-        self.min_x = round(min(ox))
-        self.min_y = round(min(oy))
-        self.max_x = round(max(ox))
-        self.max_y = round(max(oy))
-        print("min_x:", self.min_x)
-        print("min_y:", self.min_y)
-        print("max_x:", self.max_x)
-        print("max_y:", self.max_y)
-
-        self.x_width = round((self.max_x - self.min_x) / self.resolution)
-        self.y_width = round((self.max_y - self.min_y) / self.resolution)
-        print("x_width:", self.x_width)
-        print("y_width:", self.y_width)
-
-        # obstacle map generation
-        self.obstacle_map = [[False for _ in range(self.y_width)]
-                             for _ in range(self.x_width)] 
-        for ix in range(self.x_width):
-            x = self.calc_grid_position(ix, self.min_x) 
-            for iy in range(self.y_width):
-                y = self.calc_grid_position(iy, self.min_y)
-                for iox, ioy in zip(ox, oy): 
-                    d = math.hypot(iox - x, ioy - y)
-                    if d <= self.rr:
-                        self.obstacle_map[ix][iy] = True 
-                        break
+    def calc_obstacle_map(self, ox, oy, primitives=()):
+        with self.setup_stats.timer("map_build"):
+            min_x, min_y, max_x, max_y = calc_obstacle_extent(ox, oy,
+                                                              primitives)
+            self.min_x = round(min_x)
+            self.min_y = round(min_y)
+            self.max_x = round(max_x)
+            self.max_y = round(max_y)
+            logger.debug("min_x: %s", self.min_x)
+            logger.debug("min_y: %s", self.min_y)
+            logger.debug("max_x: %s", self.max_x)
+            logger.debug("max_y: %s", self.max_y)
+
+            self.x_width = round((self.max_x - self.min_x) / self.resolution)
+            self.y_width = round((self.max_y - self.min_y) / self.resolution)
+            logger.debug("x_width: %s", self.x_width)
+            logger.debug("y_width: %s", self.y_width)
+
+            # obstacle map generation
+            self.distance_field = DistanceField(
+                ox, oy, self.min_x, self.min_y, self.x_width, self.y_width,
+                self.resolution, self.rr, primitives)
+            self.obstacle_map = obstacle_cache.load_or_build(
+                ox, oy, self.resolution, self.rr,
+                (self.min_x, self.min_y, self.max_x, self.max_y,
+                 self.x_width, self.y_width),
+                lambda: self.distance_field.threshold(self.rr),
+                primitives)
+
+    def set_robot_radius(self, rr):
+        with self.setup_stats.timer("map_build"):
+            self.rr = rr
+            self.obstacle_map = self.distance_field.threshold(rr)
 
     @staticmethod
     def get_motion_model(): 
@@ -224,6 +263,7 @@ class AStarPlanner:
 
 
 def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     print(__file__ + " start the A star algorithm demo !!") 
     grid_size = 1  
     robot_radius = 1.0  
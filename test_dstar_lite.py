@@ -0,0 +1,108 @@
+import math
+
+import numpy as np
+import pytest
+
+import task1
+from dstar_lite import DStarLitePlanner
+from grid_search import search
+from obstacle_map import obstacle_cache
+
+
+@pytest.fixture(autouse=True)
+def no_obstacle_cache(monkeypatch):
+    # Keep test runs from writing .obstacle_cache/ into the repo
+    monkeypatch.setattr(obstacle_cache, "enabled", False)
+
+
+def make_planner(rng, size):
+    planner = task1.AStarPlanner([0, size, 0, size], [0, 0, size, size],
+                                 1.0, 0.5, [], [], [], [])
+    planner.obstacle_map = (rng.random((planner.x_width, planner.y_width))
+                            < rng.uniform(0.05, 0.3))
+    planner.calc_cost_raster()
+    zone = rng.random((planner.x_width, planner.y_width)) < 0.2
+    planner.cost_raster.multiplier = (planner.cost_raster.multiplier
+                                      + zone * rng.uniform(0.1, 1.0))
+    planner.cost_raster.clear_cache()
+    return planner
+
+
+def random_cells(rng, x_width, y_width, high):
+    return [(float(rng.integers(x_width)), float(rng.integers(y_width)))
+            for _ in range(int(rng.integers(0, high)))]
+
+
+def check_replan(d_star, start, goal, rx, ry):
+    x_width, y_width = d_star.x_width, d_star.y_width
+    state, goal_id = search(bytes(d_star.blocked), x_width, y_width,
+                            d_star.planner.motion, start, goal,
+                            d_star.step_costs)
+    expected = state.cost[goal_id] if goal_id != -1 else math.inf
+    if expected == math.inf:
+        assert d_star.path_cost == math.inf
+        return
+    assert math.isclose(d_star.path_cost, expected, abs_tol=1e-7)
+
+    # The path itself must be free, join start to goal and cost as much
+    ids = [d_star.calc_index(x, y) for x, y in zip(rx, ry)][::-1]
+    assert ids[0] == start[1] * x_width + start[0]
+    assert ids[-1] == goal[1] * x_width + goal[0]
+    motion = {(dx, dy): i
+              for i, (dx, dy, _) in enumerate(d_star.planner.motion)}
+    cost = 0.0
+    for a, b in zip(ids, ids[1:]):
+        step = (b % x_width - a % x_width, b // x_width - a // x_width)
+        assert not d_star.blocked[b]
+        cost += d_star.step_costs[motion[step]][b]
+    assert math.isclose(cost, expected, abs_tol=1e-7)
+
+
+def test_replan_matches_fresh_search():
+    # Seeds 127 and 129 used to stop the search with a cell tied with the
+    # start left inconsistent, and 134 to walk round in circles after it
+    for seed in range(125, 140):
+        rng = np.random.default_rng(seed)
+        planner = make_planner(rng, int(rng.integers(20, 60)))
+        x_width, y_width = planner.x_width, planner.y_width
+        d_star = DStarLitePlanner(planner)
+
+        def random_free_cell():
+            while True:
+                c = (int(rng.integers(x_width)), int(rng.integers(y_width)))
+                if not d_star.blocked[c[1] * x_width + c[0]]:
+                    return c
+
+        start, goal = random_free_cell(), random_free_cell()
+        rx, ry = d_star.planning(*start, *goal)
+        path = [(int(x), int(y)) for x, y in zip(rx, ry)][::-1]
+        goal_id = goal[1] * x_width + goal[0]
+        for _ in range(12):
+            blocked = random_cells(rng, x_width, y_width, 15)
+            cleared = random_cells(rng, x_width, y_width, 8)
+            multipliers = {}
+            for c in random_cells(rng, x_width, y_width, 10):
+                multipliers[c] = float(rng.choice([1.0, 1.3, 1.6, 2.5, 0.9]))
+            blocked = [c for c in blocked
+                       if d_star.calc_index(*c) != goal_id]
+
+            # Move along the path, or jump elsewhere, and block cells next
+            # to the path as an agent discovering obstacles would
+            if rng.random() < 0.3:
+                start = random_free_cell()
+            elif len(path) > 3 and rng.random() < 0.8:
+                start = path[int(rng.integers(1, min(6, len(path) - 1)))]
+            for c in path[1:-1]:
+                if rng.random() < 0.15:
+                    n = (c[0] + int(rng.integers(-1, 2)),
+                         c[1] + int(rng.integers(-1, 2)))
+                    if (0 <= n[0] < x_width and 0 <= n[1] < y_width
+                            and n != goal and n != start):
+                        blocked.append((float(n[0]), float(n[1])))
+
+            rx, ry = d_star.replan(*start, blocked=blocked, cleared=cleared,
+                                   multipliers=multipliers)
+            path = [(int(x), int(y)) for x, y in zip(rx, ry)][::-1]
+            if d_star.blocked[start[1] * x_width + start[0]]:
+                continue
+            check_replan(d_star, start, goal, rx, ry)
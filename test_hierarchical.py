@@ -0,0 +1,72 @@
+import math
+
+import numpy as np
+import pytest
+
+import task1
+from grid_search import flatten_obstacle_map, search
+from hierarchical import ClusterCache, HierarchicalPlanner, calc_exits
+from obstacle_map import obstacle_cache
+
+
+@pytest.fixture(autouse=True)
+def no_obstacle_cache(monkeypatch):
+    # Keep test runs from writing .obstacle_cache/ into the repo
+    monkeypatch.setattr(obstacle_cache, "enabled", False)
+
+
+def make_planner(obstacle_map):
+    x_width, y_width = obstacle_map.shape
+    planner = task1.AStarPlanner([0, x_width], [0, y_width], 1.0, 0.5,
+                                 [], [], [], [])
+    planner.obstacle_map = obstacle_map
+    planner.calc_cost_raster()
+    return planner
+
+
+def make_hierarchical(planner, cluster_size):
+    cache = ClusterCache()
+    cache.enabled = False
+    return HierarchicalPlanner(planner, cluster_size, cache)
+
+
+def test_corner_exits_need_diagonal_steps():
+    # A 2 x 2 cluster whose only free neighbour is diagonally across
+    padded = np.ones((4, 4), dtype=bool)
+    padded[1:3, 1:3] = False
+    padded[0, 0] = False
+    assert calc_exits(padded) == []
+    assert calc_exits(padded, diagonal=True) == [(0, 0, -1, -1)]
+
+
+def test_clusters_joined_by_a_diagonal_step():
+    # Two free 4 x 4 blocks touching only at the corners of their clusters
+    obstacle_map = np.ones((8, 8), dtype=bool)
+    obstacle_map[:4, :4] = False
+    obstacle_map[4:, 4:] = False
+    planner = make_planner(obstacle_map)
+    hierarchical = make_hierarchical(planner, 4)
+
+    hierarchical.planning(0.0, 0.0, 7.0, 7.0)
+    assert math.isclose(hierarchical.path_cost, 7 * math.sqrt(2))
+
+
+def test_finds_every_reachable_goal():
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        obstacle_map = rng.random((20, 20)) < 0.35
+        planner = make_planner(obstacle_map)
+        blocked = flatten_obstacle_map(obstacle_map)
+        free = np.argwhere(~obstacle_map)
+        for cluster_size in (4, 5):
+            hierarchical = make_hierarchical(planner, cluster_size)
+            for _ in range(10):
+                start, goal = free[rng.integers(len(free), size=2)]
+                state, goal_id = search(
+                    blocked, planner.x_width, planner.y_width,
+                    planner.motion, tuple(start), tuple(goal),
+                    planner.cost_raster.get_step_costs())
+                hierarchical.planning(*start.tolist(), *goal.tolist())
+                assert (goal_id == -1) == math.isinf(hierarchical.path_cost)
+                if goal_id != -1:
+                    assert hierarchical.path_cost >= state.cost[goal_id] - 1e-9
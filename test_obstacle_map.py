@@ -0,0 +1,71 @@
+import math
+
+import numpy as np
+
+import task1
+from obstacle_map import obstacle_cache
+
+
+def get_task1_obstacles():
+    """
+    The walls and the three sampled segments of the task1 map.
+    """
+    ox, oy = [], []
+    for i in range(-10, 60):
+        ox.append(i)
+        oy.append(-10.0)
+    for i in range(-10, 60):
+        ox.append(60.0)
+        oy.append(i)
+    for i in range(-10, 61):
+        ox.append(i)
+        oy.append(60.0)
+    for i in range(-10, 61):
+        ox.append(-10.0)
+        oy.append(i)
+    for (start_x, start_y, end_x, end_y), steps in (((20, 0, 25, 20), 425),
+                                                   ((10, 55, 25, 45), 325),
+                                                   ((30, 0, 45, 10), 325)):
+        for i in range(steps + 1):
+            t = i / steps
+            ox.append(start_x + t * (end_x - start_x))
+            oy.append(start_y + t * (end_y - start_y))
+    return ox, oy
+
+
+def calc_obstacle_map_per_cell(planner, ox, oy):
+    # The loop calc_obstacle_map ran before the distance field
+    obstacle_map = [[False for _ in range(planner.y_width)]
+                    for _ in range(planner.x_width)]
+    for ix in range(planner.x_width):
+        x = planner.calc_grid_position(ix, planner.min_x)
+        for iy in range(planner.y_width):
+            y = planner.calc_grid_position(iy, planner.min_y)
+            for iox, ioy in zip(ox, oy):
+                d = math.hypot(iox - x, ioy - y)
+                if d <= planner.rr:
+                    obstacle_map[ix][iy] = True
+                    break
+    return obstacle_map
+
+
+def test_task1_map_matches_per_cell_loop(monkeypatch):
+    monkeypatch.setattr(obstacle_cache, "enabled", False)
+    ox, oy = get_task1_obstacles()
+    planner = task1.AStarPlanner(ox, oy, 1, 1.0, [], [], [], [])
+
+    expected = np.array(calc_obstacle_map_per_cell(planner, ox, oy))
+    assert planner.obstacle_map.shape == expected.shape
+    assert np.array_equal(planner.obstacle_map, expected)
+
+
+def test_wider_radius_is_a_threshold(monkeypatch):
+    monkeypatch.setattr(obstacle_cache, "enabled", False)
+    ox, oy = get_task1_obstacles()
+    planner = task1.AStarPlanner(ox, oy, 1, 1.0, [], [], [], [])
+    dist = planner.distance_field.dist
+
+    planner.set_robot_radius(3.0)
+    assert planner.distance_field.dist is dist
+    wider = task1.AStarPlanner(ox, oy, 1, 3.0, [], [], [], [])
+    assert np.array_equal(planner.obstacle_map, wider.obstacle_map)